@@ -2,6 +2,7 @@
 Environment configuration for FastAPI backend
 """
 
+import json
 import os
 import logging
 from dotenv import load_dotenv
@@ -41,11 +42,116 @@ class Config:
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = 30
     
+    # User Token (Supabase JWT) Configuration
+    SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+    SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL") or (
+        f"{SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json" if SUPABASE_URL else None
+    )
+    JWKS_REFRESH_SECONDS = int(os.getenv("JWKS_REFRESH_SECONDS", 3600))
+    JWT_CLAIMS_CACHE_SIZE = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", 10000))
+    REQUIRE_USER_TOKEN = os.getenv("REQUIRE_USER_TOKEN", "false").lower() == "true"
+    
+    # Admin Configuration (server-side only; never ship this key in a client)
+    ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+    
+    # Rate Limit Configuration (rates in tokens per second; see middleware/rate_limit.py for route costs)
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_USER_RATE = float(os.getenv("RATE_LIMIT_USER_RATE", 5))
+    RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", 60))
+    RATE_LIMIT_KEY_RATE = float(os.getenv("RATE_LIMIT_KEY_RATE", 500))
+    RATE_LIMIT_KEY_BURST = float(os.getenv("RATE_LIMIT_KEY_BURST", 2000))
+    RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL")
+    
     # CORS Configuration
     ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
     
     # Logging Configuration
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+    LOG_DEDUPE_WINDOW_SECONDS = float(os.getenv("LOG_DEDUPE_WINDOW_SECONDS", 10.0))
+    LOG_DEDUPE_BURST = int(os.getenv("LOG_DEDUPE_BURST", 5))
+    
+    # Reminder Configuration
+    REMINDER_LEAD_MINUTES = int(os.getenv("REMINDER_LEAD_MINUTES", 30))
+    REMINDER_MIN_SAMPLES = int(os.getenv("REMINDER_MIN_SAMPLES", 5))
+    REMINDER_HORIZON_DAYS = int(os.getenv("REMINDER_HORIZON_DAYS", 7))
+    REMINDER_MATERIALIZE_INTERVAL_HOURS = int(os.getenv("REMINDER_MATERIALIZE_INTERVAL_HOURS", 6))
+    
+    # Metrics Configuration
+    METRICS_RETENTION_DAYS = int(os.getenv("METRICS_RETENTION_DAYS", 35))
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    
+    # Tracing Configuration (Chrome trace-event JSON, folded stacks when profiled)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.01))
+    TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+    TRACE_MAX_FILES = int(os.getenv("TRACE_MAX_FILES", 500))
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+    
+    # Database Resilience Configuration
+    DB_BREAKER_FAILURE_THRESHOLD = int(os.getenv("DB_BREAKER_FAILURE_THRESHOLD", 5))
+    DB_BREAKER_RECOVERY_SECONDS = float(os.getenv("DB_BREAKER_RECOVERY_SECONDS", 5.0))
+    DB_BREAKER_CACHE_SIZE = int(os.getenv("DB_BREAKER_CACHE_SIZE", 2048))
+    DB_BREAKER_CACHE_MB = float(os.getenv("DB_BREAKER_CACHE_MB", 32))
+    DB_PROBE_TIMEOUT_SECONDS = float(os.getenv("DB_PROBE_TIMEOUT_SECONDS", 2.0))
+    READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", 5.0))
+    
+    # Database Call Policy Configuration
+    DB_READ_DEADLINE_SECONDS = float(os.getenv("DB_READ_DEADLINE_SECONDS", 3.0))
+    DB_WRITE_DEADLINE_SECONDS = float(os.getenv("DB_WRITE_DEADLINE_SECONDS", 5.0))
+    DB_READ_RETRIES = int(os.getenv("DB_READ_RETRIES", 2))
+    DB_UPSERT_RETRIES = int(os.getenv("DB_UPSERT_RETRIES", 2))
+    DB_RETRY_BASE_MS = float(os.getenv("DB_RETRY_BASE_MS", 50))
+    DB_RETRY_MAX_MS = float(os.getenv("DB_RETRY_MAX_MS", 800))
+    DB_HEDGE_READS = os.getenv("DB_HEDGE_READS", "false").lower() == "true"
+    DB_HEDGE_PERCENTILE = float(os.getenv("DB_HEDGE_PERCENTILE", 0.95))
+    DB_HEDGE_MIN_DELAY_MS = float(os.getenv("DB_HEDGE_MIN_DELAY_MS", 20))
+    DB_CALL_POLICIES = json.loads(os.getenv("DB_CALL_POLICIES") or "{}")
+    DB_WORKER_THREADS = int(os.getenv("DB_WORKER_THREADS", 32))
+    
+    # Response Compression Configuration
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 5))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 4))
+    
+    # Social Timeline Configuration
+    TIMELINE_MAX_ENTRIES = int(os.getenv("TIMELINE_MAX_ENTRIES", 800))
+    TIMELINE_FANOUT_LIMIT = int(os.getenv("TIMELINE_FANOUT_LIMIT", 5000))
+    TIMELINE_TTL_SECONDS = int(os.getenv("TIMELINE_TTL_SECONDS", 300))
+    
+    # Friend Graph Configuration
+    FRIEND_GRAPH_TTL_SECONDS = int(os.getenv("FRIEND_GRAPH_TTL_SECONDS", 600))
+    
+    # Profile Cache Configuration
+    PROFILE_CACHE_TTL_SECONDS = int(os.getenv("PROFILE_CACHE_TTL_SECONDS", 300))
+    
+    # Post Engagement Buffer Configuration
+    POST_ENGAGEMENT_FLUSH_SECONDS = float(os.getenv("POST_ENGAGEMENT_FLUSH_SECONDS", 2.0))
+    
+    # Challenge Engine Configuration
+    CHALLENGE_CACHE_TTL_SECONDS = int(os.getenv("CHALLENGE_CACHE_TTL_SECONDS", 300))
+    
+    # Activity Push Configuration
+    ACTIVITY_QUEUE_SIZE = int(os.getenv("ACTIVITY_QUEUE_SIZE", 100))
+    ACTIVITY_HEARTBEAT_SECONDS = float(os.getenv("ACTIVITY_HEARTBEAT_SECONDS", 30.0))
+    
+    # Notification Dispatcher Configuration
+    NOTIFICATION_DISPATCH_WINDOW_SECONDS = int(os.getenv("NOTIFICATION_DISPATCH_WINDOW_SECONDS", 60))
+    NOTIFICATION_DISPATCH_BATCH_SIZE = int(os.getenv("NOTIFICATION_DISPATCH_BATCH_SIZE", 500))
+    NOTIFICATION_LEASE_SECONDS = int(os.getenv("NOTIFICATION_LEASE_SECONDS", 300))
+    
+    # Notification Delivery Configuration
+    NOTIFICATION_DELIVERY_CONCURRENCY = int(os.getenv("NOTIFICATION_DELIVERY_CONCURRENCY", 50))
+    NOTIFICATION_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_MAX_ATTEMPTS", 5))
+    NOTIFICATION_RETRY_BASE_SECONDS = int(os.getenv("NOTIFICATION_RETRY_BASE_SECONDS", 30))
+    UNREAD_COUNT_TTL_SECONDS = int(os.getenv("UNREAD_COUNT_TTL_SECONDS", 60))
+    NOTIFICATION_TEMPLATE_TTL_SECONDS = int(os.getenv("NOTIFICATION_TEMPLATE_TTL_SECONDS", 300))
+    
+    # Conditional Read Configuration (how long an ETag may outlive writes made by other workers or the app)
+    ETAG_TTL_SECONDS = int(os.getenv("ETAG_TTL_SECONDS", 60))
     
     # AI Configuration (for future AI features)
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -0,0 +1,172 @@
+"""
+Per-method deadlines, jittered-backoff retries and hedged reads for SupabaseClient calls
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+from database.circuit_breaker import CircuitBreaker, db_breaker, is_outage
+from utils.metrics import DB_HEDGES, DB_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Writes that are safe to repeat: each is an upsert whose on_conflict names a unique
+# constraint (not the primary key), so a retry after a lost response updates the row
+UPSERT_METHODS = frozenset({
+    'mark_habit_complete', 'update_user_progress', 'save_mood_checkin', 'bulk_upsert_notifications',
+    'upsert_notification_schedules', 'join_challenge', 'bulk_upsert_post_likes'
+})
+
+
+class CallPolicy:
+    """How one SupabaseClient method is called: total deadline, retries and hedging"""
+
+    def __init__(self, deadline_seconds: float, retries: int = 0, hedge: bool = False,
+                 hedge_percentile: float = 0.95):
+        self.deadline_seconds = deadline_seconds
+        self.retries = retries
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+
+
+def policy_for(name: str, read: bool) -> CallPolicy:
+    """Defaults by kind of call, overridden per method from DB_CALL_POLICIES.
+
+    Only reads are ever hedged; other writes are not retried unless a
+    per-method override says so.
+    """
+    if read:
+        policy = CallPolicy(Config.DB_READ_DEADLINE_SECONDS, Config.DB_READ_RETRIES,
+                            Config.DB_HEDGE_READS, Config.DB_HEDGE_PERCENTILE)
+    elif name in UPSERT_METHODS:
+        policy = CallPolicy(Config.DB_WRITE_DEADLINE_SECONDS, Config.DB_UPSERT_RETRIES)
+    else:
+        policy = CallPolicy(Config.DB_WRITE_DEADLINE_SECONDS)
+
+    for key, value in Config.DB_CALL_POLICIES.get(name, {}).items():
+        if not hasattr(policy, key):
+            logger.warning(f"Ignoring unknown DB_CALL_POLICIES setting {name}.{key}")
+            continue
+        setattr(policy, key, value)
+    policy.hedge = bool(policy.hedge) and read
+    return policy
+
+
+class LatencyWindow:
+    """Recent successful call latencies for one method, for the hedge delay"""
+
+    MIN_SAMPLES = 20
+
+    def __init__(self, size: int = 256, refresh_every: int = 32):
+        self._samples: deque = deque(maxlen=size)
+        self._refresh_every = refresh_every
+        self._since_refresh = 0
+        self._percentiles: Dict[float, float] = {}
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+        self._since_refresh += 1
+        if self._since_refresh >= self._refresh_every:
+            self._since_refresh = 0
+            self._percentiles.clear()
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < self.MIN_SAMPLES:
+            return None
+        value = self._percentiles.get(q)
+        if value is None:
+            ordered = sorted(self._samples)
+            value = self._percentiles[q] = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return value
+
+
+def run_blocking(coro) -> Any:
+    """Run a SupabaseClient method body to completion in the current (worker) thread.
+
+    The bodies only make blocking client calls and never await, so a
+    single send() finishes them.
+    """
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return done.value
+    coro.close()
+    raise RuntimeError("SupabaseClient methods run under a call policy must not await")
+
+
+def configure_executor():
+    """Size the running loop's default executor, which runs the database calls"""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=Config.DB_WORKER_THREADS, thread_name_prefix='db')
+    )
+
+
+def _discard(task: asyncio.Future):
+    # Abandoned attempts may still fail; retrieve the error so it is not reported as unhandled
+    if not task.cancelled():
+        task.exception()
+
+
+async def _attempt(name: str, policy: CallPolicy, window: LatencyWindow, run: Callable[[], Any]) -> Any:
+    """One attempt, plus a duplicate if it is still running after the method's hedge delay"""
+    start = time.perf_counter()
+    first = asyncio.ensure_future(asyncio.to_thread(run))
+    tasks = {first}
+    hedged = False
+    try:
+        delay = window.percentile(policy.hedge_percentile) if policy.hedge else None
+        if delay is not None and db_breaker.state == CircuitBreaker.CLOSED:
+            await asyncio.wait(tasks, timeout=max(delay, Config.DB_HEDGE_MIN_DELAY_MS / 1000))
+            if not first.done():
+                tasks.add(asyncio.ensure_future(asyncio.to_thread(run)))
+                hedged = True
+
+        error: Optional[BaseException] = None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if hedged:
+                        DB_HEDGES.labels(name, 'original' if task is first else 'hedge').inc()
+                    window.add(time.perf_counter() - start)
+                    return task.result()
+                error = error or task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+            task.add_done_callback(_discard)
+
+
+async def call_with_policy(name: str, policy: CallPolicy, window: LatencyWindow, run: Callable[[], Any]) -> Any:
+    """Run `run` in a worker thread within the policy's deadline, retrying transient errors.
+
+    Backoff is "full jitter": a uniform delay up to base * 2^attempt, capped,
+    so retries from many callers spread out instead of arriving together.
+    Nothing is retried once the circuit breaker has opened, and a retry is
+    skipped when its backoff would overrun the deadline.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + policy.deadline_seconds
+    attempt = 0
+    while True:
+        try:
+            return await asyncio.wait_for(_attempt(name, policy, window, run), deadline - loop.time())
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError) and loop.time() >= deadline:
+                raise TimeoutError(f"{name} exceeded its {policy.deadline_seconds}s deadline") from None
+            if attempt >= policy.retries or not is_outage(e) or db_breaker.state != CircuitBreaker.CLOSED:
+                raise
+            backoff = random.uniform(0, min(Config.DB_RETRY_MAX_MS, Config.DB_RETRY_BASE_MS * 2 ** attempt)) / 1000
+            if loop.time() + backoff >= deadline:
+                raise
+            attempt += 1
+            DB_RETRIES.labels(name).inc()
+            logger.debug(f"Retrying {name} (attempt {attempt + 1}) in {backoff * 1000:.0f}ms after: {str(e)}")
+            await asyncio.sleep(backoff)
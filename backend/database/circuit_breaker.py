@@ -0,0 +1,182 @@
+"""
+Circuit breaker for data-layer calls, with last-known-good results for reads
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+import httpx
+import orjson
+from postgrest.exceptions import APIError
+
+from config import Config
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# PostgREST codes for "cannot reach / no connection to the database"
+CONNECTION_ERROR_CODES = ('PGRST000', 'PGRST001', 'PGRST002', 'PGRST003')
+
+_MISSING = object()
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the database while the circuit is open"""
+
+
+def is_outage(error: BaseException) -> bool:
+    """Whether an error means the database is unreachable, as opposed to rejecting one query"""
+    if isinstance(error, APIError):
+        return error.code in CONNECTION_ERROR_CODES
+    # A gateway error page instead of a PostgREST JSON body
+    if isinstance(error, json.JSONDecodeError):
+        return True
+    return isinstance(error, (httpx.TransportError, OSError, TimeoutError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """Fail fast after consecutive outage errors, until a probe succeeds.
+
+    Closed: calls go through; `failure_threshold` consecutive outage errors
+    open the circuit. Open: calls are refused immediately. With a probe
+    attached (start()), a background task runs it every `recovery_interval`
+    seconds and closes the circuit once it succeeds; without one, a single
+    trial call is let through per interval (half-open) and its outcome
+    decides. Successful reads are remembered, bounded by `cache_size`
+    entries and `cache_bytes` of encoded JSON, so they can be served while
+    the database is unavailable. A result over 1/16 of the byte budget is
+    not kept, so one large payload cannot evict everything else.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, recovery_interval: float = 5.0, cache_size: int = 2048,
+                 cache_bytes: int = 32 * 1024 * 1024):
+        self.failure_threshold = failure_threshold
+        self.recovery_interval = recovery_interval
+        self.cache_size = cache_size
+        self.cache_bytes = cache_bytes
+        self._stored_bytes = 0
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._trial_at = 0.0
+        self._probe: Optional[Callable[[], Awaitable[Any]]] = None
+        self._task: Optional[asyncio.Task] = None
+        # key -> (encoded size, result)
+        self._results: "OrderedDict[Hashable, Tuple[int, Any]]" = OrderedDict()
+
+    def start(self, probe: Callable[[], Awaitable[Any]]):
+        """Probe recovery in the background with `probe` (a cheap query that raises on failure)"""
+        self._probe = probe
+        if self.state != self.CLOSED:
+            self._open()
+
+    async def stop(self):
+        self._probe = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def allow(self) -> bool:
+        """Whether a call may go to the database now"""
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self._probe is None and now - max(self.opened_at, self._trial_at) >= self.recovery_interval:
+            self.state = self.HALF_OPEN
+            self._trial_at = now
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != self.CLOSED:
+            logger.info(f"Database reachable again after {time.monotonic() - self.opened_at:.1f}s; closing circuit")
+            self.state = self.CLOSED
+            self.opened_at = None
+
+    def record_failure(self, error: BaseException):
+        if not is_outage(error):
+            # The database answered; the query itself was at fault
+            self.record_success()
+            return
+        self.failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            self._open()
+
+    def _open(self):
+        if self.state != self.OPEN:
+            logger.warning(f"Opening database circuit after {self.failures} failures: {self.last_error}")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        if self._probe is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._recover())
+
+    async def _recover(self):
+        while self.state != self.CLOSED and self._probe is not None:
+            await asyncio.sleep(self.recovery_interval)
+            try:
+                await self._probe()
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.debug(f"Database recovery probe failed: {self.last_error}")
+                continue
+            self.record_success()
+
+    def remember(self, key: Hashable, result: Any):
+        try:
+            size = len(orjson.dumps(result, default=str, option=orjson.OPT_NON_STR_KEYS))
+        except TypeError:
+            return
+        self._forget(key)
+        if size > self.cache_bytes // 16:
+            return
+        self._results[key] = (size, result)
+        self._stored_bytes += size
+        while len(self._results) > self.cache_size or self._stored_bytes > self.cache_bytes:
+            self._stored_bytes -= self._results.popitem(last=False)[1][0]
+
+    def _forget(self, key: Hashable):
+        entry = self._results.pop(key, None)
+        if entry is not None:
+            self._stored_bytes -= entry[0]
+
+    def recall(self, key: Hashable) -> Tuple[bool, Any]:
+        """(True, result) for the last successful result under `key`, else (False, None)"""
+        entry = self._results.get(key, _MISSING)
+        return (False, None) if entry is _MISSING else (True, entry[1])
+
+    def status(self) -> dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'open_for_seconds': round(time.monotonic() - self.opened_at, 1) if self.opened_at else None,
+            'last_error': self.last_error,
+            'remembered_results': len(self._results),
+            'remembered_bytes': self._stored_bytes
+        }
+
+
+db_breaker = CircuitBreaker(
+    Config.DB_BREAKER_FAILURE_THRESHOLD,
+    Config.DB_BREAKER_RECOVERY_SECONDS,
+    Config.DB_BREAKER_CACHE_SIZE,
+    int(Config.DB_BREAKER_CACHE_MB * 1024 * 1024)
+)
+
+registry.gauge('db_circuit_open', 'Whether the database circuit breaker is refusing calls').set_function(
+    lambda: 0 if db_breaker.state == CircuitBreaker.CLOSED else 1
+)
@@ -3,12 +3,51 @@ Supabase client for database operations
 """
 
 from supabase import create_client, Client
+from supabase.lib.client_options import ClientOptions
 from config import Config
+from contextvars import ContextVar
+from datetime import date, datetime, timezone
+import asyncio
+import functools
+import inspect
 import logging
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from database.call_policy import LatencyWindow, call_with_policy, policy_for, run_blocking
+from database.circuit_breaker import CircuitOpenError, db_breaker, is_outage
+from utils.metrics import DB_CALLS, DB_LATENCY
+from utils.tracing import record_span
 
 logger = logging.getLogger(__name__)
 
+# Tables touched by the SupabaseClient call running in the current task
+_call_tables: ContextVar[Optional[List[str]]] = ContextVar('_call_tables', default=None)
+
+# Profile fields embedded in social responses
+PROFILE_SUMMARY_COLUMNS = 'id, username, display_name, avatar_url, level, current_streak'
+
+class _TableRecorder:
+    """Delegates to the Supabase client, noting which tables each call touches"""
+    
+    def __init__(self, client: Client):
+        self._client = client
+    
+    def table(self, name: str):
+        tables = _call_tables.get()
+        if tables is not None:
+            tables.append(name)
+        return self._client.table(name)
+    
+    def rpc(self, fn: str, *args, **kwargs):
+        tables = _call_tables.get()
+        if tables is not None:
+            tables.append(f'rpc:{fn}')
+        return self._client.rpc(fn, *args, **kwargs)
+    
+    def __getattr__(self, name: str):
+        return getattr(self._client, name)
+
 class SupabaseClient:
     """Supabase client wrapper"""
     
@@ -25,7 +64,11 @@ class SupabaseClient:
                 self.client = None
                 return
             
-            self.client = create_client(self.url, self.key)
+            # Calls are abandoned at their deadline; the HTTP timeout ends the request itself
+            options = ClientOptions(
+                postgrest_client_timeout=max(Config.DB_READ_DEADLINE_SECONDS, Config.DB_WRITE_DEADLINE_SECONDS)
+            )
+            self.client = _TableRecorder(create_client(self.url, self.key, options=options))
             logger.info("Supabase client initialized successfully")
             
         except Exception as e:
@@ -38,6 +81,20 @@ class SupabaseClient:
         self.client = None
         logger.info("Supabase client closed")
     
+    # Health operations
+    async def ping(self) -> float:
+        """Run a trivial query and return its latency in seconds"""
+        return await self.probe()
+    
+    async def probe(self) -> float:
+        """ping() without instrumentation, so the circuit breaker can probe while the circuit is open"""
+        if not self.client:
+            raise Exception("Database not available")
+        start = time.perf_counter()
+        query = self.client.table('habit_templates').select('id').limit(1)
+        await asyncio.wait_for(asyncio.to_thread(query.execute), Config.DB_PROBE_TIMEOUT_SECONDS)
+        return time.perf_counter() - start
+    
     # Habit operations
     async def get_habits(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all habits for a user"""
@@ -51,6 +108,18 @@ class SupabaseClient:
             logger.error(f"Error getting habits: {str(e)}")
             raise
     
+    async def get_habit(self, habit_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get one of a user's habits"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning no habit")
+            return None
+        try:
+            response = self.client.table('habits').select('*').eq('id', habit_id).eq('user_id', user_id).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error getting habit: {str(e)}")
+            raise
+    
     async def create_habit(self, habit_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new habit"""
         if not self.client:
@@ -100,7 +169,7 @@ class SupabaseClient:
                 'completion_date': completion_date,
                 'completion_value': 1
             }
-            response = self.client.table('habit_completions').upsert(completion_data).execute()
+            response = self.client.table('habit_completions').upsert(completion_data, on_conflict='habit_id,completion_date').execute()
             return response.data[0] if response.data else {}
         except Exception as e:
             logger.error(f"Error marking habit complete: {str(e)}")
@@ -118,6 +187,47 @@ class SupabaseClient:
             logger.error(f"Error getting habit completions: {str(e)}")
             raise
     
+    async def get_completion_times(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get completion dates and timestamps for all of a user's habits"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
+        try:
+            response = self.client.table('habit_completions').select('habit_id, completion_date, completion_time').eq('user_id', user_id).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error getting completion times: {str(e)}")
+            raise
+    
+    async def get_completion_stats(self, habit_id: str, user_id: str) -> Dict[str, Any]:
+        """Get the streak and XP totals left behind by the completion trigger"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty stats")
+            return {}
+        try:
+            streak_response = self.client.table('streaks').select('current_streak').eq('habit_id', habit_id).eq('user_id', user_id).execute()
+            progress_response = self.client.table('user_progress').select('total_xp').eq('user_id', user_id).execute()
+            return {
+                'current_streak': streak_response.data[0].get('current_streak') if streak_response.data else None,
+                'total_xp': progress_response.data[0].get('total_xp') if progress_response.data else None
+            }
+        except Exception as e:
+            logger.error(f"Error getting completion stats: {str(e)}")
+            raise
+    
+    # Profile operations
+    async def get_user_timezone(self, user_id: str) -> Optional[str]:
+        """Get the timezone configured on a user's profile"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning None")
+            return None
+        try:
+            response = self.client.table('profiles').select('timezone').eq('id', user_id).execute()
+            return response.data[0].get('timezone') if response.data else None
+        except Exception as e:
+            logger.error(f"Error getting user timezone: {str(e)}")
+            raise
+    
     # User progress operations
     async def get_user_progress(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get user progress"""
@@ -138,7 +248,7 @@ class SupabaseClient:
             raise Exception("Database not available")
         try:
             progress_data['user_id'] = user_id
-            response = self.client.table('user_progress').upsert(progress_data).execute()
+            response = self.client.table('user_progress').upsert(progress_data, on_conflict='user_id').execute()
             return response.data[0] if response.data else {}
         except Exception as e:
             logger.error(f"Error updating user progress: {str(e)}")
@@ -151,7 +261,7 @@ class SupabaseClient:
             logger.warning("Supabase client not initialized - cannot save mood checkin")
             raise Exception("Database not available")
         try:
-            response = self.client.table('mood_checkins').upsert(mood_data).execute()
+            response = self.client.table('mood_checkins').upsert(mood_data, on_conflict='user_id,checkin_date').execute()
             return response.data[0] if response.data else {}
         except Exception as e:
             logger.error(f"Error saving mood checkin: {str(e)}")
@@ -194,16 +304,473 @@ class SupabaseClient:
             logger.error(f"Error getting habit analytics: {str(e)}")
             raise
     
+    # Notification operations
+    async def get_notification_templates(self) -> List[Dict[str, Any]]:
+        """Get all active notification templates"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
+        try:
+            response = self.client.table('notification_templates').select(
+                'name, title_template, body_template, notification_type'
+            ).eq('is_active', True).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error getting notification templates: {str(e)}")
+            raise
+    
+    async def get_notification_templates_version(self) -> Optional[str]:
+        """Get a token that changes whenever any notification template changes"""
+        if not self.client:
+            return None
+        try:
+            response = self.client.table('notification_templates').select('updated_at', count='exact').order(
+                'updated_at', desc=True
+            ).limit(1).execute()
+            latest = response.data[0]['updated_at'] if response.data else None
+            return f"{response.count}:{latest}"
+        except Exception as e:
+            logger.error(f"Error getting notification templates version: {str(e)}")
+            raise
+    
+    async def get_current_streaks(self, habit_ids: List[str]) -> Dict[str, int]:
+        """Get the current streak of many habits, keyed by habit ID"""
+        if not self.client or not habit_ids:
+            return {}
+        try:
+            response = self.client.table('streaks').select('habit_id, current_streak').in_('habit_id', habit_ids).execute()
+            return {row['habit_id']: row.get('current_streak') or 0 for row in response.data}
+        except Exception as e:
+            logger.error(f"Error getting current streaks: {str(e)}")
+            raise
+    
+    async def count_unread_notifications(self, user_id: str) -> int:
+        """Count a user's unread notifications that have been delivered"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning 0")
+            return 0
+        try:
+            response = self.client.table('notifications').select('id', count='exact').eq('user_id', user_id).eq(
+                'is_read', False
+            ).or_('sent_at.not.is.null,scheduled_for.is.null').limit(1).execute()
+            return response.count or 0
+        except Exception as e:
+            logger.error(f"Error counting unread notifications: {str(e)}")
+            raise
+    
+    async def mark_notifications_read(self, user_id: str, notification_ids: Optional[List[str]] = None,
+                                      delivered_only: bool = True) -> List[Dict[str, Any]]:
+        """Mark some (or, without IDs, all) of a user's unread notifications read; returns the rows changed.
+
+        Only delivered ones unless delivered_only is False (e.g. a scheduled
+        reminder the user dismissed ahead of time).
+        """
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot mark notifications read")
+            raise Exception("Database not available")
+        try:
+            query = self.client.table('notifications').update({'is_read': True}).eq('user_id', user_id).eq(
+                'is_read', False
+            )
+            if delivered_only:
+                query = query.or_('sent_at.not.is.null,scheduled_for.is.null')
+            if notification_ids is not None:
+                query = query.in_('id', notification_ids)
+            return query.execute().data
+        except Exception as e:
+            logger.error(f"Error marking notifications read: {str(e)}")
+            raise
+    
+    async def delete_notifications(self, user_id: str, notification_ids: List[str]) -> List[Dict[str, Any]]:
+        """Delete a user's notifications by ID; returns the rows deleted"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot delete notifications")
+            raise Exception("Database not available")
+        if not notification_ids:
+            return []
+        try:
+            response = self.client.table('notifications').delete().eq('user_id', user_id).in_('id', notification_ids).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error deleting notifications: {str(e)}")
+            raise
+    
+    async def get_reminder_habits(self, after_id: Optional[str] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Get a page of active habits with reminders enabled, ordered by ID"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
+        try:
+            query = self.client.table('habits').select(
+                'id, user_id, name, reminder_time, reminder_days'
+            ).eq('has_reminder', True).eq('is_active', True).eq('is_archived', False).not_.is_('reminder_time', 'null')
+            if after_id:
+                query = query.gt('id', after_id)
+            response = query.order('id').limit(limit).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error getting reminder habits: {str(e)}")
+            raise
+    
+    async def get_user_timezones(self, user_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Get the timezones configured on many users' profiles, keyed by user ID"""
+        if not self.client or not user_ids:
+            return {}
+        try:
+            response = self.client.table('profiles').select('id, timezone').in_('id', user_ids).execute()
+            return {row['id']: row.get('timezone') for row in response.data}
+        except Exception as e:
+            logger.error(f"Error getting user timezones: {str(e)}")
+            raise
+    
+    async def bulk_upsert_notifications(self, notifications: List[Dict[str, Any]]) -> int:
+        """Insert notifications in one statement, skipping dedupe keys that already exist"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot insert notifications")
+            raise Exception("Database not available")
+        if not notifications:
+            return 0
+        try:
+            response = self.client.table('notifications').upsert(
+                notifications, on_conflict='dedupe_key', ignore_duplicates=True
+            ).execute()
+            return len(response.data)
+        except Exception as e:
+            logger.error(f"Error bulk inserting notifications: {str(e)}")
+            raise
+    
+    async def upsert_notification_schedules(self, schedules: List[Dict[str, Any]]):
+        """Create or update per-habit notification schedules"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot upsert notification schedules")
+            raise Exception("Database not available")
+        if not schedules:
+            return
+        try:
+            self.client.table('notification_schedules').upsert(
+                schedules, on_conflict='habit_id,schedule_type'
+            ).execute()
+        except Exception as e:
+            logger.error(f"Error upserting notification schedules: {str(e)}")
+            raise
+    
+    async def delete_pending_reminders(self, habit_id: str):
+        """Delete a habit's reminders that have not been sent or are not leased to a live dispatcher"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot delete reminders")
+            raise Exception("Database not available")
+        try:
+            # A lease left behind by a crashed worker has expired and no longer protects the row
+            now = datetime.now(timezone.utc).isoformat()
+            self.client.table('notifications').delete().eq('type', 'reminder').eq(
+                'data->>habit_id', habit_id
+            ).is_('sent_at', 'null').or_(f'lease_expires_at.is.null,lease_expires_at.lt."{now}"').execute()
+        except Exception as e:
+            logger.error(f"Error deleting pending reminders: {str(e)}")
+            raise
+    
+    async def claim_due_notifications(self, worker_id: str, horizon: str, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        """Lease unsent notifications due before horizon to a dispatcher worker"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
+        try:
+            response = self.client.rpc('claim_due_notifications', {
+                'p_worker': worker_id,
+                'p_horizon': horizon,
+                'p_limit': limit,
+                'p_lease_seconds': lease_seconds
+            }).execute()
+            return response.data or []
+        except Exception as e:
+            logger.error(f"Error claiming due notifications: {str(e)}")
+            raise
+    
+    async def mark_notifications_sent(self, notification_ids: List[str], sent_at: str):
+        """Mark notifications as sent and release their leases"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot mark notifications sent")
+            raise Exception("Database not available")
+        if not notification_ids:
+            return
+        try:
+            self.client.table('notifications').update({
+                'sent_at': sent_at, 'lease_owner': None, 'lease_expires_at': None
+            }).in_('id', notification_ids).execute()
+        except Exception as e:
+            logger.error(f"Error marking notifications sent: {str(e)}")
+            raise
+    
+    async def reschedule_notifications(self, notification_ids: List[str], scheduled_for: str, attempts: int):
+        """Push failed notifications back to the queue for another delivery attempt"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot reschedule notifications")
+            raise Exception("Database not available")
+        if not notification_ids:
+            return
+        try:
+            self.client.table('notifications').update({
+                'scheduled_for': scheduled_for,
+                'delivery_attempts': attempts,
+                'lease_owner': None,
+                'lease_expires_at': None
+            }).in_('id', notification_ids).execute()
+        except Exception as e:
+            logger.error(f"Error rescheduling notifications: {str(e)}")
+            raise
+    
+    async def mark_notifications_failed(self, notification_ids: List[str], failed_at: str, attempts: int):
+        """Give up on notifications that can't be delivered and release their leases"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot mark notifications failed")
+            raise Exception("Database not available")
+        if not notification_ids:
+            return
+        try:
+            self.client.table('notifications').update({
+                'failed_at': failed_at,
+                'delivery_attempts': attempts,
+                'lease_owner': None,
+                'lease_expires_at': None
+            }).in_('id', notification_ids).execute()
+        except Exception as e:
+            logger.error(f"Error marking notifications failed: {str(e)}")
+            raise
+    
+    async def bulk_insert_delivery_logs(self, logs: List[Dict[str, Any]]):
+        """Append notification delivery log rows in one statement"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot write delivery logs")
+            raise Exception("Database not available")
+        if not logs:
+            return
+        try:
+            self.client.table('notification_delivery_logs').insert(logs, returning='minimal').execute()
+        except Exception as e:
+            logger.error(f"Error writing delivery logs: {str(e)}")
+            raise
+    
+    async def release_notification_leases(self, worker_id: str, notification_ids: List[str]):
+        """Hand leased notifications back so another worker can claim them"""
+        if not self.client or not notification_ids:
+            return
+        try:
+            self.client.table('notifications').update({
+                'lease_owner': None, 'lease_expires_at': None
+            }).in_('id', notification_ids).eq('lease_owner', worker_id).execute()
+        except Exception as e:
+            logger.error(f"Error releasing notification leases: {str(e)}")
+            raise
+    
+    # Challenge operations
+    async def get_challenge(self, challenge_id: str) -> Optional[Dict[str, Any]]:
+        """Get a challenge by ID"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning None")
+            return None
+        try:
+            response = self.client.table('challenges').select('*').eq('id', challenge_id).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error getting challenge: {str(e)}")
+            raise
+    
+    async def get_challenge_participants(self, challenge_id: str) -> List[Dict[str, Any]]:
+        """Get participants of a challenge in the order they joined"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
+        try:
+            response = self.client.table('challenge_participants').select('user_id, current_progress').eq('challenge_id', challenge_id).order('joined_at').execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error getting challenge participants: {str(e)}")
+            raise
+    
+    async def get_user_active_challenges(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get the challenges a user takes part in that have not ended yet"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
+        try:
+            response = self.client.table('challenge_participants').select(
+                'challenges!inner(id, challenge_type, habit_ids, start_date, end_date)'
+            ).eq('user_id', user_id).eq('is_completed', False).gte('challenges.end_date', date.today().isoformat()).execute()
+            return [row['challenges'] for row in response.data]
+        except Exception as e:
+            logger.error(f"Error getting active challenges: {str(e)}")
+            raise
+    
+    async def join_challenge(self, challenge_id: str, user_id: str) -> Dict[str, Any]:
+        """Add a user to a challenge"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot join challenge")
+            raise Exception("Database not available")
+        try:
+            response = self.client.table('challenge_participants').upsert(
+                {'challenge_id': challenge_id, 'user_id': user_id},
+                on_conflict='challenge_id,user_id', ignore_duplicates=True
+            ).execute()
+            return response.data[0] if response.data else {}
+        except Exception as e:
+            logger.error(f"Error joining challenge: {str(e)}")
+            raise
+    
+    async def advance_challenge_progress(self, challenge_id: str, user_id: str, habit_id: str,
+                                         completion_date: str) -> Optional[Dict[str, Any]]:
+        """Apply one habit completion to a participant's progress atomically, at most once per
+        (habit, date); None if it changed nothing"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot update challenge progress")
+            raise Exception("Database not available")
+        try:
+            response = self.client.rpc('advance_challenge_progress', {
+                'p_challenge_id': challenge_id,
+                'p_user_id': user_id,
+                'p_habit_id': habit_id,
+                'p_completion_date': completion_date
+            }).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error advancing challenge progress: {str(e)}")
+            raise
+    
     # Social operations
     async def get_friends(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get friends for a user"""
+        """Get accepted friendships for a user, whichever side sent the request"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
         try:
-            response = self.client.table('friends').select('*, profiles(*)').eq('user_id', user_id).eq('status', 'accepted').execute()
+            response = self.client.table('friends').select('user_id, friend_id, created_at').or_(f'user_id.eq.{user_id},friend_id.eq.{user_id}').eq('status', 'accepted').execute()
             return response.data
         except Exception as e:
             logger.error(f"Error getting friends: {str(e)}")
             raise
     
+    async def count_friends(self, user_id: str) -> int:
+        """Count accepted friendships without transferring rows"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning 0")
+            return 0
+        try:
+            query = self.client.table('friends').select('id', count='exact').or_(f'user_id.eq.{user_id},friend_id.eq.{user_id}').eq('status', 'accepted').limit(1)
+            response = query.execute()
+            return response.count or 0
+        except Exception as e:
+            logger.error(f"Error counting friends: {str(e)}")
+            raise
+    
+    async def get_friend_edges(self, user_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get every accepted friendship touching any of the given users"""
+        if not self.client or not user_ids:
+            return []
+        try:
+            ids = ','.join(user_ids)
+            response = self.client.table('friends').select('user_id, friend_id').or_(f'user_id.in.({ids}),friend_id.in.({ids})').eq('status', 'accepted').execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error getting friend edges: {str(e)}")
+            raise
+    
+    async def update_friend_status(self, user_id: str, friend_id: str, status: str) -> Dict[str, Any]:
+        """Set the status of the friend request sent by friend_id to user_id"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot update friend request")
+            raise Exception("Database not available")
+        try:
+            response = self.client.table('friends').update({'status': status}).eq('user_id', friend_id).eq('friend_id', user_id).execute()
+            return response.data[0] if response.data else {}
+        except Exception as e:
+            logger.error(f"Error updating friend request: {str(e)}")
+            raise
+    
+    async def delete_friendship(self, user_id: str, friend_id: str) -> bool:
+        """Delete a friendship in either direction"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot delete friendship")
+            raise Exception("Database not available")
+        try:
+            self.client.table('friends').delete().or_(
+                f'and(user_id.eq.{user_id},friend_id.eq.{friend_id}),and(user_id.eq.{friend_id},friend_id.eq.{user_id})'
+            ).execute()
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting friendship: {str(e)}")
+            raise
+    
+    async def get_profile_summaries(self, user_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get compact public profile summaries for a set of users in one query"""
+        if not self.client or not user_ids:
+            return []
+        try:
+            response = self.client.table('profiles').select(PROFILE_SUMMARY_COLUMNS).in_('id', user_ids).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error getting profile summaries: {str(e)}")
+            raise
+    
+    async def bulk_upsert_post_likes(self, likes: List[Dict[str, Any]]) -> int:
+        """Insert many likes in one statement, skipping ones that already exist"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot save likes")
+            raise Exception("Database not available")
+        try:
+            response = self.client.table('post_likes').upsert(likes, on_conflict='post_id,user_id', ignore_duplicates=True).execute()
+            return len(response.data)
+        except Exception as e:
+            logger.error(f"Error saving likes: {str(e)}")
+            raise
+    
+    async def bulk_insert_post_comments(self, comments: List[Dict[str, Any]]) -> int:
+        """Insert many comments (with their IDs) in one statement, skipping ones already written"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - cannot save comments")
+            raise Exception("Database not available")
+        try:
+            response = self.client.table('post_comments').upsert(comments, on_conflict='id', ignore_duplicates=True).execute()
+            return len(response.data)
+        except Exception as e:
+            logger.error(f"Error saving comments: {str(e)}")
+            raise
+    
+    async def count_posts_since(self, user_id: str, since: str) -> int:
+        """Count a user's posts created after a timestamp without transferring rows"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning 0")
+            return 0
+        try:
+            query = self.client.table('social_posts').select('id', count='exact').eq('user_id', user_id).gte('created_at', since).limit(1)
+            response = query.execute()
+            return response.count or 0
+        except Exception as e:
+            logger.error(f"Error counting posts: {str(e)}")
+            raise
+    
+    async def get_post_like(self, post_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Get a user's like of a post, if stored"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning no like")
+            return None
+        try:
+            response = self.client.table('post_likes').select('id').eq('post_id', post_id).eq('user_id', user_id).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            logger.error(f"Error getting post like: {str(e)}")
+            raise
+    
+    async def get_post_comments(self, post_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get comments on a post, oldest first"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
+        try:
+            response = self.client.table('post_comments').select('*').eq('post_id', post_id).order('created_at').limit(limit).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error getting post comments: {str(e)}")
+            raise
+    
     async def create_social_post(self, post_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a social post"""
         try:
@@ -213,11 +780,149 @@ class SupabaseClient:
             logger.error(f"Error creating social post: {str(e)}")
             raise
     
-    async def get_social_feed(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
-        """Get social feed"""
+    async def get_following_ids(self, user_id: str) -> List[str]:
+        """Get IDs of users that a user follows"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
+        try:
+            response = self.client.table('followers').select('following_id').eq('follower_id', user_id).execute()
+            return [row['following_id'] for row in response.data]
+        except Exception as e:
+            logger.error(f"Error getting following ids: {str(e)}")
+            raise
+    
+    async def get_follower_ids(self, user_id: str) -> List[str]:
+        """Get IDs of users following a user"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
+        try:
+            response = self.client.table('followers').select('follower_id').eq('following_id', user_id).execute()
+            return [row['follower_id'] for row in response.data]
+        except Exception as e:
+            logger.error(f"Error getting follower ids: {str(e)}")
+            raise
+    
+    def _posts_query(self, columns: str, author_ids: List[str], limit: int, before: Optional[Tuple[str, str]] = None):
+        """Build a keyset-paginated posts query, newest first"""
+        query = self.client.table('social_posts').select(columns).in_('user_id', author_ids)
+        if before:
+            created_at, post_id = before
+            query = query.or_(f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{post_id})')
+        return query.order('created_at', desc=True).order('id', desc=True).limit(limit)
+    
+    async def get_post_keys(self, author_ids: List[str], limit: int, before: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        """Get (created_at, id) keys of the newest posts by the given authors"""
+        if not self.client or not author_ids:
+            return []
+        try:
+            response = self._posts_query('id, created_at', author_ids, limit, before).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error getting post keys: {str(e)}")
+            raise
+    
+    async def get_posts_by_ids(self, post_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get posts by ID, in no particular order"""
+        if not self.client or not post_ids:
+            return []
+        try:
+            response = self.client.table('social_posts').select('*').in_('id', post_ids).execute()
+            return response.data
+        except Exception as e:
+            logger.error(f"Error getting posts by ids: {str(e)}")
+            raise
+    
+    async def get_post_author(self, post_id: str) -> Optional[str]:
+        """Get the ID of a post's author"""
+        if not self.client:
+            return None
+        try:
+            response = self.client.table('social_posts').select('user_id').eq('id', post_id).limit(1).execute()
+            return response.data[0]['user_id'] if response.data else None
+        except Exception as e:
+            logger.error(f"Error getting post author: {str(e)}")
+            raise
+    
+    async def get_social_feed(self, user_id: str, limit: int = 20, before: Optional[Tuple[str, str]] = None,
+                              author_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get posts by the given authors (defaults to the user's own), newest first"""
+        if not self.client:
+            logger.warning("Supabase client not initialized - returning empty list")
+            return []
         try:
-            response = self.client.table('social_posts').select('*, profiles(*)').order('created_at', desc=True).limit(limit).execute()
+            response = self._posts_query('*', author_ids or [user_id], limit, before).execute()
             return response.data
         except Exception as e:
             logger.error(f"Error getting social feed: {str(e)}")
             raise
+
+# Methods whose last result may be served while the database is unavailable
+READ_PREFIXES = ('get_', 'count_')
+
+def _instrument(name: str, method):
+    """Count and time a SupabaseClient method per table it touched, as a span in sampled traces.
+
+    Calls also go through the circuit breaker: while it is open, reads return
+    their last result for the same arguments and everything else raises
+    CircuitOpenError without touching the network. A made-up empty result
+    would be indistinguishable from real data and end up in the in-process
+    caches, outliving the outage. Otherwise the body
+    runs in a worker thread under the method's call policy (deadline,
+    retries, hedging); ping keeps its own timeout, to time the raw round trip.
+    """
+    read = name.startswith(READ_PREFIXES)
+    policy = policy_for(name, read) if name != 'ping' else None
+    window = LatencyWindow()
+    
+    @functools.wraps(method)
+    async def instrumented(self, *args, **kwargs):
+        key = (name, repr(args), repr(sorted(kwargs.items()))) if read else None
+        if self.client is not None and not db_breaker.allow():
+            DB_CALLS.labels(name, '', 'rejected').inc()
+            found, result = db_breaker.recall(key) if read else (False, None)
+            if not found:
+                raise CircuitOpenError(f"Database unavailable, {name} not attempted")
+            return result
+        
+        tables: List[str] = []
+        token = _call_tables.set(tables)
+        status = 'ok'
+        start = time.perf_counter()
+        try:
+            if policy is None or self.client is None:
+                result = await method(self, *args, **kwargs)
+            else:
+                result = await call_with_policy(name, policy, window, lambda: run_blocking(method(self, *args, **kwargs)))
+        except Exception as e:
+            status = 'error'
+            if tables:
+                db_breaker.record_failure(e)
+                if read and is_outage(e):
+                    found, result = db_breaker.recall(key)
+                    if found:
+                        status = 'fallback'
+                        return result
+            raise
+        else:
+            if tables:
+                db_breaker.record_success()
+                if read:
+                    db_breaker.remember(key, result)
+            return result
+        finally:
+            end = time.perf_counter()
+            elapsed = end - start
+            _call_tables.reset(token)
+            # Calls answered without the database (local mode, empty input) are not recorded
+            if tables:
+                table = ','.join(dict.fromkeys(tables))
+                DB_CALLS.labels(name, table, status).inc()
+                DB_LATENCY.labels(name, table).observe(elapsed)
+                record_span(f"db.{name}", start, end, table=table, status=status)
+    return instrumented
+
+for _name, _method in list(vars(SupabaseClient).items()):
+    if inspect.iscoroutinefunction(_method) and not _name.startswith('_') and _name not in ('initialize', 'close', 'probe'):
+        setattr(SupabaseClient, _name, _instrument(_name, _method))
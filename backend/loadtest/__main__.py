@@ -0,0 +1,169 @@
+"""
+Run the load test and compare it with the committed baselines.
+
+    cd backend
+    python -m loadtest                       # mixed workload, in-process
+    python -m loadtest --workload analytics  # one workload only
+    python -m loadtest --mode http           # through a real uvicorn server
+    python -m loadtest --update-baseline     # record new baselines
+    python -m loadtest --repeat 1            # a single, noisier run
+
+Exits with status 1 when any route regresses beyond the tolerance. Latencies
+are wall-clock, so baselines record the host and are only compared on the
+machine that recorded them; re-record after changing the request path.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Dict, Any
+
+from loadtest.harness import (
+    MIXED_WEIGHTS, asgi_sender, compare, format_table, http_sender, median_results, run_load, serving,
+    use_local_backend
+)
+from loadtest.local_backend import LocalStore
+from loadtest.seed import seed_store
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+
+
+def _host() -> str:
+    """The machine a run happened on: latencies are wall-clock, so only runs on the same hardware compare"""
+    cpu = platform.processor() or platform.machine()
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = next((line.split(':', 1)[1].strip() for line in f if line.startswith('model name')), cpu)
+    except OSError:
+        pass
+    return f"{cpu} x{os.cpu_count()}, {platform.python_implementation()} {platform.python_version()}"
+
+
+def _settings(args) -> Dict[str, Any]:
+    """What a baseline was recorded with; results are only comparable under the same settings and host"""
+    return {
+        'mode': args.mode, 'concurrency': args.concurrency, 'duration': args.duration, 'repeat': args.repeat,
+        'users': args.users, 'days': args.days, 'db_latency_ms': args.db_latency_ms, 'seed': args.seed,
+        'host': _host()
+    }
+
+
+async def _run_inprocess(args, workloads: Dict[str, int], dataset: Dict[str, Any], store: LocalStore):
+    from main import app
+    from config import Config
+
+    supabase = use_local_backend(app, store)
+    send = asgi_sender(app, Config.FASTAPI_API_KEY)
+    async with serving(supabase):
+        return [
+            await run_load(send, dataset, workloads, args.concurrency, args.duration, args.warmup, args.seed)
+            for _ in range(args.repeat)
+        ]
+
+
+async def _run_http(args, workloads: Dict[str, int], dataset: Dict[str, Any]):
+    import httpx
+    from config import Config
+
+    command = [sys.executable, '-m', 'loadtest.server', '--port', str(args.port), '--users', str(args.users),
+               '--days', str(args.days), '--seed', str(args.seed), '--db-latency-ms', str(args.db_latency_ms)]
+    server = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=30) as client:
+            deadline = time.monotonic() + 300
+            while True:
+                try:
+                    await client.get('/')
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None or time.monotonic() > deadline:
+                        raise RuntimeError('Load-test server did not start')
+                    await asyncio.sleep(0.5)
+            send = http_sender(client, Config.FASTAPI_API_KEY)
+            return [
+                await run_load(send, dataset, workloads, args.concurrency, args.duration, args.warmup, args.seed)
+                for _ in range(args.repeat)
+            ]
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Habit Tracker API load test')
+    parser.add_argument('--workload', choices=['mixed', *MIXED_WEIGHTS], default='mixed')
+    parser.add_argument('--mode', choices=['inprocess', 'http'], default='inprocess')
+    parser.add_argument('--concurrency', type=int, default=20, help='virtual users')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds recorded')
+    parser.add_argument('--warmup', type=float, default=3.0, help='seconds run before recording')
+    parser.add_argument('--repeat', type=int, default=3, help='runs; each statistic is the median across them')
+    parser.add_argument('--users', type=int, default=200, help='seeded users')
+    parser.add_argument('--days', type=int, default=730, help='days of seeded history')
+    parser.add_argument('--db-latency-ms', type=float, default=2.0, help='simulated round trip per data-layer call')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--port', type=int, default=8765, help='server port in http mode')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed relative regression of p50 and rps')
+    parser.add_argument('--tail-tolerance', type=float, default=1.5, help='allowed relative regression of p95 and p99')
+    parser.add_argument('--slack-ms', type=float, default=2.0, help='allowed absolute latency regression')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    workloads = dict(MIXED_WEIGHTS) if args.workload == 'mixed' else {args.workload: 1}
+    store = LocalStore(latency_seconds=args.db_latency_ms / 1000)
+    started = time.perf_counter()
+    # Seeded here in both modes: workloads need the IDs, and the server seeds identically
+    dataset = seed_store(store, users=args.users, days=args.days, seed=args.seed)
+    print(f"Seeded {store.size()} rows in {time.perf_counter() - started:.1f}s")
+
+    if args.mode == 'http':
+        runs = asyncio.run(_run_http(args, workloads, dataset))
+    else:
+        runs = asyncio.run(_run_inprocess(args, workloads, dataset, store))
+    results = median_results(runs)
+
+    baselines: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    settings = _settings(args)
+    recorded = baselines.get(args.workload)
+
+    print(format_table(results, recorded['routes'] if recorded else None))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': settings, 'routes': results}, f, indent=2)
+
+    if args.update_baseline:
+        baselines[args.workload] = {'settings': settings, 'routes': results}
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline for '{args.workload}' written to {args.baseline}")
+        return 0
+
+    if recorded is None:
+        print(f"No baseline for '{args.workload}'; run with --update-baseline to record one")
+        return 0
+    if recorded['settings'] != settings:
+        print(f"Settings differ from the baseline ({recorded['settings']}); not comparing")
+        return 0
+
+    regressions = compare(results, recorded['routes'], args.tolerance, args.slack_ms, args.tail_tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        return 1
+    print('No regressions against the baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
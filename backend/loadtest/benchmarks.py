@@ -0,0 +1,144 @@
+"""
+Micro-benchmarks for the analytics functions: time and peak memory across input sizes.
+
+    cd backend
+    python -m loadtest.benchmarks
+    python -m loadtest.benchmarks --function habit_correlations --scale 4
+
+Each function declares how its cost should grow with its input. The growth
+exponent is fitted from the measurements (log time against log size) and the
+run exits with status 1 when it exceeds the expected exponent by more than
+the margin, so an accidental O(n^2) shows up on the first run.
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Any, List, NamedTuple
+
+from loadtest.synthetic import analytics_inputs
+from services import analytics
+
+
+class Case(NamedTuple):
+    axis: str
+    sizes: List[int]
+    expected_exponent: float
+    build: Callable[[int], Any]
+    run: Callable[[Any], Any]
+
+
+CASES: Dict[str, Case] = {
+    'habit_insights': Case(
+        'habits', [8, 16, 32, 64], 1.0,
+        lambda n: analytics_inputs(habits=n, days=365)['analytics_data'],
+        analytics.habit_insights
+    ),
+    'mood_analysis': Case(
+        'days', [365, 730, 1460, 2920], 1.0,
+        lambda n: analytics_inputs(habits=1, days=n)['mood_checkins'],
+        analytics.mood_analysis
+    ),
+    'habit_correlations': Case(
+        'habits', [8, 16, 32, 64], 2.0,
+        lambda n: analytics_inputs(habits=n, days=90)['analytics_data']['habits'],
+        analytics.habit_correlations
+    ),
+    'streak_prediction': Case(
+        'days', [365, 730, 1460, 2920], 0.0,
+        lambda n: analytics_inputs(habits=1, days=n)['completions'],
+        analytics.streak_prediction
+    ),
+}
+
+
+def time_per_call(run: Callable[[Any], Any], data: Any, repeat: int = 5, min_seconds: float = 0.05) -> float:
+    """Best-of-`repeat` seconds per call, with enough calls per repeat to outlast timer noise"""
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run(data)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            break
+        loops *= 2 if elapsed == 0 else max(2, min(10, math.ceil(min_seconds / elapsed)))
+
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run(data)
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def peak_memory(run: Callable[[Any], Any], data: Any) -> int:
+    """Bytes allocated at the peak of one call, over what was allocated before it"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run(data)
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+
+def growth_exponent(sizes: List[int], seconds: List[float]) -> float:
+    """Least-squares slope of log(time) against log(size)"""
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(value, 1e-12)) for value in seconds]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread if spread else 0.0
+
+
+def benchmark(name: str, case: Case, scale: int) -> Dict[str, Any]:
+    rows = []
+    for size in case.sizes:
+        data = case.build(size * scale)
+        rows.append({
+            case.axis: size * scale,
+            'us_per_call': round(time_per_call(case.run, data) * 1e6, 3),
+            'peak_kib': round(peak_memory(case.run, data) / 1024, 1)
+        })
+    exponent = growth_exponent([row[case.axis] for row in rows], [row['us_per_call'] for row in rows])
+    return {'function': name, 'axis': case.axis, 'expected_exponent': case.expected_exponent,
+            'exponent': round(exponent, 2), 'sizes': rows}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Analytics micro-benchmarks')
+    parser.add_argument('--function', choices=list(CASES), action='append', help='benchmark only these')
+    parser.add_argument('--scale', type=int, default=1, help='multiply every input size')
+    parser.add_argument('--margin', type=float, default=0.4, help='allowed excess over the expected exponent')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    results = []
+    failures = []
+    for name in args.function or list(CASES):
+        result = benchmark(name, CASES[name], args.scale)
+        results.append(result)
+        print(f"{name}  (expected ~n^{result['expected_exponent']:g}, measured n^{result['exponent']:.2f})")
+        for row in result['sizes']:
+            print(f"  {result['axis']:>6} {row[result['axis']]:>7}  {row['us_per_call']:>12.2f} us  {row['peak_kib']:>10.1f} KiB")
+        if result['exponent'] > result['expected_exponent'] + args.margin:
+            failures.append(f"{name}: grows as n^{result['exponent']:.2f}, expected at most "
+                            f"n^{result['expected_exponent'] + args.margin:g}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    for failure in failures:
+        print(f"COMPLEXITY REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Load-test driver: app wiring, workloads, latency statistics and baselines
+"""
+
+import asyncio
+import json
+import math
+import random
+import statistics
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from config import Config
+from database.call_policy import configure_executor
+from database.supabase_client import SupabaseClient, _TableRecorder
+from loadtest.local_backend import LocalClient, LocalStore
+from services.activity_broker import activity_broker
+from services.post_engagement import post_engagement
+
+# p99 is only compared for routes with at least this many baseline requests; below it is mostly noise
+MIN_P99_SAMPLES = 500
+
+# Workload mix used by the 'mixed' profile (weights)
+MIXED_WEIGHTS = {
+    'dashboard_open': 4,
+    'feed_scroll': 3,
+    'completion_burst': 2,
+    'analytics': 1,
+}
+
+
+def local_supabase(store: LocalStore) -> SupabaseClient:
+    """A SupabaseClient wired to the in-memory store (keeps the DB metrics proxy in place)"""
+    supabase = SupabaseClient()
+    supabase.client = _TableRecorder(LocalClient(store))
+    return supabase
+
+
+def _router_clients(dependant, found: set):
+    for dependency in dependant.dependencies:
+        call = dependency.call
+        if getattr(call, '__name__', '') == '<lambda>' and getattr(call, '__module__', '').startswith('routers.'):
+            found.add(call)
+        _router_clients(dependency, found)
+
+
+def use_local_backend(app, store: LocalStore):
+    """Point every router's SupabaseClient dependency at the local store.
+
+    Routers build their client with Depends(lambda: SupabaseClient()); each
+    of those lambdas is overridden on this app only, so the production code
+    paths run unchanged against deterministic data.
+    """
+    supabase = local_supabase(store)
+    found: set = set()
+    for route in app.routes:
+        dependant = getattr(route, 'dependant', None)
+        if dependant is not None:
+            _router_clients(dependant, found)
+    for call in found:
+        app.dependency_overrides[call] = lambda: supabase
+    # The limiter would (correctly) throttle a single key hammering the API
+    Config.RATE_LIMIT_ENABLED = False
+    return supabase
+
+
+@asynccontextmanager
+async def serving(supabase: SupabaseClient):
+    """The in-process services the request paths rely on (main's lifespan minus the DB connect and push delivery)"""
+    configure_executor()
+    await activity_broker.start()
+    post_engagement.start(supabase)
+    try:
+        yield
+    finally:
+        await post_engagement.stop()
+        await activity_broker.stop()
+
+
+# Transports: each returns (status code, parsed JSON body or None, seconds until the response was complete)
+Send = Callable[[str, str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]], Awaitable[Tuple[int, Any, float]]]
+
+
+def asgi_sender(app, api_key: str) -> Send:
+    """Call the ASGI app in-process.
+
+    Latency stops at the final body chunk, as a client would see it; the
+    app's background tasks still run to completion before the call returns.
+    """
+    headers = [(b'authorization', f"Bearer {api_key}".encode()), (b'content-type', b'application/json')]
+
+    async def send_request(method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                           body: Optional[Dict[str, Any]] = None) -> Tuple[int, Any, float]:
+        payload = json.dumps(body).encode() if body is not None else b''
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+            'query_string': urlencode(params or {}).encode(), 'headers': headers,
+            'client': ('127.0.0.1', 50000), 'server': ('loadtest', 80)
+        }
+        sent = False
+        status_code = 500
+        chunks: List[bytes] = []
+        done_at: Optional[float] = None
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': payload, 'more_body': False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            nonlocal status_code, done_at
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+                if not message.get('more_body', False):
+                    done_at = time.perf_counter()
+
+        start = time.perf_counter()
+        await app(scope, receive, send)
+        raw = b''.join(chunks)
+        return status_code, json.loads(raw) if raw else None, (done_at or time.perf_counter()) - start
+
+    return send_request
+
+
+def http_sender(client, api_key: str) -> Send:
+    """Call a running server through an httpx.AsyncClient"""
+    headers = {'Authorization': f"Bearer {api_key}"}
+
+    async def send_request(method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                           body: Optional[Dict[str, Any]] = None) -> Tuple[int, Any, float]:
+        start = time.perf_counter()
+        response = await client.request(method, path, params=params, json=body, headers=headers)
+        elapsed = time.perf_counter() - start
+        return response.status_code, response.json() if response.content else None, elapsed
+
+    return send_request
+
+
+class Recorder:
+    """Latencies and failures per route label"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    async def call(self, send: Send, route: str, method: str, path: str,
+                   params: Optional[Dict[str, Any]] = None, body: Optional[Dict[str, Any]] = None) -> Any:
+        status_code, data, elapsed = await send(method, path, params, body)
+        if self.recording:
+            self.latencies[route].append(elapsed)
+            if status_code >= 400:
+                self.errors[route] += 1
+        return data if status_code < 400 else None
+
+
+class VirtualUser:
+    """One simulated app user running workloads from a seeded random stream"""
+
+    def __init__(self, index: int, seed: int, dataset: Dict[str, Any], send: Send, recorder: Recorder):
+        self.rng = random.Random(seed * 1000003 + index)
+        self.dataset = dataset
+        self.send = send
+        self.recorder = recorder
+        self.user_id = dataset['user_ids'][index % len(dataset['user_ids'])]
+        self.habit_ids = dataset['habits_by_user'][self.user_id]
+        # Shared across runs over the same dataset, so repeated runs never complete a habit twice on one day
+        self._days = dataset.setdefault('completion_days', defaultdict(int))
+
+    async def dashboard_open(self):
+        call, user_id = self.recorder.call, self.user_id
+        await call(self.send, 'GET /habits/', 'GET', '/habits/', {'user_id': user_id})
+        await call(self.send, 'GET /notifications/{user_id}/unread-count', 'GET',
+                   f"/notifications/{user_id}/unread-count")
+        await call(self.send, 'GET /habits/templates/', 'GET', '/habits/templates/')
+        await call(self.send, 'GET /social/feed/{user_id}', 'GET', f"/social/feed/{user_id}", {'limit': 20})
+
+    async def completion_burst(self):
+        # Fresh dates after the seeded history, so every completion is new
+        day = (self.dataset['today'] + timedelta(days=self._days[self.user_id])).isoformat()
+        self._days[self.user_id] += 1
+        for habit_id in self.rng.sample(self.habit_ids, min(3, len(self.habit_ids))):
+            await self.recorder.call(self.send, 'POST /habits/complete', 'POST', '/habits/complete',
+                                     {'user_id': self.user_id}, {'habit_id': habit_id, 'completion_date': day})
+
+    async def analytics(self):
+        call, user_id = self.recorder.call, self.user_id
+        await call(self.send, 'GET /analytics/habit-insights/{user_id}', 'GET', f"/analytics/habit-insights/{user_id}")
+        await call(self.send, 'GET /analytics/advanced/{user_id}', 'GET', f"/analytics/advanced/{user_id}")
+
+    async def feed_scroll(self):
+        params: Dict[str, Any] = {'limit': 20}
+        for _ in range(self.rng.randint(2, 4)):
+            page = await self.recorder.call(self.send, 'GET /social/feed/{user_id}', 'GET',
+                                            f"/social/feed/{self.user_id}", params)
+            if not page or not page.get('next_cursor'):
+                break
+            params = {'limit': 20, 'cursor': page['next_cursor']}
+
+    async def run(self, workloads: Dict[str, int], deadline: float):
+        names = list(workloads)
+        weights = [workloads[name] for name in names]
+        while time.perf_counter() < deadline:
+            await getattr(self, self.rng.choices(names, weights)[0])()
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+def summarize(recorder: Recorder, duration: float) -> Dict[str, Dict[str, float]]:
+    """p50/p95/p99 latency (ms), throughput and error rate per route"""
+    summary = {}
+    for route in sorted(recorder.latencies):
+        values = sorted(recorder.latencies[route])
+        summary[route] = {
+            'requests': len(values),
+            'rps': round(len(values) / duration, 2),
+            'p50_ms': round(_percentile(values, 0.50) * 1000, 3),
+            'p95_ms': round(_percentile(values, 0.95) * 1000, 3),
+            'p99_ms': round(_percentile(values, 0.99) * 1000, 3),
+            'error_rate': round(recorder.errors[route] / len(values), 4)
+        }
+    return summary
+
+
+async def run_load(send: Send, dataset: Dict[str, Any], workloads: Dict[str, int], concurrency: int,
+                   duration: float, warmup: float, seed: int) -> Dict[str, Dict[str, float]]:
+    """Run virtual users for warmup + duration seconds, recording only after the warmup"""
+    recorder = Recorder()
+    users = [VirtualUser(i, seed, dataset, send, recorder) for i in range(concurrency)]
+    start = time.perf_counter()
+    deadline = start + warmup + duration
+
+    async def start_recording():
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+
+    await asyncio.gather(start_recording(), *(user.run(workloads, deadline) for user in users))
+    return summarize(recorder, duration)
+
+
+def median_results(runs: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """Per-route median of every statistic across repeated runs"""
+    merged = {}
+    for route in sorted({route for run in runs for route in run}):
+        rows = [run[route] for run in runs if route in run]
+        merged[route] = {metric: statistics.median(row[metric] for row in rows) for metric in rows[0]}
+    return merged
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float, slack_ms: float, tail_tolerance: Optional[float] = None) -> List[str]:
+    """Regressions of results against a baseline; empty when within tolerance.
+
+    p95/p99 of a short run swing far more between identical runs than the
+    median does, so they get their own (wider) tail_tolerance.
+    """
+    if tail_tolerance is None:
+        tail_tolerance = tolerance
+    regressions = []
+    for route, expected in baseline.items():
+        actual = results.get(route)
+        if actual is None:
+            regressions.append(f"{route}: no requests recorded")
+            continue
+        metrics = ('p50_ms', 'p95_ms', 'p99_ms') if expected['requests'] >= MIN_P99_SAMPLES else ('p50_ms', 'p95_ms')
+        for metric in metrics:
+            limit = expected[metric] * (1 + (tolerance if metric == 'p50_ms' else tail_tolerance)) + slack_ms
+            if actual[metric] > limit:
+                regressions.append(f"{route}: {metric} {actual[metric]:.2f} > {limit:.2f} (baseline {expected[metric]:.2f})")
+        if actual['rps'] < expected['rps'] * (1 - tolerance):
+            regressions.append(f"{route}: rps {actual['rps']:.1f} < {expected['rps'] * (1 - tolerance):.1f} (baseline {expected['rps']:.1f})")
+        if actual['error_rate'] > expected['error_rate'] + 0.01:
+            regressions.append(f"{route}: error rate {actual['error_rate']:.2%} (baseline {expected['error_rate']:.2%})")
+    return regressions
+
+
+def format_table(results: Dict[str, Dict[str, float]], baseline: Optional[Dict[str, Dict[str, float]]] = None) -> str:
+    lines = [f"{'route':<46} {'reqs':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'err':>6}  p95 vs baseline"]
+    for route, row in results.items():
+        delta = ''
+        if baseline and route in baseline and baseline[route]['p95_ms']:
+            delta = f"{(row['p95_ms'] / baseline[route]['p95_ms'] - 1):+.0%}"
+        lines.append(
+            f"{route:<46} {row['requests']:>7} {row['rps']:>8.1f} {row['p50_ms']:>9.2f} "
+            f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['error_rate']:>6.1%}  {delta}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,430 @@
+"""
+In-memory stand-in for the Supabase client, for load tests
+
+Implements the part of the PostgREST query builder that SupabaseClient
+uses (filters, or_ expressions, embedded resources, ordering, counts and
+upserts) over plain lists of dicts, with hash indexes on filtered columns.
+"""
+
+import itertools
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+
+class LocalAPIError(Exception):
+    """Raised where PostgREST would answer with an error (e.g. a unique violation)"""
+
+
+# Unique constraints from complete_habit_tracker_schema.sql, used for upserts and inserts
+UNIQUE_KEYS: Dict[str, List[Tuple[str, ...]]] = {
+    'habit_completions': [('habit_id', 'completion_date')],
+    'streaks': [('habit_id', 'user_id')],
+    'user_progress': [('user_id',)],
+    'friends': [('user_id', 'friend_id')],
+    'challenge_participants': [('challenge_id', 'user_id')],
+    'post_likes': [('post_id', 'user_id')],
+    'mood_checkins': [('user_id', 'checkin_date')],
+    'followers': [('follower_id', 'following_id')],
+    'notification_schedules': [('habit_id', 'schedule_type')],
+    'notifications': [('dedupe_key',)],
+}
+
+# Column defaults the API relies on
+DEFAULTS: Dict[str, Dict[str, Any]] = {
+    'habits': {'is_active': True},
+    'habit_completions': {'completion_value': 1},
+    'social_posts': {'likes_count': 0, 'comments_count': 0},
+    'notifications': {'is_read': False, 'sent_at': None, 'failed_at': None, 'delivery_attempts': 0},
+    'friends': {'status': 'pending'},
+}
+
+# Timestamp columns that default to NOW() besides created_at
+NOW_DEFAULTS: Dict[str, Tuple[str, ...]] = {
+    'habit_completions': ('completion_time',),
+}
+
+_ids = itertools.count(1)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _singular(table: str) -> str:
+    return table[:-1] if table.endswith('s') and not table.endswith('ss') else table
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Split on commas that are not inside parentheses or quotes"""
+    parts, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            parts.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    if current:
+        parts.append(''.join(current).strip())
+    return [part for part in parts if part]
+
+
+def _coerce(row_value: Any, value: Any) -> Any:
+    """Convert a filter value written as text to the type of the stored value"""
+    if not isinstance(value, str) or isinstance(row_value, str) or row_value is None:
+        return value
+    if isinstance(row_value, bool):
+        return value.lower() == 'true'
+    if isinstance(row_value, (int, float)):
+        return float(value)
+    return value
+
+
+def _get(row: Dict[str, Any], column: str) -> Any:
+    for part in column.split('.'):
+        if not isinstance(row, dict):
+            return None
+        row = row.get(part)
+    return row
+
+
+def _compare(row_value: Any, op: str, value: Any) -> bool:
+    if op == 'is':
+        if value is None or value == 'null':
+            return row_value is None
+        return row_value is _coerce(True, value)
+    if op == 'in':
+        return row_value in {_coerce(row_value, v) for v in value}
+    if row_value is None:
+        return False
+    value = _coerce(row_value, value)
+    if op == 'eq':
+        return row_value == value
+    if op == 'neq':
+        return row_value != value
+    if op == 'gt':
+        return row_value > value
+    if op == 'gte':
+        return row_value >= value
+    if op == 'lt':
+        return row_value < value
+    if op == 'lte':
+        return row_value <= value
+    raise LocalAPIError(f"Unsupported operator '{op}'")
+
+
+def _parse_condition(text: str) -> Callable[[Dict[str, Any]], bool]:
+    """Compile one term of a PostgREST logic expression, e.g. created_at.lt."x" or and(a.eq.1,b.is.null)"""
+    group = re.match(r'^(and|or)\((.*)\)$', text)
+    if group:
+        terms = [_parse_condition(term) for term in _split_top_level(group.group(2))]
+        combine = all if group.group(1) == 'and' else any
+        return lambda row: combine(term(row) for term in terms)
+
+    column, rest = text.split('.', 1)
+    negate = rest.startswith('not.')
+    if negate:
+        rest = rest[len('not.'):]
+    op, value = rest.split('.', 1)
+    if op == 'in':
+        value = [v.strip('"') for v in _split_top_level(value[1:-1])]
+    else:
+        value = value.strip('"')
+    return lambda row: _compare(_get(row, column), op, value) != negate
+
+
+class LocalResponse:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class LocalStore:
+    """Tables as lists of rows, with hash indexes built on first use"""
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        # Queries run on worker threads, as the real client's do; one at a time here
+        self.lock = threading.Lock()
+        self.tables: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._indexes: Dict[Tuple[str, str], Dict[Any, List[Dict[str, Any]]]] = {}
+
+    def index(self, table: str, column: str) -> Dict[Any, List[Dict[str, Any]]]:
+        index = self._indexes.get((table, column))
+        if index is None:
+            index = defaultdict(list)
+            for row in self.tables[table]:
+                index[row.get(column)].append(row)
+            self._indexes[(table, column)] = index
+        return index
+
+    def size(self) -> int:
+        return sum(len(rows) for rows in self.tables.values())
+
+    def invalidate(self, table: str):
+        for key in [key for key in self._indexes if key[0] == table]:
+            del self._indexes[key]
+
+    def add(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = {**DEFAULTS.get(table, {}), **row}
+        row.setdefault('id', f"{_singular(table)}-{next(_ids)}")
+        row.setdefault('created_at', _now())
+        for column in NOW_DEFAULTS.get(table, ()):
+            row.setdefault(column, row['created_at'])
+        self.tables[table].append(row)
+        for (indexed_table, column), index in self._indexes.items():
+            if indexed_table == table:
+                index[row.get(column)].append(row)
+        return row
+
+    def find_unique(self, table: str, row: Dict[str, Any], columns: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+        if any(row.get(column) is None for column in columns):
+            return None
+        for candidate in self.index(table, columns[0]).get(row[columns[0]], []):
+            if all(candidate.get(column) == row[column] for column in columns[1:]):
+                return candidate
+        return None
+
+
+class LocalQuery:
+    """One PostgREST request being built (select, insert, upsert, update or delete)"""
+
+    def __init__(self, store: LocalStore, table: str):
+        self.store = store
+        self.table = table
+        self.action = 'select'
+        self.columns = '*'
+        self.count: Optional[str] = None
+        self.payload: Any = None
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+        self.returning = 'representation'
+        self.filters: List[Tuple[str, str, Any, bool]] = []
+        self.conditions: List[Callable[[Dict[str, Any]], bool]] = []
+        self.orders: List[Tuple[str, bool]] = []
+        self.limit_count: Optional[int] = None
+        self.offset = 0
+        self._negate = False
+
+    # Actions
+    def select(self, columns: str = '*', count: Optional[str] = None):
+        self.columns = columns
+        self.count = count
+        return self
+
+    def insert(self, data, returning: str = 'representation', **kwargs):
+        self.action, self.payload, self.returning = 'insert', data, returning
+        return self
+
+    def upsert(self, data, on_conflict: str = '', ignore_duplicates: bool = False,
+               returning: str = 'representation', **kwargs):
+        self.action, self.payload, self.returning = 'upsert', data, returning
+        self.on_conflict = on_conflict or None
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, data, **kwargs):
+        self.action, self.payload = 'update', data
+        return self
+
+    def delete(self, **kwargs):
+        self.action = 'delete'
+        return self
+
+    # Filters
+    @property
+    def not_(self):
+        self._negate = True
+        return self
+
+    def _filter(self, column: str, op: str, value: Any):
+        self.filters.append((column, op, value, self._negate))
+        self._negate = False
+        return self
+
+    def eq(self, column: str, value: Any):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column: str, value: Any):
+        return self._filter(column, 'neq', value)
+
+    def gt(self, column: str, value: Any):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column: str, value: Any):
+        return self._filter(column, 'gte', value)
+
+    def lt(self, column: str, value: Any):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column: str, value: Any):
+        return self._filter(column, 'lte', value)
+
+    def in_(self, column: str, values):
+        return self._filter(column, 'in', list(values))
+
+    def is_(self, column: str, value: Any):
+        return self._filter(column, 'is', value)
+
+    def or_(self, filters: str, **kwargs):
+        terms = [_parse_condition(term) for term in _split_top_level(filters)]
+        self.conditions.append(lambda row: any(term(row) for term in terms))
+        return self
+
+    def order(self, column: str, desc: bool = False, **kwargs):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count: int, **kwargs):
+        self.limit_count = count
+        return self
+
+    def range(self, start: int, end: int, **kwargs):
+        self.offset = start
+        self.limit_count = end - start + 1
+        return self
+
+    # Execution
+    def _candidates(self) -> List[Dict[str, Any]]:
+        """Narrow the scan with an index on the first eq/in filter of a top-level column"""
+        for column, op, value, negate in self.filters:
+            if negate or '.' in column:
+                continue
+            if op == 'eq':
+                return list(self.store.index(self.table, column).get(value, []))
+            if op == 'in':
+                index = self.store.index(self.table, column)
+                return [row for key in dict.fromkeys(value) for row in index.get(key, [])]
+        return list(self.store.tables[self.table])
+
+    def _embed(self, row: Dict[str, Any], name: str, columns: str) -> Any:
+        foreign_key = f"{_singular(name)}_id"
+        if foreign_key in row:
+            matches = self.store.index(name, 'id').get(row[foreign_key], [])
+            return _project(self.store, name, matches[0], columns) if matches else None
+        children = self.store.index(name, f"{_singular(self.table)}_id").get(row.get('id'), [])
+        return [_project(self.store, name, child, columns) for child in children]
+
+    def _matching(self) -> List[Dict[str, Any]]:
+        rows = self._candidates()
+        embeds = _parse_columns(self.columns)[1] if self.action == 'select' else []
+        if embeds:
+            shaped = []
+            for row in rows:
+                row = dict(row)
+                for name, inner, columns in embeds:
+                    row[name] = self._embed(row, name, columns)
+                if all(row[name] for name, inner, _ in embeds if inner):
+                    shaped.append(row)
+            rows = shaped
+        for column, op, value, negate in self.filters:
+            rows = [row for row in rows if _compare(_get(row, column), op, value) != negate]
+        for condition in self.conditions:
+            rows = [row for row in rows if condition(row)]
+        return rows
+
+    def execute(self) -> LocalResponse:
+        if self.store.latency_seconds:
+            # Blocking, like the real client's synchronous execute()
+            time.sleep(self.store.latency_seconds)
+        with self.store.lock:
+            return self._execute()
+
+    def _execute(self) -> LocalResponse:
+        if self.action in ('insert', 'upsert'):
+            return self._write()
+        rows = self._matching()
+
+        if self.action == 'update':
+            # Rows are the stored dicts themselves here (only selects embed)
+            for row in rows:
+                row.update(self.payload)
+            self.store.invalidate(self.table)
+            return LocalResponse([dict(row) for row in rows])
+        if self.action == 'delete':
+            doomed = {row['id'] for row in rows}
+            self.store.tables[self.table] = [row for row in self.store.tables[self.table] if row['id'] not in doomed]
+            self.store.invalidate(self.table)
+            return LocalResponse(rows)
+
+        for column, desc in reversed(self.orders):
+            present = [row for row in rows if _get(row, column) is not None]
+            missing = [row for row in rows if _get(row, column) is None]
+            present.sort(key=lambda row: _get(row, column), reverse=desc)
+            # PostgreSQL puts NULLs last ascending and first descending
+            rows = missing + present if desc else present + missing
+        count = len(rows) if self.count else None
+        end = None if self.limit_count is None else self.offset + self.limit_count
+        rows = rows[self.offset:end]
+        return LocalResponse([_project(self.store, self.table, row, self.columns) for row in rows], count)
+
+    def _write(self) -> LocalResponse:
+        rows = self.payload if isinstance(self.payload, list) else [self.payload]
+        # Like PostgREST, an upsert without on_conflict resolves conflicts on the primary key only
+        conflict_key = tuple(c.strip() for c in self.on_conflict.split(',')) if self.on_conflict else ('id',)
+        written = []
+        for row in rows:
+            existing = self.store.find_unique(self.table, row, conflict_key) if self.action == 'upsert' else None
+            if existing is None:
+                for columns in UNIQUE_KEYS.get(self.table, []) + [('id',)]:
+                    if self.store.find_unique(self.table, row, columns) is not None:
+                        raise LocalAPIError(f"duplicate key value violates unique constraint on {self.table} {columns}")
+                written.append(self.store.add(self.table, row))
+            elif not self.ignore_duplicates:
+                existing.update(row)
+                self.store.invalidate(self.table)
+                written.append(existing)
+        data = [] if self.returning == 'minimal' else [dict(row) for row in written]
+        return LocalResponse(data)
+
+
+def _parse_columns(columns: str) -> Tuple[List[str], List[Tuple[str, bool, str]]]:
+    """Split a select list into plain columns and embedded resources (name, inner join, columns)"""
+    plain, embeds = [], []
+    for part in _split_top_level(columns):
+        embed = re.match(r'^([\w]+)(!inner)?\((.*)\)$', part, re.S)
+        if embed:
+            embeds.append((embed.group(1), bool(embed.group(2)), embed.group(3)))
+        else:
+            plain.append(part)
+    return plain, embeds
+
+
+def _project(store: LocalStore, table: str, row: Dict[str, Any], columns: str) -> Dict[str, Any]:
+    plain, embeds = _parse_columns(columns)
+    result = dict(row) if '*' in plain else {column: row.get(column) for column in plain}
+    for name, _, _ in embeds:
+        if name in row:
+            result[name] = row[name]
+    return result
+
+
+class LocalRPC:
+    def __init__(self, fn: str):
+        self.fn = fn
+
+    def execute(self) -> LocalResponse:
+        # Database functions (claim_due_notifications) are not emulated
+        return LocalResponse([])
+
+
+class LocalClient:
+    """Drop-in for supabase.Client backed by a LocalStore"""
+
+    def __init__(self, store: LocalStore):
+        self.store = store
+
+    def table(self, name: str) -> LocalQuery:
+        return LocalQuery(self.store, name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None) -> LocalRPC:
+        return LocalRPC(fn)
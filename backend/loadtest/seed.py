@@ -0,0 +1,95 @@
+"""
+Deterministic seed data for load tests: users, habits and years of completions
+"""
+
+import random
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional
+
+from loadtest.local_backend import LocalStore
+from loadtest.synthetic import HABIT_NAMES, ICONS, iso, user_history
+
+TIMEZONES = ['UTC', 'America/New_York', 'Europe/Berlin', 'Asia/Tokyo', 'America/Los_Angeles', 'Asia/Kolkata']
+
+
+def seed_store(store: LocalStore, users: int = 200, habits_per_user: int = 6, days: int = 730,
+               friends_per_user: int = 10, posts_per_user: int = 30, seed: int = 42,
+               today: Optional[date] = None) -> Dict[str, Any]:
+    """Fill a store with realistic, reproducible data ending yesterday.
+
+    The same arguments always produce the same rows (relative to today).
+    Returns the IDs workloads need: user IDs and each user's habit IDs.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    start = today - timedelta(days=days)
+    user_ids = [f"user-{i:05d}" for i in range(users)]
+    habits_by_user: Dict[str, List[str]] = {}
+
+    for i, user_id in enumerate(user_ids):
+        store.add('profiles', {
+            'id': user_id,
+            'email': f"{user_id}@example.com",
+            'username': f"user{i}",
+            'display_name': f"User {i}",
+            'avatar_url': None,
+            'timezone': TIMEZONES[i % len(TIMEZONES)],
+            'level': rng.randint(1, 30),
+            'current_streak': rng.randint(0, 60),
+            'created_at': iso(start, 9, 0)
+        })
+        store.add('user_progress', {
+            'user_id': user_id,
+            'total_xp': rng.randint(0, 50000),
+            'level': rng.randint(1, 30)
+        })
+
+        history = user_history(rng, user_id, i, habits_per_user, days, start)
+        for table, rows in history.items():
+            for row in rows:
+                store.add(table, row)
+        habits_by_user[user_id] = [habit['id'] for habit in history['habits']]
+
+        for n in range(posts_per_user):
+            day = start + timedelta(days=rng.randrange(days))
+            store.add('social_posts', {
+                'user_id': user_id,
+                'content': f"Day {n} of keeping it up!",
+                'likes_count': rng.randint(0, 50),
+                'comments_count': rng.randint(0, 10),
+                'created_at': iso(day, rng.randint(0, 23), rng.randint(0, 59))
+            })
+
+        for n in range(20):
+            day = today - timedelta(days=rng.randrange(30))
+            store.add('notifications', {
+                'user_id': user_id,
+                'title': 'Time for your habit!',
+                'body': "Don't break the streak",
+                'type': 'reminder',
+                'is_read': rng.random() < 0.7,
+                'scheduled_for': iso(day, 8, 0),
+                'sent_at': iso(day, 8, 0),
+                'created_at': iso(day, 8, 0)
+            })
+
+    pairs = set()
+    for i, user_id in enumerate(user_ids):
+        for other in rng.sample(range(users), min(friends_per_user, users - 1)):
+            if other != i and (other, i) not in pairs:
+                pairs.add((i, other))
+        for other in rng.sample(range(users), min(friends_per_user + 5, users - 1)):
+            if other != i:
+                store.add('followers', {'follower_id': user_id, 'following_id': user_ids[other]})
+    for a, b in sorted(pairs):
+        store.add('friends', {'user_id': user_ids[a], 'friend_id': user_ids[b], 'status': 'accepted'})
+
+    for n in range(20):
+        store.add('habit_templates', {
+            'name': HABIT_NAMES[n % len(HABIT_NAMES)],
+            'icon': ICONS[n % len(ICONS)],
+            'category': 'health',
+            'is_active': True
+        })
+
+    return {'user_ids': user_ids, 'habits_by_user': habits_by_user, 'today': today}
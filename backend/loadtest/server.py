@@ -0,0 +1,44 @@
+"""
+Serve the API over HTTP against a seeded local store (used by `python -m loadtest --mode http`)
+"""
+
+import argparse
+import asyncio
+import time
+
+import uvicorn
+
+from loadtest.harness import serving, use_local_backend
+from loadtest.local_backend import LocalStore
+from loadtest.seed import seed_store
+
+
+async def serve(host: str, port: int, users: int, days: int, seed: int, db_latency_ms: float):
+    from main import app
+
+    store = LocalStore(latency_seconds=db_latency_ms / 1000)
+    started = time.perf_counter()
+    seed_store(store, users=users, days=days, seed=seed)
+    print(f"Seeded {store.size()} rows in {time.perf_counter() - started:.1f}s", flush=True)
+
+    supabase = use_local_backend(app, store)
+    # main's lifespan would connect to the configured Supabase project
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, lifespan='off', log_level='warning', log_config=None))
+    async with serving(supabase):
+        await server.serve()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db-latency-ms', type=float, default=2.0)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.users, args.days, args.seed, args.db_latency_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Seeded synthetic habits, completions and mood check-ins at any scale
+"""
+
+import random
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Any, List, Optional
+
+HABIT_NAMES = [
+    'Drink water', 'Morning run', 'Read 20 pages', 'Meditate', 'Journal', 'Stretch',
+    'No sugar', 'Learn Spanish', 'Walk 10k steps', 'Sleep by 11', 'Practice guitar', 'Floss'
+]
+ICONS = ['water', 'run', 'book', 'spa', 'edit', 'yoga', 'cake', 'language', 'walk', 'bed', 'music', 'tooth']
+
+
+def iso(day: date, hour: int, minute: int) -> str:
+    return datetime.combine(day, time(hour, minute), tzinfo=timezone.utc).isoformat()
+
+
+def user_history(rng: random.Random, user_id: str, index: int, habits: int, days: int,
+                 start: date) -> Dict[str, List[Dict[str, Any]]]:
+    """Rows for one user's habits, completions, streaks and mood check-ins, by table.
+
+    Every habit has its own adherence, which drifts each quarter, so
+    completion counts and streaks vary the way real histories do.
+    Completions and check-ins are in date order.
+    """
+    rows: Dict[str, List[Dict[str, Any]]] = {
+        'habits': [], 'habit_completions': [], 'streaks': [], 'mood_checkins': []
+    }
+
+    for j in range(habits):
+        habit_id = f"habit-{index:05d}-{j:02d}"
+        preferred_hour = rng.choice([6, 7, 8, 12, 18, 20, 21])
+        rows['habits'].append({
+            'id': habit_id,
+            'user_id': user_id,
+            'name': HABIT_NAMES[(index + j) % len(HABIT_NAMES)],
+            'icon': ICONS[(index + j) % len(ICONS)],
+            'frequency': 'daily',
+            'goal': 1,
+            'goal_unit': 'times',
+            'priority': rng.randint(1, 3),
+            'xp_reward': 10,
+            'is_active': rng.random() > 0.1,
+            'has_reminder': rng.random() > 0.5,
+            'reminder_time': f"{preferred_hour:02d}:00:00",
+            'reminder_days': [0, 1, 2, 3, 4, 5, 6],
+            'created_at': iso(start, 9, 0)
+        })
+
+        adherence = rng.uniform(0.3, 0.95)
+        streak = best = 0
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            if rng.random() < adherence:
+                rows['habit_completions'].append({
+                    'id': f"completion-{habit_id}-{offset}",
+                    'habit_id': habit_id,
+                    'user_id': user_id,
+                    'completion_date': day.isoformat(),
+                    'completion_value': 1,
+                    'completion_time': iso(day, preferred_hour, rng.randint(0, 59)),
+                    'created_at': iso(day, preferred_hour, 0)
+                })
+                streak += 1
+                best = max(best, streak)
+            else:
+                streak = 0
+            if offset % 90 == 89:
+                adherence = min(0.98, max(0.1, adherence + rng.uniform(-0.1, 0.1)))
+        rows['streaks'].append({
+            'habit_id': habit_id,
+            'user_id': user_id,
+            'current_streak': streak,
+            'best_streak': best
+        })
+
+    for offset in range(days):
+        if rng.random() < 0.5:
+            day = start + timedelta(days=offset)
+            rows['mood_checkins'].append({
+                'user_id': user_id,
+                'checkin_date': day.isoformat(),
+                'mood_rating': rng.randint(1, 5),
+                'created_at': iso(day, 21, 0)
+            })
+
+    return rows
+
+
+def analytics_inputs(habits: int = 6, days: int = 365, seed: int = 42,
+                     today: Optional[date] = None) -> Dict[str, Any]:
+    """One user's data shaped as the analytics functions receive it.
+
+    analytics_data matches SupabaseClient.get_habit_analytics (completions
+    embedded in each habit); mood_checkins are newest first, as
+    get_mood_checkins orders them; completions belong to the first habit.
+    """
+    rng = random.Random(seed)
+    today = today or date.today()
+    user_id = 'user-00000'
+    rows = user_history(rng, user_id, 0, habits, days, today - timedelta(days=days))
+
+    by_habit: Dict[str, List[Dict[str, Any]]] = {habit['id']: [] for habit in rows['habits']}
+    for completion in rows['habit_completions']:
+        by_habit[completion['habit_id']].append(completion)
+    embedded = [{**habit, 'habit_completions': by_habit[habit['id']]} for habit in rows['habits']]
+
+    return {
+        'analytics_data': {
+            'habits': embedded,
+            'streaks': rows['streaks'],
+            'progress': {'user_id': user_id, 'total_xp': rng.randint(0, 50000), 'level': rng.randint(1, 30)}
+        },
+        'mood_checkins': rows['mood_checkins'][::-1],
+        'completions': by_habit[embedded[0]['id']] if embedded else []
+    }
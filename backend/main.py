@@ -3,12 +3,15 @@ FastAPI Backend for Habit Tracker App
 Main application entry point with API key authentication
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Request, status
+from fastapi.exception_handlers import http_exception_handler
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from contextlib import asynccontextmanager
+import math
 import os
 from dotenv import load_dotenv
+from starlette.exceptions import HTTPException as StarletteHTTPException
 import uvicorn
 
 from routers import (
@@ -18,11 +21,28 @@ from routers import (
     notifications,
     health,
     auth,
+    admin,
+    realtime,
+    metrics,
     test
 )
-from middleware.auth_middleware import verify_api_key
+from middleware.compression import CompressionMiddleware
+from middleware.metrics import MetricsMiddleware
+from middleware.request_id import RequestIdMiddleware
+from middleware.tracing import TracingMiddleware, trace_routes
+from middleware.auth_middleware import jwt_verifier, verify_admin_key, verify_api_key, verify_user_scope
+from middleware.rate_limit import enforce_rate_limit
+from database.call_policy import configure_executor
+from database.circuit_breaker import CircuitOpenError, db_breaker
 from database.supabase_client import SupabaseClient
+from services.activity_broker import activity_broker
+from services.notification_delivery import delivery_pipeline
+from services.notification_dispatcher import notification_dispatcher
+from services.post_engagement import post_engagement
+from services.reminder_scheduler import reminder_materializer
+from config import Config
 from utils.logger import setup_logger
+from utils.responses import TracedJSONResponse, serialize_directly
 
 # Load environment variables
 load_dotenv()
@@ -43,12 +63,20 @@ async def lifespan(app: FastAPI):
     
     # Startup
     logger.info("Starting Habit Tracker API...")
+    configure_executor()
+    await activity_broker.start()
+    await jwt_verifier.start()
     
     try:
         # Initialize Supabase client
         supabase_client = SupabaseClient()
         await supabase_client.initialize()
         app.state.supabase = supabase_client
+        if supabase_client.client is not None:
+            db_breaker.start(supabase_client.probe)
+        post_engagement.start(supabase_client)
+        notification_dispatcher.start(supabase_client, delivery_pipeline.deliver)
+        reminder_materializer.start(supabase_client)
         logger.info("Supabase client initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize Supabase client: {str(e)}")
@@ -62,6 +90,18 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down Habit Tracker API...")
+    await reminder_materializer.stop()
+    await notification_dispatcher.stop()
+    await db_breaker.stop()
+    
+    try:
+        await post_engagement.stop()
+    except Exception as e:
+        logger.error(f"Error flushing post engagement: {str(e)}")
+    
+    await activity_broker.stop()
+    await jwt_verifier.stop()
+    
     try:
         if supabase_client:
             await supabase_client.close()
@@ -76,9 +116,29 @@ app = FastAPI(
     title="Habit Tracker API",
     description="AI-powered habit tracking API with social features",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=TracedJSONResponse
 )
 
+def _database_unavailable():
+    return TracedJSONResponse(
+        {"detail": "Database temporarily unavailable"},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(math.ceil(Config.DB_BREAKER_RECOVERY_SECONDS))}
+    )
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    """The circuit is open and the call had no remembered result to fall back on"""
+    return _database_unavailable()
+
+@app.exception_handler(StarletteHTTPException)
+async def http_error_handler(request: Request, exc: StarletteHTTPException):
+    """Routers turn unexpected errors into 500s; one raised while the circuit is open is a 503"""
+    if exc.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR and isinstance(exc.__context__, CircuitOpenError):
+        return _database_unavailable()
+    return await http_exception_handler(request, exc)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -88,6 +148,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if Config.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=Config.COMPRESSION_MIN_BYTES,
+        gzip_level=Config.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=Config.COMPRESSION_BROTLI_QUALITY
+    )
+
+if Config.TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
+app.add_middleware(RequestIdMiddleware)
+
+# Outermost, so request latency includes every other middleware
+if Config.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(
     auth.router,
@@ -100,28 +177,42 @@ app.include_router(
     habits.router,
     prefix="/habits",
     tags=["Habits"],
-    dependencies=[Depends(verify_api_key)]
+    dependencies=[Depends(verify_api_key), Depends(verify_user_scope), Depends(enforce_rate_limit)]
 )
 
 app.include_router(
     analytics.router,
     prefix="/analytics",
     tags=["Analytics"],
-    dependencies=[Depends(verify_api_key)]
+    dependencies=[Depends(verify_api_key), Depends(verify_user_scope), Depends(enforce_rate_limit)]
 )
 
 app.include_router(
     social.router,
     prefix="/social",
     tags=["Social"],
-    dependencies=[Depends(verify_api_key)]
+    dependencies=[Depends(verify_api_key), Depends(verify_user_scope), Depends(enforce_rate_limit)]
 )
 
 app.include_router(
     notifications.router,
     prefix="/notifications",
     tags=["Notifications"],
-    dependencies=[Depends(verify_api_key)]
+    dependencies=[Depends(verify_api_key), Depends(verify_user_scope), Depends(enforce_rate_limit)]
+)
+
+app.include_router(
+    admin.router,
+    prefix="/admin",
+    tags=["Admin"],
+    dependencies=[Depends(verify_api_key), Depends(verify_admin_key)]
+)
+
+# WebSocket handshakes cannot carry the bearer dependency; the endpoint checks the key itself
+app.include_router(
+    realtime.router,
+    prefix="/ws",
+    tags=["Realtime"]
 )
 
 app.include_router(
@@ -130,12 +221,26 @@ app.include_router(
     tags=["Test"]
 )
 
+if Config.METRICS_ENABLED:
+    app.include_router(
+        metrics.router,
+        prefix="/metrics",
+        tags=["Metrics"],
+        # Per-route traffic, DB call counts and circuit state are operational data; scrape with X-Admin-Key
+        dependencies=[Depends(verify_admin_key)]
+    )
+
 app.include_router(
     health.router,
     prefix="/health",
     tags=["Health"]
 )
 
+serialize_directly(app.routes)
+
+if Config.TRACING_ENABLED:
+    trace_routes(app.routes)
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -195,7 +300,9 @@ if __name__ == "__main__":
             host=host,
             port=port,
             reload=reload,
-            log_level="info"
+            log_level="info",
+            # Keep uvicorn's own handlers off so its access and error logs go through the root queue
+            log_config=None
         )
     except Exception as e:
         logger.error(f"Failed to start server: {str(e)}")
@@ -2,10 +2,18 @@
 Authentication middleware for API key verification
 """
 
-from fastapi import HTTPException, Depends, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi import HTTPException, Depends, Request, WebSocket, status
+from fastapi.security import APIKeyHeader, HTTPBearer, HTTPAuthorizationCredentials
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+from jose import JWTError, jwk, jwt
 from config import Config
+from utils.metrics import cache_counters
+import asyncio
+import hmac
+import httpx
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -88,3 +96,249 @@ async def verify_api_key_optional(credentials: HTTPAuthorizationCredentials = De
     except Exception as e:
         logger.error(f"Error in optional API key verification: {str(e)}")
         return {"api_key": None, "authenticated": False}
+
+def verify_websocket_api_key(websocket: WebSocket) -> bool:
+    """
+    Verify the API key of a WebSocket handshake
+    
+    Browsers cannot set headers on WebSocket connections, so the key may
+    also be passed as the api_key query parameter.
+    """
+    api_key = websocket.query_params.get("api_key")
+    authorization = websocket.headers.get("authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:].strip()
+    
+    if not Config.FASTAPI_API_KEY:
+        logger.error("FASTAPI_API_KEY not configured in environment")
+        return False
+    
+    if not api_key or api_key != Config.FASTAPI_API_KEY:
+        logger.warning("Invalid API key on WebSocket connection")
+        return False
+    
+    return True
+
+def is_admin_key(admin_key: Optional[str]) -> bool:
+    """Whether admin_key is the configured admin key (never true while none is configured)"""
+    if not Config.ADMIN_API_KEY or not admin_key:
+        return False
+    return hmac.compare_digest(admin_key.encode(), Config.ADMIN_API_KEY.encode())
+
+admin_key_header = APIKeyHeader(name="X-Admin-Key", auto_error=False)
+
+async def verify_admin_key(admin_key: Optional[str] = Depends(admin_key_header)):
+    """
+    Verify the admin key from the X-Admin-Key header
+    
+    The app's API key ships in the mobile client, so it cannot guard
+    operational endpoints; this key stays on the server side.
+    """
+    if not Config.ADMIN_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin API is disabled"
+        )
+    if not is_admin_key(admin_key):
+        logger.warning("Invalid admin key attempt")
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin key is required"
+        )
+    return True
+
+# Unknown key IDs trigger a JWKS refresh at most this often
+MIN_JWKS_REFRESH_SECONDS = 60
+
+# Algorithm for JWKS keys that do not name one, by key type
+DEFAULT_KEY_ALGORITHMS = {'RSA': 'RS256', 'EC': 'ES256'}
+
+CLAIMS_HITS, CLAIMS_MISSES = cache_counters('jwt_claims')
+
+class JWTVerifier:
+    """
+    Local verification of Supabase user JWTs
+    
+    Signing keys (the HS256 project secret and/or the project's JWKS) are
+    built once and the JWKS is refreshed in the background, so verification
+    never makes a network call. Verified claims are kept in a small LRU until
+    the token expires, making repeat requests with the same token a dict lookup.
+    Each key only accepts its own algorithm; the token header's 'alg' merely
+    picks between the JWKS and the secret, never how a signature is checked.
+    """
+    
+    def __init__(self, secret: Optional[str], jwks_url: Optional[str], audience: Optional[str],
+                 refresh_seconds: int = 3600, cache_size: int = 10000):
+        self.jwks_url = jwks_url
+        self.audience = audience
+        self.refresh_seconds = refresh_seconds
+        self.cache_size = cache_size
+        self._secret_key = jwk.construct(secret, 'HS256') if secret else None
+        # kid -> (key, the one algorithm it verifies)
+        self._keys: Dict[str, Tuple[Any, str]] = {}
+        self._claims: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refreshed_at = float('-inf')
+    
+    async def start(self):
+        """Load the JWKS and keep refreshing it in the background"""
+        if self.jwks_url and self._task is None:
+            await self.refresh_keys()
+            self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def refresh_keys(self):
+        """Fetch the JWKS and swap in its keys"""
+        self._refreshed_at = time.monotonic()
+        try:
+            async with httpx.AsyncClient(timeout=10) as client:
+                response = await client.get(self.jwks_url)
+                response.raise_for_status()
+            keys = {}
+            for key in response.json().get('keys', []):
+                try:
+                    alg = key.get('alg') or DEFAULT_KEY_ALGORITHMS[key.get('kty')]
+                    keys[key['kid']] = (jwk.construct(key, alg), alg)
+                except Exception as e:
+                    logger.warning(f"Skipping unusable JWKS key {key.get('kid')}: {str(e)}")
+            self._keys = keys
+        except Exception as e:
+            logger.warning(f"Could not refresh JWKS (keeping {len(self._keys)} cached keys): {str(e)}")
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self.refresh_keys()
+    
+    def _schedule_refresh(self):
+        """Refresh soon without blocking the request (e.g. after a key rotation)"""
+        if not self.jwks_url or time.monotonic() - self._refreshed_at < MIN_JWKS_REFRESH_SECONDS:
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self.refresh_keys())
+    
+    def verify(self, token: str) -> Dict[str, Any]:
+        """Return the verified claims of a token; raises JWTError if it is not valid"""
+        claims = self._claims.get(token)
+        if claims is not None:
+            if claims.get('exp', 0) > time.time():
+                self._claims.move_to_end(token)
+                CLAIMS_HITS.inc()
+                return claims
+            del self._claims[token]
+        CLAIMS_MISSES.inc()
+        
+        header = jwt.get_unverified_header(token)
+        key, alg = self._keys.get(header.get('kid'), (None, None)) if header.get('kid') else (None, None)
+        if key is None and header.get('alg') == 'HS256' and self._secret_key is not None:
+            key, alg = self._secret_key, 'HS256'
+        if key is None:
+            self._schedule_refresh()
+            raise JWTError("No signing key for token")
+        
+        claims = jwt.decode(
+            token, key, algorithms=[alg], audience=self.audience,
+            options={'verify_aud': bool(self.audience), 'require_exp': True, 'require_sub': True}
+        )
+        self._claims[token] = claims
+        if len(self._claims) > self.cache_size:
+            self._claims.popitem(last=False)
+        return claims
+
+
+jwt_verifier = JWTVerifier(
+    secret=Config.SUPABASE_JWT_SECRET,
+    jwks_url=Config.SUPABASE_JWKS_URL,
+    audience=Config.SUPABASE_JWT_AUDIENCE,
+    refresh_seconds=Config.JWKS_REFRESH_SECONDS,
+    cache_size=Config.JWT_CLAIMS_CACHE_SIZE
+)
+
+# The Authorization header carries the API key, so user tokens travel separately
+user_token_header = APIKeyHeader(name="X-User-Token", auto_error=False)
+
+async def get_optional_user(token: Optional[str] = Depends(user_token_header)) -> Optional[Dict[str, Any]]:
+    """
+    Authenticated user from the X-User-Token header, or None if no token was sent
+    """
+    if not token:
+        return None
+    try:
+        claims = jwt_verifier.verify(token)
+    except JWTError as e:
+        logger.debug(f"Rejected user token: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired user token"
+        )
+    return {
+        "user_id": claims['sub'],
+        "email": claims.get('email'),
+        "role": claims.get('role'),
+        "claims": claims
+    }
+
+async def get_current_user(user: Optional[Dict[str, Any]] = Depends(get_optional_user)) -> Dict[str, Any]:
+    """
+    Authenticated user; responds 401 when no valid user token was sent
+    """
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User token is required"
+        )
+    return user
+
+def verify_websocket_user(websocket: WebSocket, user_id: str) -> bool:
+    """
+    Verify that a WebSocket handshake carries a valid user token for user_id
+    
+    The shared API key ships in the app, so it cannot tell users apart; a
+    socket streaming one user's activity always requires their own token.
+    Like the API key, it may be passed as the user_token query parameter.
+    """
+    token = websocket.query_params.get("user_token") or websocket.headers.get("x-user-token")
+    if not token:
+        logger.warning("WebSocket connection without a user token")
+        return False
+    try:
+        claims = jwt_verifier.verify(token)
+    except JWTError as e:
+        logger.debug(f"Rejected WebSocket user token: {str(e)}")
+        return False
+    if claims['sub'] != user_id:
+        logger.warning("WebSocket user token does not match the requested user")
+        return False
+    return True
+
+async def verify_user_scope(request: Request, user: Optional[Dict[str, Any]] = Depends(get_optional_user)):
+    """
+    Reject requests whose user_id (path or query) is not the token's user
+    
+    Requests without a user token pass unless REQUIRE_USER_TOKEN is set, so
+    clients can migrate to sending tokens before enforcement is switched on.
+    """
+    if user is None:
+        if Config.REQUIRE_USER_TOKEN:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User token is required"
+            )
+        return None
+    
+    requested = request.path_params.get("user_id") or request.query_params.get("user_id")
+    if requested and requested != user["user_id"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Token does not grant access to this user"
+        )
+    return user
@@ -0,0 +1,48 @@
+"""
+Request latency and in-flight metrics per route template
+"""
+
+import time
+
+from utils.metrics import HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (no per-request Request objects or background tasks).
+
+    Requests are labelled with the matched route's template, e.g.
+    /habits/{habit_id}, so metric cardinality stays bounded; anything that
+    matched no route is counted as 'unmatched'. Latency ends when the last
+    body chunk is sent, before any background tasks run.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        responded_at = None
+
+        async def send_with_status(message):
+            nonlocal status_code, responded_at
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                responded_at = time.perf_counter()
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = (responded_at or time.perf_counter()) - start
+            HTTP_IN_FLIGHT.dec()
+            # The router stores the matched route in the (shared) scope
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            HTTP_REQUESTS.labels(scope['method'], route, str(status_code)).inc()
+            HTTP_LATENCY.labels(scope['method'], route).observe(elapsed)
@@ -0,0 +1,188 @@
+"""
+Token-bucket rate limiting per API key and user
+"""
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import HTTPAuthorizationCredentials
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+import hashlib
+import math
+import time
+import logging
+
+from config import Config
+from middleware.auth_middleware import get_optional_user, security
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+# (bucket key, refill rate in tokens/second, burst capacity)
+Bucket = Tuple[str, float, float]
+
+# Cost of one request per route template; everything else costs 1
+ROUTE_COSTS: Dict[str, float] = {
+    "/analytics/advanced/{user_id}": 20,
+    "/analytics/habit-correlations/{user_id}": 10,
+    "/analytics/mood-analysis/{user_id}": 5,
+    "/analytics/habit-insights/{user_id}": 5,
+    "/analytics/streak-prediction/{user_id}/{habit_id}": 5,
+    "/social/insights/{user_id}": 3,
+    "/social/friends/{user_id}/suggestions": 3,
+    "/notifications/optimal-times/{user_id}": 3,
+}
+
+class MemoryBackend:
+    """
+    Per-process buckets, refilled lazily on access and kept in a bounded LRU
+    """
+
+    def __init__(self, max_buckets: int = 100000):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, buckets: List[Bucket], cost: float) -> float:
+        """Take cost from every bucket, or from none; returns seconds to wait (0 if allowed)"""
+        now = time.monotonic()
+        levels = []
+        wait = 0.0
+        for key, rate, burst in buckets:
+            tokens, stamp = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            levels.append(tokens)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / rate)
+
+        for (key, _, _), tokens in zip(buckets, levels):
+            self._buckets[key] = (tokens if wait else tokens - cost, now)
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return wait
+
+class RedisBackend:
+    """
+    Buckets shared by all workers, updated atomically by a Lua script
+    """
+
+    SCRIPT = """
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local cost = tonumber(ARGV[1])
+    local levels = {}
+    local wait = 0
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[2 * i])
+        local burst = tonumber(ARGV[2 * i + 1])
+        local state = redis.call('HMGET', key, 'tokens', 'ts')
+        local tokens = tonumber(state[1]) or burst
+        local stamp = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + math.max(now - stamp, 0) * rate)
+        levels[i] = tokens
+        if tokens < cost then
+            wait = math.max(wait, (cost - tokens) / rate)
+        end
+    end
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[2 * i])
+        local burst = tonumber(ARGV[2 * i + 1])
+        local tokens = levels[i]
+        if wait == 0 then
+            tokens = tokens - cost
+        end
+        redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+        redis.call('EXPIRE', key, math.ceil(burst / rate) + 1)
+    end
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str):
+        if redis_asyncio is None:
+            raise RuntimeError("The redis package is required when RATE_LIMIT_REDIS_URL is set")
+        self._client = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    async def take(self, buckets: List[Bucket], cost: float) -> float:
+        args: List[Any] = [cost]
+        for _, rate, burst in buckets:
+            args.extend([rate, burst])
+        try:
+            return float(await self._script(keys=[f"ratelimit:{key}" for key, _, _ in buckets], args=args))
+        except Exception as e:
+            # Fail open: an unavailable limiter must not take the API down with it
+            logger.warning(f"Rate limit backend unavailable: {str(e)}")
+            return 0.0
+
+@lru_cache(maxsize=64)
+def _key_id(api_key: str) -> str:
+    """Short stable identifier for an API key, so raw keys never become bucket names"""
+    return hashlib.blake2b(api_key.encode('utf-8'), digest_size=8).hexdigest()
+
+class RateLimiter:
+    """
+    Two buckets per request: one per API key and one per (API key, user)
+    """
+
+    def __init__(self, backend, user_rate: float, user_burst: float, key_rate: float, key_burst: float):
+        self.backend = backend
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+
+    async def check(self, api_key: str, subject: str, cost: float) -> float:
+        """Charge a request; returns seconds to wait before retrying (0 if allowed)"""
+        key_id = _key_id(api_key)
+        cost = min(cost, self.user_burst, self.key_burst)
+        return await self.backend.take([
+            (f"key:{key_id}", self.key_rate, self.key_burst),
+            (f"user:{key_id}:{subject}", self.user_rate, self.user_burst),
+        ], cost)
+
+def _create_rate_limiter() -> RateLimiter:
+    backend = RedisBackend(Config.RATE_LIMIT_REDIS_URL) if Config.RATE_LIMIT_REDIS_URL else MemoryBackend()
+    return RateLimiter(
+        backend,
+        user_rate=Config.RATE_LIMIT_USER_RATE,
+        user_burst=Config.RATE_LIMIT_USER_BURST,
+        key_rate=Config.RATE_LIMIT_KEY_RATE,
+        key_burst=Config.RATE_LIMIT_KEY_BURST
+    )
+
+rate_limiter = _create_rate_limiter()
+
+async def enforce_rate_limit(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user: Optional[Dict[str, Any]] = Depends(get_optional_user)
+):
+    """
+    Charge the request's route cost to its buckets; responds 429 with Retry-After when empty
+
+    The user is the token's subject when a user token was sent, otherwise the
+    user_id path or query parameter, otherwise the client address.
+    """
+    if not Config.RATE_LIMIT_ENABLED:
+        return
+
+    route = request.scope.get("route")
+    cost = ROUTE_COSTS.get(getattr(route, "path", ""), 1)
+    subject = (
+        (user and user["user_id"])
+        or request.path_params.get("user_id")
+        or request.query_params.get("user_id")
+        or (request.client.host if request.client else "anonymous")
+    )
+
+    wait = await rate_limiter.check(credentials.credentials, subject, cost)
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
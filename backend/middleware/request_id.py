@@ -0,0 +1,46 @@
+"""
+Request ID propagation for log correlation
+"""
+
+import re
+import uuid
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from utils.logger import request_id_var
+
+REQUEST_ID_HEADER = 'x-request-id'
+
+# Client-supplied IDs are reused only if they look like IDs
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+class RequestIdMiddleware:
+    """Tags each request with an ID (the client's X-Request-ID or a new one).
+
+    The ID is available to log records through request_id_var and is echoed
+    back in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = Headers(scope=scope).get(REQUEST_ID_HEADER)
+        if not request_id or not _VALID_REQUEST_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
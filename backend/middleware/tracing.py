@@ -0,0 +1,83 @@
+"""
+Sampled request tracing and profiling middleware
+"""
+
+import time
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers
+
+from middleware.auth_middleware import is_admin_key
+from utils.tracing import trace_context, record_span, tracer
+
+# Send with a valid admin key (X-Admin-Key) to profile a single request
+PROFILE_HEADER = 'x-profile'
+
+
+class TracingMiddleware:
+    """Traces a sample of requests, plus any request asked to be profiled.
+
+    Unsampled requests cost one random() call. The root 'request' span ends
+    when the last body chunk is sent, so background tasks that run after the
+    response are not counted against the request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _profile_requested(self, scope) -> bool:
+        headers = Headers(scope=scope)
+        return PROFILE_HEADER in headers and is_admin_key(headers.get('x-admin-key'))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        profile = tracer.take_profile(self._profile_requested(scope))
+        if not profile and not tracer.sampled():
+            await self.app(scope, receive, send)
+            return
+
+        trace = tracer.start(f"{scope['method']} {scope['path']}", profile)
+        token = trace_context.set(trace)
+        status_code = 500
+        responded_at = None
+
+        async def send_traced(message):
+            nonlocal status_code, responded_at
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body', False):
+                responded_at = time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send_traced)
+        finally:
+            trace_context.reset(token)
+            route = getattr(scope.get('route'), 'path', 'unmatched')
+            trace.add('request', trace.start, responded_at or time.perf_counter(), {
+                'method': scope['method'],
+                'route': route,
+                'status': status_code,
+                'profiled': profile
+            })
+            tracer.finish(trace)
+
+
+def _traced_handler(path: str, app):
+    async def handler(scope, receive, send):
+        start = time.perf_counter()
+        try:
+            await app(scope, receive, send)
+        finally:
+            record_span('handler', start, time.perf_counter(), route=path)
+    return handler
+
+
+def trace_routes(routes):
+    """Give every API route a 'handler' span (dependencies, endpoint, serialization and send)"""
+    for route in routes:
+        if isinstance(route, APIRoute):
+            route.app = _traced_handler(route.path, route.app)
@@ -0,0 +1,113 @@
+"""
+Admin router for operational metrics
+"""
+
+from fastapi import APIRouter, HTTPException, Request, status
+from typing import Dict, Any, Optional
+from datetime import date
+import logging
+
+from services.engagement_metrics import engagement_metrics
+from services.reminder_scheduler import reminder_materializer
+from config import Config
+from utils.tracing import tracer
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+@router.get("/metrics/engagement", response_model=Dict[str, Any])
+async def get_engagement_metrics(day: Optional[str] = None):
+    """Get estimated active users, distinct habits and streak/XP percentiles"""
+    try:
+        target_day = date.fromisoformat(day) if day else None
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Day must be an ISO date (YYYY-MM-DD)"
+        )
+
+    try:
+        return engagement_metrics.summary(target_day)
+    except Exception as e:
+        logger.error(f"Error getting engagement metrics: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve engagement metrics"
+        )
+
+@router.get("/metrics/engagement/snapshot", response_model=Dict[str, Any])
+async def get_engagement_snapshot():
+    """Export this worker's raw sketches for merging elsewhere"""
+    try:
+        return engagement_metrics.snapshot()
+    except Exception as e:
+        logger.error(f"Error exporting engagement snapshot: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to export engagement snapshot"
+        )
+
+@router.post("/metrics/engagement/merge")
+async def merge_engagement_snapshot(snapshot: Dict[str, Any]):
+    """Merge sketches exported by another worker"""
+    try:
+        engagement_metrics.merge_snapshot(snapshot)
+        return {"message": "Engagement snapshot merged successfully"}
+    except (KeyError, ValueError, TypeError) as e:
+        logger.warning(f"Rejected engagement snapshot: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid engagement snapshot"
+        )
+    except Exception as e:
+        logger.error(f"Error merging engagement snapshot: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to merge engagement snapshot"
+        )
+
+@router.post("/reminders/materialize", response_model=Dict[str, Any])
+async def materialize_reminders(request: Request):
+    """Expand upcoming reminders for every habit now instead of waiting for the next pass"""
+    supabase = getattr(request.app.state, "supabase", None)
+    if supabase is None or supabase.client is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Database service unavailable"
+        )
+    
+    try:
+        return await reminder_materializer.materialize_all(supabase)
+    except Exception as e:
+        logger.error(f"Error materializing reminders: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to materialize reminders"
+        )
+
+@router.get("/tracing", response_model=Dict[str, Any])
+async def get_tracing_status():
+    """Get this worker's tracing settings and counters"""
+    return {
+        "enabled": Config.TRACING_ENABLED,
+        "sample_rate": tracer.sample_rate,
+        "trace_dir": tracer.trace_dir,
+        "pending_profiles": tracer.pending_profiles,
+        "profiling": tracer.sampler.running,
+        "traces_written": tracer.traces_written
+    }
+
+@router.post("/tracing/profile", response_model=Dict[str, Any])
+async def profile_next_requests(requests: int = 1):
+    """Trace and profile the next requests served by this worker"""
+    if not Config.TRACING_ENABLED:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Tracing is disabled (set TRACING_ENABLED)"
+        )
+    if requests < 1 or requests > 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Requests must be between 1 and 100"
+        )
+    return {"pending_profiles": tracer.request_profiles(requests)}
@@ -4,20 +4,18 @@ Authentication router
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import Dict, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
+from jose import JWTError
 import logging
 
-from database.supabase_client import SupabaseClient
+from middleware.auth_middleware import get_current_user, jwt_verifier
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.post("/verify-token")
-async def verify_token(
-    token: str,
-    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
-):
-    """Verify Supabase JWT token"""
+async def verify_token(token: str):
+    """Verify a Supabase JWT locally and return its user"""
     if not token or not token.strip():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -25,16 +23,32 @@ async def verify_token(
         )
     
     try:
-        # This would typically verify the JWT token with Supabase
-        # For now, we'll return a simple response
+        claims = jwt_verifier.verify(token.strip())
         return {
             "valid": True,
-            "user_id": "user_id_from_token",
+            "user_id": claims['sub'],
+            "email": claims.get('email'),
+            "expires_at": datetime.fromtimestamp(claims['exp'], timezone.utc).isoformat(),
             "message": "Token verified successfully"
         }
+    except JWTError as e:
+        logger.debug(f"Token verification failed: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token"
+        )
     except Exception as e:
         logger.error(f"Error verifying token: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
+
+@router.get("/me")
+async def get_me(user: Dict[str, Any] = Depends(get_current_user)):
+    """Get the user identified by the X-User-Token header"""
+    return {
+        "user_id": user["user_id"],
+        "email": user["email"],
+        "role": user["role"]
+    }
@@ -2,17 +2,27 @@
 Habits router for habit management endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 from datetime import datetime, date
 import logging
 
 from database.supabase_client import SupabaseClient
+from services.activity_broker import activity_broker
+from services.challenge_engine import challenge_engine
+from services.reminder_scheduler import reminder_materializer
+from services.reminder_times import reminder_histograms
+from services.engagement_metrics import engagement_metrics
+from services.resource_versions import resource_versions
+from utils.conditional import tagged, templates_etag, user_etag
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Habit fields that change which reminders are scheduled
+REMINDER_FIELDS = {'name', 'reminder_time', 'reminder_days', 'has_reminder', 'is_active'}
+
 # Pydantic models
 class HabitCreate(BaseModel):
     name: str
@@ -55,6 +65,7 @@ class HabitCompletion(BaseModel):
 @router.get("/", response_model=List[Dict[str, Any]])
 async def get_habits(
     user_id: str,
+    etag: str = Depends(user_etag),
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Get all habits for a user"""
@@ -66,7 +77,7 @@ async def get_habits(
     
     try:
         habits = await supabase.get_habits(user_id)
-        return habits
+        return tagged(habits, etag)
     except Exception as e:
         logger.error(f"Error getting habits: {str(e)}")
         raise HTTPException(
@@ -78,6 +89,7 @@ async def get_habits(
 async def create_habit(
     habit: HabitCreate,
     user_id: str,
+    background_tasks: BackgroundTasks,
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Create a new habit"""
@@ -99,6 +111,9 @@ async def create_habit(
         habit_data['created_at'] = datetime.now().isoformat()
         
         new_habit = await supabase.create_habit(habit_data)
+        resource_versions.bump(user_id)
+        if new_habit.get('has_reminder'):
+            background_tasks.add_task(reminder_materializer.rematerialize_habit, supabase, new_habit)
         return new_habit
     except Exception as e:
         logger.error(f"Error creating habit: {str(e)}")
@@ -111,6 +126,7 @@ async def create_habit(
 async def get_habit(
     habit_id: str,
     user_id: str,
+    etag: str = Depends(user_etag),
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Get a specific habit"""
@@ -136,7 +152,7 @@ async def get_habit(
                 detail="Habit not found"
             )
         
-        return habit
+        return tagged(habit, etag)
     except HTTPException:
         raise
     except Exception as e:
@@ -151,6 +167,7 @@ async def update_habit(
     habit_id: str,
     habit_update: HabitUpdate,
     user_id: str,
+    background_tasks: BackgroundTasks,
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Update a habit"""
@@ -177,6 +194,9 @@ async def update_habit(
         updates['updated_at'] = datetime.now().isoformat()
         
         updated_habit = await supabase.update_habit(habit_id, updates)
+        resource_versions.bump(user_id)
+        if updated_habit and REMINDER_FIELDS & updates.keys():
+            background_tasks.add_task(reminder_materializer.rematerialize_habit, supabase, updated_habit)
         return updated_habit
     except HTTPException:
         raise
@@ -191,6 +211,7 @@ async def update_habit(
 async def delete_habit(
     habit_id: str,
     user_id: str,
+    background_tasks: BackgroundTasks,
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Delete a habit"""
@@ -208,6 +229,9 @@ async def delete_habit(
     
     try:
         await supabase.delete_habit(habit_id)
+        resource_versions.bump(user_id)
+        reminder_histograms.forget_habit(habit_id)
+        background_tasks.add_task(supabase.delete_pending_reminders, habit_id)
         return {"message": "Habit deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting habit: {str(e)}")
@@ -220,6 +244,7 @@ async def delete_habit(
 async def mark_habit_complete(
     completion: HabitCompletion,
     user_id: str,
+    background_tasks: BackgroundTasks,
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Mark a habit as complete"""
@@ -250,6 +275,20 @@ async def mark_habit_complete(
             user_id,
             completion.completion_date
         )
+        resource_versions.bump(user_id)
+        reminder_histograms.record_completion(
+            user_id, completion.habit_id, result.get('completion_date') or completion.completion_date,
+            result.get('completion_time')
+        )
+        engagement_metrics.record_completion(user_id, completion.habit_id)
+        background_tasks.add_task(_record_completion_stats, supabase, completion.habit_id, user_id)
+        background_tasks.add_task(
+            challenge_engine.record_completion, supabase, user_id, completion.habit_id, completion.completion_date
+        )
+        background_tasks.add_task(
+            activity_broker.publish_to_audience, supabase, user_id, 'habit_completed',
+            {'habit_id': completion.habit_id, 'completion_date': completion.completion_date}
+        )
         return result
     except Exception as e:
         logger.error(f"Error marking habit complete: {str(e)}")
@@ -258,16 +297,25 @@ async def mark_habit_complete(
             detail="Failed to mark habit as complete"
         )
 
+async def _record_completion_stats(supabase: SupabaseClient, habit_id: str, user_id: str):
+    """Feed post-completion streak and XP totals into the engagement sketches"""
+    try:
+        stats = await supabase.get_completion_stats(habit_id, user_id)
+        engagement_metrics.record_progress(stats.get('current_streak'), stats.get('total_xp'))
+    except Exception as e:
+        logger.warning(f"Could not record completion stats: {str(e)}")
+
 @router.get("/{habit_id}/completions", response_model=List[Dict[str, Any]])
 async def get_habit_completions(
     habit_id: str,
     user_id: str,
+    etag: str = Depends(user_etag),
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Get completions for a specific habit"""
     try:
         completions = await supabase.get_habit_completions(habit_id, user_id)
-        return completions
+        return tagged(completions, etag)
     except Exception as e:
         logger.error(f"Error getting habit completions: {str(e)}")
         raise HTTPException(
@@ -277,12 +325,13 @@ async def get_habit_completions(
 
 @router.get("/templates/", response_model=List[Dict[str, Any]])
 async def get_habit_templates(
+    etag: str = Depends(templates_etag),
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Get available habit templates"""
     try:
         response = supabase.client.table('habit_templates').select('*').eq('is_active', True).execute()
-        return response.data
+        return tagged(response.data, etag)
     except Exception as e:
         logger.error(f"Error getting habit templates: {str(e)}")
         raise HTTPException(
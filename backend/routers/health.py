@@ -2,13 +2,43 @@
 Health check router
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse
 from datetime import datetime
+from typing import Dict, Any, Optional
+import asyncio
 import logging
+import time
+
+from config import Config
+from database.circuit_breaker import db_breaker
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Last database probe, shared by readiness checks for READINESS_CACHE_SECONDS
+_last_probe: Optional[Dict[str, Any]] = None
+_probe_lock = asyncio.Lock()
+
+async def _probe_database(supabase) -> Dict[str, Any]:
+    """Ping the database at most once per cache period, however many probes arrive"""
+    global _last_probe
+    if _last_probe and time.monotonic() - _last_probe['at'] < Config.READINESS_CACHE_SECONDS:
+        return _last_probe
+    async with _probe_lock:
+        if _last_probe and time.monotonic() - _last_probe['at'] < Config.READINESS_CACHE_SECONDS:
+            return _last_probe
+        try:
+            latency = await supabase.ping()
+            result = {"ok": True, "latency_ms": round(latency * 1000, 2)}
+        except Exception as e:
+            logger.warning(f"Readiness database probe failed: {str(e)}")
+            result = {"ok": False, "error": str(e) or type(e).__name__}
+        result["checked_at"] = datetime.now().isoformat()
+        result["at"] = time.monotonic()
+        _last_probe = result
+        return result
+
 @router.get("/")
 async def health_check():
     """Health check endpoint"""
@@ -20,20 +50,25 @@ async def health_check():
     }
 
 @router.get("/ready")
-async def readiness_check():
-    """Readiness check endpoint"""
-    try:
-        return {
-            "status": "ready",
-            "timestamp": datetime.now().isoformat()
-        }
-    except Exception as e:
-        logger.error(f"Error in readiness check: {str(e)}")
-        return {
-            "status": "not_ready",
+async def readiness_check(request: Request):
+    """Readiness check endpoint: ready only when the database answers (503 otherwise)"""
+    supabase = getattr(request.app.state, "supabase", None)
+    if supabase is None or supabase.client is None:
+        database = {"ok": False, "error": "Database not configured"}
+    else:
+        probe = await _probe_database(supabase)
+        database = {key: value for key, value in probe.items() if key != "at"}
+    
+    ready = database["ok"]
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "not_ready",
             "timestamp": datetime.now().isoformat(),
-            "error": str(e)
+            "database": database,
+            "circuit": db_breaker.status()
         }
+    )
 
 @router.get("/live")
 async def liveness_check():
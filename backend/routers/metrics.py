@@ -0,0 +1,17 @@
+"""
+Prometheus metrics router
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+import logging
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+@router.get("", include_in_schema=False)
+async def get_metrics():
+    """Request, database, cache and executor metrics in the Prometheus text format"""
+    return Response(registry.expose(), media_type=registry.CONTENT_TYPE)
@@ -5,10 +5,13 @@ Notifications router for notification management
 from fastapi import APIRouter, Depends, HTTPException, status
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
 
 from database.supabase_client import SupabaseClient
+from services.notification_templates import TemplateError, notification_templates
+from services.reminder_times import reminder_histograms
+from services.unread_counts import unread_counts
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -21,6 +24,12 @@ class NotificationCreate(BaseModel):
     data: Optional[Dict[str, Any]] = None
     scheduled_for: Optional[str] = None
 
+class NotificationIds(BaseModel):
+    notification_ids: Optional[List[str]] = None
+
+# Upper bound on IDs accepted by one bulk request
+MAX_BULK_IDS = 500
+
 @router.get("/optimal-times/{user_id}", response_model=Dict[str, Any])
 async def get_optimal_notification_times(
     user_id: str,
@@ -34,16 +43,29 @@ async def get_optimal_notification_times(
         )
     
     try:
-        # Get user's habit completion patterns
         habits = await supabase.get_habits(user_id)
         
-        # Analyze completion times to find optimal notification times
+        # Build completion-time histograms once per timezone; later completions update them incrementally
+        timezone = await supabase.get_user_timezone(user_id)
+        if not reminder_histograms.is_loaded(user_id, timezone):
+            completions = await supabase.get_completion_times(user_id)
+            reminder_histograms.load_user(user_id, completions, timezone)
+        
         optimal_times = []
         for habit in habits:
-            if habit.get('has_reminder') and habit.get('reminder_time'):
+            suggestion = reminder_histograms.optimal_time(habit['id'])
+            if suggestion:
                 optimal_times.append({
                     'habit_id': habit['id'],
                     'habit_name': habit['name'],
+                    'source': 'completion_history',
+                    **suggestion
+                })
+            elif habit.get('has_reminder') and habit.get('reminder_time'):
+                optimal_times.append({
+                    'habit_id': habit['id'],
+                    'habit_name': habit['name'],
+                    'source': 'configured',
                     'optimal_time': habit['reminder_time'],
                     'days': habit.get('reminder_days', [])
                 })
@@ -51,7 +73,7 @@ async def get_optimal_notification_times(
         return {
             "optimal_times": optimal_times,
             "recommendations": [
-                "Set reminders 30 minutes before your usual completion time",
+                f"Reminders are set {reminder_histograms.lead_minutes} minutes before your usual completion time",
                 "Use different times for different types of habits",
                 "Adjust times based on your completion patterns"
             ]
@@ -69,9 +91,19 @@ async def schedule_smart_notification(
     habit_id: str,
     type: str,
     data: Optional[Dict[str, Any]] = None,
+    title: Optional[str] = None,
+    body: Optional[str] = None,
+    template: Optional[str] = None,
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
-    """Schedule a smart notification"""
+    """Schedule a smart notification
+    
+    Text comes from the named template, else the template for the
+    notification type. When the type has none, or data lacks its
+    placeholders, the title and body sent with the request (directly or in
+    data) are used instead. Only a named template that can't be rendered
+    is rejected.
+    """
     if not user_id or not user_id.strip():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -91,23 +123,65 @@ async def schedule_smart_notification(
         )
     
     try:
+        if not supabase.client:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Database service unavailable"
+            )
+        
+        await notification_templates.refresh(supabase)
+        if template:
+            try:
+                compiled = notification_templates.get(template)
+            except TemplateError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+        else:
+            compiled = notification_templates.for_type(type)
+
+        notification_extra = {'habit_id': habit_id}
+        rendered = None
+        if compiled is not None:
+            habit = await supabase.get_habit(habit_id, user_id)
+            streaks = await supabase.get_current_streaks([habit_id])
+            values = {
+                **(data or {}),
+                'habit_name': habit['name'] if habit else "your habit",
+                'current_streak': streaks.get(habit_id, 0)
+            }
+            try:
+                rendered = compiled.render(values)
+                notification_extra['template'] = compiled.name
+            except TemplateError as e:
+                if template:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=str(e)
+                    )
+                logger.warning(f"Could not render template '{compiled.name}' for {type} notification: {str(e)} - using request text")
+        
+        if rendered is not None:
+            title, body = rendered
+        else:
+            title = title or (data or {}).get('title') or "Habit Reminder"
+            body = body or (data or {}).get('body') or "Time to complete your habit!"
+        
         notification_data = {
             'user_id': user_id,
-            'title': f"Habit Reminder",
-            'body': f"Time to complete your habit!",
+            'title': title,
+            'body': body,
             'type': type,
-            'data': data or {},
-            'scheduled_for': datetime.now() + timedelta(hours=1),
+            'data': {**(data or {}), **notification_extra},
+            'scheduled_for': (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat(),
             'created_at': datetime.now().isoformat()
         }
         
-        if not supabase.client:
-            raise HTTPException(
-                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                detail="Database service unavailable"
-            )
         response = supabase.client.table('notifications').insert(notification_data).execute()
         return response.data[0] if response.data else {}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error scheduling notification: {str(e)}")
         raise HTTPException(
@@ -149,6 +223,101 @@ async def get_user_notifications(
             detail="Failed to retrieve notifications"
         )
 
+@router.get("/{user_id}/unread-count", response_model=Dict[str, Any])
+async def get_unread_count(
+    user_id: str,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Get the number of unread notifications for a user"""
+    if not user_id or not user_id.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User ID is required"
+        )
+    
+    try:
+        return {"user_id": user_id, "unread_count": await unread_counts.get(supabase, user_id)}
+    except Exception as e:
+        logger.error(f"Error getting unread count: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve unread count"
+        )
+
+@router.put("/{user_id}/mark-read", response_model=Dict[str, Any])
+async def mark_notifications_read(
+    user_id: str,
+    request: NotificationIds,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Mark the given notifications as read, or all of them when no IDs are given"""
+    if not user_id or not user_id.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User ID is required"
+        )
+    
+    if request.notification_ids is not None and len(request.notification_ids) > MAX_BULK_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BULK_IDS} notification IDs are allowed"
+        )
+    
+    try:
+        if not supabase.client:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Database service unavailable"
+            )
+        updated = await supabase.mark_notifications_read(user_id, request.notification_ids)
+        unread_counts.record_read(user_id, updated)
+        return {"message": "Notifications marked as read", "updated": len(updated)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error marking notifications as read: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to mark notifications as read"
+        )
+
+@router.post("/{user_id}/bulk-delete", response_model=Dict[str, Any])
+async def delete_notifications(
+    user_id: str,
+    request: NotificationIds,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Delete several notifications at once"""
+    if not user_id or not user_id.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User ID is required"
+        )
+    
+    if not request.notification_ids or len(request.notification_ids) > MAX_BULK_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Between 1 and {MAX_BULK_IDS} notification IDs are required"
+        )
+    
+    try:
+        if not supabase.client:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Database service unavailable"
+            )
+        deleted = await supabase.delete_notifications(user_id, request.notification_ids)
+        unread_counts.record_deleted(user_id, deleted)
+        return {"message": "Notifications deleted successfully", "deleted": len(deleted)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error deleting notifications: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to delete notifications"
+        )
+
 @router.put("/{notification_id}/read")
 async def mark_notification_read(
     notification_id: str,
@@ -174,7 +343,8 @@ async def mark_notification_read(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Database service unavailable"
             )
-        response = supabase.client.table('notifications').update({'is_read': True}).eq('id', notification_id).eq('user_id', user_id).execute()
+        updated = await supabase.mark_notifications_read(user_id, [notification_id], delivered_only=False)
+        unread_counts.record_read(user_id, updated)
         return {"message": "Notification marked as read"}
     except Exception as e:
         logger.error(f"Error marking notification as read: {str(e)}")
@@ -208,7 +378,8 @@ async def delete_notification(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail="Database service unavailable"
             )
-        response = supabase.client.table('notifications').delete().eq('id', notification_id).eq('user_id', user_id).execute()
+        deleted = await supabase.delete_notifications(user_id, [notification_id])
+        unread_counts.record_deleted(user_id, deleted)
         return {"message": "Notification deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting notification: {str(e)}")
@@ -0,0 +1,51 @@
+"""
+Real-time activity push over WebSocket
+"""
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
+import asyncio
+import logging
+
+from config import Config
+from middleware.auth_middleware import verify_websocket_api_key, verify_websocket_user
+from services.activity_broker import activity_broker
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+async def _drain_client(websocket: WebSocket):
+    """Read (and ignore) client frames until the connection closes"""
+    while True:
+        await websocket.receive_text()
+
+@router.websocket("/activity")
+async def activity_socket(websocket: WebSocket, user_id: str):
+    """Stream activity events addressed to a user (the user_token must be theirs)"""
+    if not verify_websocket_api_key(websocket) or not verify_websocket_user(websocket, user_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    queue = activity_broker.subscribe(user_id)
+    reader = asyncio.create_task(_drain_client(websocket))
+    try:
+        while not reader.done():
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {getter, reader},
+                timeout=Config.ACTIVITY_HEARTBEAT_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            if getter in done:
+                await websocket.send_json(getter.result())
+            else:
+                getter.cancel()
+                if not done:
+                    await websocket.send_json({'type': 'ping'})
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error in activity socket: {str(e)}")
+    finally:
+        reader.cancel()
+        activity_broker.unsubscribe(user_id, queue)
@@ -2,17 +2,27 @@
 Social router for social features
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import asyncio
 import logging
 
 from database.supabase_client import SupabaseClient
+from services.activity_broker import activity_broker
+from services.challenge_engine import challenge_engine
+from services.friend_graph import friend_graph
+from services.post_engagement import post_engagement
+from services.profile_loader import ProfileLoader, profile_cache
+from services.social_timeline import social_timelines
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Window used for the "recent posts" social insight
+RECENT_POST_DAYS = 7
+
 # Pydantic models
 class SocialPostCreate(BaseModel):
     content: str
@@ -35,16 +45,24 @@ async def get_social_insights(
         )
     
     try:
-        friends = await supabase.get_friends(user_id)
-        social_feed = await supabase.get_social_feed(user_id)
+        since = (datetime.now(timezone.utc) - timedelta(days=RECENT_POST_DAYS)).isoformat()
+        cached_friends = friend_graph.cached_friends(user_id)
+        if cached_friends is not None:
+            total_friends = len(cached_friends)
+            recent_posts = await supabase.count_posts_since(user_id, since)
+        else:
+            total_friends, recent_posts = await asyncio.gather(
+                supabase.count_friends(user_id),
+                supabase.count_posts_since(user_id, since)
+            )
         
         return {
-            "total_friends": len(friends),
-            "recent_posts": len(social_feed),
-            "social_score": min(len(friends) * 10 + len(social_feed) * 5, 100),
+            "total_friends": total_friends,
+            "recent_posts": recent_posts,
+            "social_score": min(total_friends * 10 + recent_posts * 5, 100),
             "insights": [
-                f"You have {len(friends)} friends",
-                f"Recent activity: {len(social_feed)} posts",
+                f"You have {total_friends} friends",
+                f"Recent activity: {recent_posts} posts in the last {RECENT_POST_DAYS} days",
                 "Social engagement helps maintain habits"
             ]
         }
@@ -68,8 +86,9 @@ async def get_friends(
         )
     
     try:
-        friends = await supabase.get_friends(user_id)
-        return friends
+        friend_ids = await friend_graph.friends(supabase, user_id)
+        profiles = await ProfileLoader(supabase).load_many(friend_ids)
+        return [profile for profile in profiles.values() if profile]
     except Exception as e:
         logger.error(f"Error getting friends: {str(e)}")
         raise HTTPException(
@@ -77,10 +96,69 @@ async def get_friends(
             detail="Failed to retrieve friends"
         )
 
+@router.get("/friends/{user_id}/mutual/{other_id}", response_model=Dict[str, Any])
+async def get_mutual_friends(
+    user_id: str,
+    other_id: str,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Get the friends two users have in common"""
+    if not user_id or not user_id.strip() or not other_id or not other_id.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Both user IDs are required"
+        )
+    
+    try:
+        mutual = await friend_graph.mutual_friends(supabase, user_id, other_id)
+        return {
+            "mutual_friends": len(mutual),
+            "mutual_friend_ids": sorted(mutual)
+        }
+    except Exception as e:
+        logger.error(f"Error getting mutual friends: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve mutual friends"
+        )
+
+@router.get("/friends/{user_id}/suggestions", response_model=List[Dict[str, Any]])
+async def get_friend_suggestions(
+    user_id: str,
+    limit: int = 10,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Suggest friends-of-friends ranked by mutual friends"""
+    if not user_id or not user_id.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User ID is required"
+        )
+    
+    if limit < 1 or limit > 50:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Limit must be between 1 and 50"
+        )
+    
+    try:
+        suggestions = await friend_graph.suggestions(supabase, user_id, limit)
+        return [
+            {"user_id": candidate_id, "mutual_friends": mutual}
+            for candidate_id, mutual in suggestions
+        ]
+    except Exception as e:
+        logger.error(f"Error getting friend suggestions: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve friend suggestions"
+        )
+
 @router.post("/friends/{user_id}/request")
 async def send_friend_request(
     user_id: str,
     friend_id: str,
+    background_tasks: BackgroundTasks,
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Send a friend request"""
@@ -111,6 +189,8 @@ async def send_friend_request(
         }
         
         response = supabase.client.table('friends').insert(friend_data).execute()
+        social_timelines.invalidate(user_id, friend_id)
+        background_tasks.add_task(activity_broker.publish, [friend_id], 'friend_request', user_id)
         return {"message": "Friend request sent successfully"}
     except Exception as e:
         logger.error(f"Error sending friend request: {str(e)}")
@@ -119,13 +199,79 @@ async def send_friend_request(
             detail="Failed to send friend request"
         )
 
-@router.get("/feed/{user_id}", response_model=List[Dict[str, Any]])
+@router.put("/friends/{user_id}/accept")
+async def accept_friend_request(
+    user_id: str,
+    friend_id: str,
+    background_tasks: BackgroundTasks,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Accept a friend request sent by friend_id"""
+    if not user_id or not user_id.strip() or not friend_id or not friend_id.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User ID and friend ID are required"
+        )
+    
+    try:
+        updated = await supabase.update_friend_status(user_id, friend_id, 'accepted')
+        if not updated:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Friend request not found"
+            )
+        friend_graph.add_edge(user_id, friend_id)
+        social_timelines.invalidate(user_id, friend_id)
+        background_tasks.add_task(activity_broker.publish, [friend_id], 'friend_accepted', user_id)
+        return {"message": "Friend request accepted"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error accepting friend request: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to accept friend request"
+        )
+
+@router.delete("/friends/{user_id}/{friend_id}")
+async def remove_friend(
+    user_id: str,
+    friend_id: str,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Remove a friend or cancel a friend request"""
+    try:
+        await supabase.delete_friendship(user_id, friend_id)
+        friend_graph.remove_edge(user_id, friend_id)
+        social_timelines.invalidate(user_id, friend_id)
+        return {"message": "Friend removed successfully"}
+    except Exception as e:
+        logger.error(f"Error removing friend: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to remove friend"
+        )
+
+@router.post("/profiles/{user_id}/invalidate")
+async def invalidate_profile(user_id: str):
+    """Drop a user's cached profile summary after the app edits their profile"""
+    if not user_id or not user_id.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User ID is required"
+        )
+
+    profile_cache.invalidate(user_id)
+    return {"message": "Profile cache invalidated successfully"}
+
+@router.get("/feed/{user_id}", response_model=Dict[str, Any])
 async def get_social_feed(
     user_id: str,
     limit: int = 20,
+    cursor: Optional[str] = None,
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
-    """Get social feed"""
+    """Get posts from friends and followed users, paginated with an opaque cursor"""
     if not user_id or not user_id.strip():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -139,8 +285,15 @@ async def get_social_feed(
         )
     
     try:
-        social_feed = await supabase.get_social_feed(user_id, limit)
-        return social_feed
+        page = await social_timelines.get_page(supabase, user_id, limit, cursor)
+        post_engagement.merge_counts(page['posts'])
+        await ProfileLoader(supabase).hydrate(page['posts'])
+        return page
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
     except Exception as e:
         logger.error(f"Error getting social feed: {str(e)}")
         raise HTTPException(
@@ -152,15 +305,20 @@ async def get_social_feed(
 async def create_social_post(
     user_id: str,
     post: SocialPostCreate,
+    background_tasks: BackgroundTasks,
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Create a social post"""
     try:
         post_data = post.dict()
         post_data['user_id'] = user_id
-        post_data['created_at'] = datetime.now().isoformat()
+        post_data['created_at'] = datetime.now(timezone.utc).isoformat()
         
         new_post = await supabase.create_social_post(post_data)
+        background_tasks.add_task(social_timelines.publish, supabase, new_post)
+        background_tasks.add_task(
+            activity_broker.publish_to_audience, supabase, user_id, 'post_created', {'post_id': new_post.get('id')}
+        )
         return new_post
     except Exception as e:
         logger.error(f"Error creating social post: {str(e)}")
@@ -173,17 +331,13 @@ async def create_social_post(
 async def like_post(
     post_id: str,
     user_id: str,
+    background_tasks: BackgroundTasks,
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Like a post"""
     try:
-        like_data = {
-            'post_id': post_id,
-            'user_id': user_id,
-            'created_at': datetime.now().isoformat()
-        }
-        
-        response = supabase.client.table('post_likes').upsert(like_data).execute()
+        if await post_engagement.add_like(post_id, user_id):
+            background_tasks.add_task(activity_broker.publish_post_event, supabase, post_id, user_id, 'post_liked')
         return {"message": "Post liked successfully"}
     except Exception as e:
         logger.error(f"Error liking post: {str(e)}")
@@ -192,11 +346,36 @@ async def like_post(
             detail="Failed to like post"
         )
 
+@router.get("/posts/{post_id}/comments", response_model=List[Dict[str, Any]])
+async def get_post_comments(
+    post_id: str,
+    limit: int = 50,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Get comments on a post with their authors' profiles"""
+    if limit < 1 or limit > 200:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Limit must be between 1 and 200"
+        )
+    
+    try:
+        comments = await supabase.get_post_comments(post_id, limit)
+        comments = (comments + post_engagement.pending_comments(post_id))[:limit]
+        return await ProfileLoader(supabase).hydrate(comments)
+    except Exception as e:
+        logger.error(f"Error getting post comments: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve post comments"
+        )
+
 @router.post("/posts/{post_id}/comment/{user_id}", response_model=Dict[str, Any])
 async def comment_on_post(
     post_id: str,
     user_id: str,
     comment: PostCommentCreate,
+    background_tasks: BackgroundTasks,
     supabase: SupabaseClient = Depends(lambda: SupabaseClient())
 ):
     """Comment on a post"""
@@ -204,10 +383,14 @@ async def comment_on_post(
         comment_data = comment.dict()
         comment_data['post_id'] = post_id
         comment_data['user_id'] = user_id
-        comment_data['created_at'] = datetime.now().isoformat()
         
-        response = supabase.client.table('post_comments').insert(comment_data).execute()
-        return response.data[0] if response.data else {}
+        new_comment = post_engagement.add_comment(comment_data)
+        background_tasks.add_task(
+            activity_broker.publish_post_event, supabase, post_id, user_id, 'post_commented',
+            {'comment_id': new_comment['id']}
+        )
+        await ProfileLoader(supabase).hydrate([new_comment])
+        return new_comment
     except Exception as e:
         logger.error(f"Error commenting on post: {str(e)}")
         raise HTTPException(
@@ -233,6 +416,7 @@ async def create_group_challenge(
             'description': description,
             'challenge_type': 'custom',
             'target_value': len(habit_ids),
+            'habit_ids': habit_ids,
             'start_date': start_date,
             'end_date': end_date,
             'is_public': True,
@@ -240,10 +424,106 @@ async def create_group_challenge(
         }
         
         response = supabase.client.table('challenges').insert(challenge_data).execute()
-        return response.data[0] if response.data else {}
+        challenge = response.data[0] if response.data else {}
+        if challenge.get('id'):
+            await supabase.join_challenge(challenge['id'], user_id)
+            challenge_engine.add_participant(challenge['id'], user_id)
+        return challenge
     except Exception as e:
         logger.error(f"Error creating group challenge: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create group challenge"
         )
+
+@router.post("/challenges/{challenge_id}/join")
+async def join_challenge(
+    challenge_id: str,
+    user_id: str,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Join a challenge"""
+    try:
+        participant = await supabase.join_challenge(challenge_id, user_id)
+        challenge_engine.add_participant(challenge_id, user_id)
+        return {"message": "Joined challenge", "participant": participant}
+    except Exception as e:
+        logger.error(f"Error joining challenge: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to join challenge"
+        )
+
+@router.get("/challenges/{challenge_id}/standings")
+async def get_challenge_standings(
+    challenge_id: str,
+    offset: int = 0,
+    limit: int = 20,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Get a page of a challenge's standings, best first"""
+    if offset < 0 or limit < 1 or limit > 100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="offset must be >= 0 and limit between 1 and 100"
+        )
+    
+    try:
+        standings = await challenge_engine.standings(supabase, challenge_id)
+        if standings is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Challenge not found"
+            )
+        
+        entries = [
+            {'rank': rank, 'user_id': participant_id, 'progress': progress}
+            for rank, participant_id, progress in standings.page(offset, limit)
+        ]
+        await ProfileLoader(supabase).hydrate(entries)
+        return {
+            "challenge_id": challenge_id,
+            "target_value": standings.target,
+            "total_participants": len(standings),
+            "standings": entries
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting challenge standings: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get challenge standings"
+        )
+
+@router.get("/challenges/{challenge_id}/rank/{user_id}")
+async def get_challenge_rank(
+    challenge_id: str,
+    user_id: str,
+    supabase: SupabaseClient = Depends(lambda: SupabaseClient())
+):
+    """Get a participant's rank in a challenge"""
+    try:
+        standings = await challenge_engine.standings(supabase, challenge_id)
+        rank = standings.rank(user_id) if standings is not None else None
+        if rank is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Participant not found"
+            )
+        
+        return {
+            "challenge_id": challenge_id,
+            "user_id": user_id,
+            "rank": rank,
+            "progress": standings.progress[user_id],
+            "total_participants": len(standings)
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting challenge rank: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to get challenge rank"
+        )
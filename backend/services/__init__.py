@@ -0,0 +1,3 @@
+"""
+Empty __init__.py files to make directories Python packages
+"""
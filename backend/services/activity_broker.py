@@ -0,0 +1,136 @@
+"""
+In-process pub/sub for real-time activity events
+"""
+
+import asyncio
+import time
+from typing import Dict, Any, Awaitable, Callable, Iterable, Optional, Set
+import logging
+
+from config import Config
+from database.supabase_client import SupabaseClient
+from services.friend_graph import friend_graph
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+class ActivityTransport:
+    """Carries published messages to every worker's broker.
+
+    The default delivers straight back into this process. A cross-worker
+    transport (e.g. Redis pub/sub or Postgres LISTEN/NOTIFY) publishes each
+    message to a shared channel and calls deliver() for every message received.
+    """
+
+    cross_worker = False
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        self._deliver = None
+
+    async def publish(self, message: Dict[str, Any]):
+        if self._deliver is not None:
+            await self._deliver(message)
+
+
+class ActivityBroker:
+    """Routes activity events to the live connections of their recipients.
+
+    Each connection gets a bounded queue; when a slow client falls behind
+    the oldest event is dropped rather than blocking publishers.
+    """
+
+    def __init__(self, queue_size: int = 100, transport: Optional[ActivityTransport] = None):
+        self.queue_size = queue_size
+        self.transport = transport or ActivityTransport()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def start(self):
+        await self.transport.start(self._deliver)
+
+    async def stop(self):
+        await self.transport.stop()
+
+    async def set_transport(self, transport: ActivityTransport):
+        """Swap in a different transport, e.g. a cross-worker one"""
+        await self.transport.stop()
+        self.transport = transport
+        await self.transport.start(self._deliver)
+
+    @property
+    def connection_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, user_id: str) -> asyncio.Queue:
+        """Open a queue receiving every event addressed to a user"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[user_id]
+
+    async def _deliver(self, message: Dict[str, Any]):
+        event = message['event']
+        for user_id in message['recipients']:
+            for queue in self._subscribers.get(user_id, ()):
+                if queue.full():
+                    queue.get_nowait()
+                queue.put_nowait(event)
+
+    async def publish(self, recipients: Iterable[str], event_type: str, actor_id: str,
+                      data: Optional[Dict[str, Any]] = None):
+        """Publish a compact event to the given users"""
+        recipients = [user_id for user_id in dict.fromkeys(recipients) if user_id != actor_id]
+        if not recipients:
+            return
+        if not self.transport.cross_worker:
+            recipients = [user_id for user_id in recipients if user_id in self._subscribers]
+            if not recipients:
+                return
+
+        event = {'type': event_type, 'actor_id': actor_id, 'data': data or {}, 'ts': int(time.time())}
+        try:
+            await self.transport.publish({'recipients': recipients, 'event': event})
+        except Exception as e:
+            logger.error(f"Error publishing activity event: {str(e)}")
+
+    async def publish_to_audience(self, supabase: SupabaseClient, actor_id: str, event_type: str,
+                                  data: Optional[Dict[str, Any]] = None):
+        """Publish an event to an actor's friends and followers"""
+        if not self.transport.cross_worker and not self._subscribers:
+            return
+        try:
+            audience = await friend_graph.friends(supabase, actor_id) | set(await supabase.get_follower_ids(actor_id))
+        except Exception as e:
+            logger.warning(f"Could not resolve audience for activity event: {str(e)}")
+            return
+        await self.publish(audience, event_type, actor_id, data)
+
+    async def publish_post_event(self, supabase: SupabaseClient, post_id: str, actor_id: str, event_type: str,
+                                 data: Optional[Dict[str, Any]] = None):
+        """Publish an event about a post to the post's author"""
+        if not self.transport.cross_worker and not self._subscribers:
+            return
+        try:
+            author_id = await supabase.get_post_author(post_id)
+        except Exception as e:
+            logger.warning(f"Could not resolve post author for activity event: {str(e)}")
+            return
+        if author_id:
+            await self.publish([author_id], event_type, actor_id, {'post_id': post_id, **(data or {})})
+
+
+activity_broker = ActivityBroker(queue_size=Config.ACTIVITY_QUEUE_SIZE)
@@ -0,0 +1,155 @@
+"""
+Habit and mood analytics as pure functions over rows already fetched
+"""
+
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+
+def habit_insights(analytics_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Totals and streak statistics from SupabaseClient.get_habit_analytics output"""
+    habits = analytics_data.get('habits', [])
+    streaks = analytics_data.get('streaks', [])
+    return {
+        "total_habits": len(habits),
+        "active_habits": len([h for h in habits if h.get('is_active', True)]),
+        "total_completions": sum(len(h.get('habit_completions', [])) for h in habits),
+        "average_streak": sum(s.get('current_streak', 0) for s in streaks) / max(len(streaks), 1),
+        "longest_streak": max((s.get('best_streak', 0) for s in streaks), default=0),
+        "user_progress": analytics_data.get('progress', {}),
+        "habits": habits,
+        "streaks": streaks
+    }
+
+
+def mood_analysis(mood_checkins: List[Dict[str, Any]], days: int = 30) -> Dict[str, Any]:
+    """Average, distribution and recent trend of mood check-ins (newest first)"""
+    if not mood_checkins:
+        return {
+            "average_mood": 0,
+            "mood_trend": "No data",
+            "total_entries": 0,
+            "mood_distribution": {},
+            "insights": []
+        }
+
+    mood_values = [m.get('mood_rating', 0) for m in mood_checkins]
+    average_mood = sum(mood_values) / len(mood_values) if mood_values else 0
+
+    mood_distribution: Dict[Any, int] = {}
+    for mood in mood_values:
+        mood_distribution[mood] = mood_distribution.get(mood, 0) + 1
+
+    # Mood trend (last 7 days)
+    recent_moods = mood_values[:7] if len(mood_values) >= 7 else mood_values
+    mood_trend = "stable"
+    if len(recent_moods) >= 2:
+        if recent_moods[0] > recent_moods[-1] + 0.5:
+            mood_trend = "improving"
+        elif recent_moods[0] < recent_moods[-1] - 0.5:
+            mood_trend = "declining"
+
+    return {
+        "average_mood": round(average_mood, 2),
+        "mood_trend": mood_trend,
+        "total_entries": len(mood_checkins),
+        "mood_distribution": mood_distribution,
+        "recent_moods": recent_moods,
+        "insights": [
+            f"Average mood over {days} days: {round(average_mood, 2)}/5",
+            f"Mood trend: {mood_trend}",
+            f"Total mood entries: {len(mood_checkins)}"
+        ]
+    }
+
+
+def habit_correlations(habits: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Pairs of habits with similar completion counts (pairwise, so quadratic in habits)"""
+    correlations = []
+    counts = [len(habit.get('habit_completions', [])) for habit in habits]
+
+    for i, habit1 in enumerate(habits):
+        for j in range(i + 1, len(habits)):
+            completions1, completions2 = counts[i], counts[j]
+            if completions1 > 0 and completions2 > 0:
+                correlation_strength = min(completions1, completions2) / max(completions1, completions2)
+                if correlation_strength > 0.7:
+                    correlations.append({
+                        "habit1": habit1['name'],
+                        "habit2": habits[j]['name'],
+                        "correlation": round(correlation_strength, 2),
+                        "type": "positive"
+                    })
+
+    return {
+        "correlations": correlations,
+        "total_habits": len(habits),
+        "insights": [
+            f"Found {len(correlations)} strong habit correlations",
+            "Habits with high correlation tend to be completed together"
+        ]
+    }
+
+
+def streak_prediction(completions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Likelihood of keeping a streak, from the most recent completions"""
+    if not completions:
+        return {
+            "prediction": "low",
+            "probability": 0.3,
+            "reason": "No completion history",
+            "recommendations": ["Start with small goals", "Set reminders"]
+        }
+
+    # Simple prediction based on recent completion rate
+    recent_completions = completions[:7]  # Last 7 days
+    completion_rate = len(recent_completions) / 7
+
+    if completion_rate >= 0.8:
+        prediction = "high"
+        probability = 0.9
+    elif completion_rate >= 0.5:
+        prediction = "medium"
+        probability = 0.6
+    else:
+        prediction = "low"
+        probability = 0.3
+
+    if prediction == "low":
+        recommendations = ["Reduce goal size", "Set daily reminders", "Find accountability partner"]
+    elif prediction == "medium":
+        recommendations = ["Maintain current routine", "Track progress daily"]
+    else:
+        recommendations = ["Great job!", "Consider increasing challenge", "Help others with similar goals"]
+
+    return {
+        "prediction": prediction,
+        "probability": probability,
+        "completion_rate": round(completion_rate, 2),
+        "reason": f"Based on {len(recent_completions)}/7 recent completions",
+        "recommendations": recommendations
+    }
+
+
+def advanced_analytics(insights: Dict[str, Any], mood: Dict[str, Any], correlations: Dict[str, Any],
+                       generated_at: Optional[datetime] = None) -> Dict[str, Any]:
+    """Combine the three analyses into an overall score and recommendation"""
+    habit_score = min(insights.get('total_completions', 0) / 100, 1.0)
+    mood_score = mood.get('average_mood', 0) / 5
+    overall_score = (habit_score + mood_score) / 2
+
+    if overall_score < 0.3:
+        recommendations = ["Focus on building one consistent habit"]
+    elif overall_score < 0.6:
+        recommendations = ["Great progress! Consider adding more habits"]
+    else:
+        recommendations = ["Excellent! You're on track for your goals"]
+
+    return {
+        "habit_insights": insights,
+        "mood_analysis": mood,
+        "habit_correlations": correlations,
+        "overall_score": round(overall_score, 2),
+        "recommendations": recommendations,
+        "generated_at": (generated_at or datetime.now()).isoformat()
+    }
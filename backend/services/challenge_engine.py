@@ -0,0 +1,208 @@
+"""
+Incremental group-challenge progress and ranking engine
+"""
+
+import time
+from collections import OrderedDict
+from datetime import date
+from itertools import islice
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+from config import Config
+from utils.metrics import cache_counters
+from database.supabase_client import SupabaseClient
+
+logger = logging.getLogger(__name__)
+
+STANDINGS_HITS, STANDINGS_MISSES = cache_counters('challenge_standings')
+USER_CHALLENGES_HITS, USER_CHALLENGES_MISSES = cache_counters('user_challenges')
+
+
+class _Fenwick:
+    """Binary indexed tree of participant counts per progress value"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.tree = [0] * (size + 1)
+
+    def add(self, index: int, delta: int):
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix(self, index: int) -> int:
+        """Sum of counts for progress values 0..index"""
+        index = min(index + 1, self.size)
+        total = 0
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    def find(self, rank: int) -> int:
+        """Smallest progress value whose prefix count reaches rank (1-based)"""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = position + step
+            if nxt <= self.size and self.tree[nxt] < rank:
+                position = nxt
+                rank -= self.tree[nxt]
+            step >>= 1
+        return position
+
+
+class ChallengeStandings:
+    """Ranking for one challenge.
+
+    Participants sit in per-progress buckets and a Fenwick tree counts them
+    per progress value, making updates and rank lookups O(log n). Ties share
+    a rank; within a tie, standings list whoever got there first.
+    """
+
+    def __init__(self, challenge: Dict[str, Any]):
+        self.challenge = challenge
+        self.target = max(int(challenge.get('target_value') or 1), 1)
+        self.counts = _Fenwick(self.target * 2 + 1)
+        self.buckets: Dict[int, Dict[str, None]] = {}
+        self.progress: Dict[str, int] = {}
+        self.loaded_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self.progress)
+
+    def _grow(self, progress: int):
+        size = self.counts.size
+        while progress >= size:
+            size *= 2
+        counts = _Fenwick(size)
+        for value, bucket in self.buckets.items():
+            counts.add(value, len(bucket))
+        self.counts = counts
+
+    def set_progress(self, user_id: str, progress: int):
+        """Place a participant at a progress value"""
+        progress = max(progress, 0)
+        previous = self.progress.get(user_id)
+        if previous == progress:
+            return
+        if previous is not None:
+            del self.buckets[previous][user_id]
+            if not self.buckets[previous]:
+                del self.buckets[previous]
+            self.counts.add(previous, -1)
+        if progress >= self.counts.size:
+            self._grow(progress)
+        self.buckets.setdefault(progress, {})[user_id] = None
+        self.counts.add(progress, 1)
+        self.progress[user_id] = progress
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """1-based rank of a participant (competition ranking)"""
+        progress = self.progress.get(user_id)
+        if progress is None:
+            return None
+        return len(self.progress) - self.counts.prefix(progress) + 1
+
+    def page(self, offset: int, limit: int) -> List[Tuple[int, str, int]]:
+        """Standings from offset, as (rank, user_id, progress), best first"""
+        total = len(self.progress)
+        if offset >= total:
+            return []
+
+        # Start at the bucket holding the (offset + 1)-th best participant
+        value = self.counts.find(total - offset)
+        skip = offset - (total - self.counts.prefix(value))
+        standings = []
+        while value >= 0 and len(standings) < limit:
+            bucket = self.buckets.get(value)
+            if bucket:
+                rank = total - self.counts.prefix(value) + 1
+                for user_id in islice(bucket, skip, skip + limit - len(standings)):
+                    standings.append((rank, user_id, value))
+                skip = 0
+            value -= 1
+        return standings
+
+
+class ChallengeEngine:
+    """Keeps standings for active challenges and applies completions to them.
+
+    Progress is advanced by the advance_challenge_progress database function,
+    which locks the participant row, counts each (habit, day) once and
+    applies the per-day rules there, so workers, restarts and re-marked
+    completions cannot overwrite or double-count progress. Cached standings take the returned values and are reloaded
+    after ttl_seconds to pick up other workers' updates.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, max_challenges: int = 1000, max_users: int = 50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_challenges = max_challenges
+        self.max_users = max_users
+        self._standings: "OrderedDict[str, ChallengeStandings]" = OrderedDict()
+        self._user_challenges: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+
+    async def standings(self, supabase: SupabaseClient, challenge_id: str) -> Optional[ChallengeStandings]:
+        """Get (loading on first use) the standings of a challenge"""
+        standings = self._standings.get(challenge_id)
+        if standings is not None and time.monotonic() - standings.loaded_at < self.ttl_seconds:
+            self._standings.move_to_end(challenge_id)
+            STANDINGS_HITS.inc()
+            return standings
+
+        STANDINGS_MISSES.inc()
+        challenge = await supabase.get_challenge(challenge_id)
+        if not challenge:
+            return None
+        standings = ChallengeStandings(challenge)
+        for row in await supabase.get_challenge_participants(challenge_id):
+            standings.set_progress(row['user_id'], row.get('current_progress') or 0)
+
+        self._standings[challenge_id] = standings
+        self._standings.move_to_end(challenge_id)
+        while len(self._standings) > self.max_challenges:
+            self._standings.popitem(last=False)
+        return standings
+
+    def add_participant(self, challenge_id: str, user_id: str):
+        """Register a new participant in loaded standings"""
+        standings = self._standings.get(challenge_id)
+        if standings is not None and user_id not in standings.progress:
+            standings.set_progress(user_id, 0)
+        self._user_challenges.pop(user_id, None)
+
+    async def _active_challenges(self, supabase: SupabaseClient, user_id: str) -> List[Dict[str, Any]]:
+        cached = self._user_challenges.get(user_id)
+        if cached and time.monotonic() - cached[0] < self.ttl_seconds:
+            USER_CHALLENGES_HITS.inc()
+            return cached[1]
+        USER_CHALLENGES_MISSES.inc()
+        challenges = await supabase.get_user_active_challenges(user_id)
+        self._user_challenges[user_id] = (time.monotonic(), challenges)
+        self._user_challenges.move_to_end(user_id)
+        while len(self._user_challenges) > self.max_users:
+            self._user_challenges.popitem(last=False)
+        return challenges
+
+    async def record_completion(self, supabase: SupabaseClient, user_id: str, habit_id: str, completion_date: str):
+        """Advance every active challenge the completion counts towards"""
+        try:
+            day = date.fromisoformat(completion_date[:10])
+            for challenge in await self._active_challenges(supabase, user_id):
+                if not (challenge['start_date'] <= day.isoformat() <= challenge['end_date']):
+                    continue
+                habit_ids = challenge.get('habit_ids') or []
+                if habit_ids and habit_id not in habit_ids:
+                    continue
+
+                row = await supabase.advance_challenge_progress(challenge['id'], user_id, habit_id, day.isoformat())
+                standings = self._standings.get(challenge['id'])
+                if row is not None and standings is not None and user_id in standings.progress:
+                    standings.set_progress(user_id, row.get('current_progress') or 0)
+        except Exception as e:
+            logger.error(f"Error applying completion to challenges: {str(e)}")
+
+
+challenge_engine = ChallengeEngine(ttl_seconds=Config.CHALLENGE_CACHE_TTL_SECONDS)
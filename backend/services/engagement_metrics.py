@@ -0,0 +1,149 @@
+"""
+Fleet-wide engagement metrics kept in constant-memory sketches
+"""
+
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+import logging
+import os
+import socket
+import uuid
+
+from config import Config
+from utils.sketches import HyperLogLog, KLLSketch
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = [0.5, 0.75, 0.9, 0.95, 0.99]
+
+
+class EngagementMetrics:
+    """Per-day HyperLogLog counters plus streak and XP quantile sketches.
+
+    Days older than the retention window are dropped, so memory stays bounded.
+    Streak and XP sketches hold one observation per completion, which weights
+    the distribution towards active users.
+
+    Snapshots from other workers are kept per worker, each replacing that
+    worker's previous one, and are only combined with this worker's own
+    sketches in summary(). snapshot() exports this worker's observations
+    alone, so repeated or two-way exchanges never count anything twice
+    (KLL merges, unlike HyperLogLog ones, are not idempotent).
+    """
+
+    def __init__(self, retention_days: int = 35, precision: int = 12, k: int = 200):
+        self.retention_days = retention_days
+        self.precision = precision
+        self.k = k
+        self.active_users: Dict[str, HyperLogLog] = {}
+        self.completed_habits: Dict[str, HyperLogLog] = {}
+        self.streaks = KLLSketch(k)
+        self.xp = KLLSketch(k)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.peers: Dict[str, Dict[str, Any]] = {}
+
+    def _day_sketch(self, sketches: Dict[str, HyperLogLog], day: str) -> HyperLogLog:
+        sketch = sketches.get(day)
+        if sketch is None:
+            sketch = sketches[day] = HyperLogLog(self.precision)
+            self._expire()
+        return sketch
+
+    def _expire(self):
+        cutoff = (datetime.now(timezone.utc).date() - timedelta(days=self.retention_days)).isoformat()
+        for state in self._states():
+            for name in ('active_users', 'completed_habits'):
+                sketches = state[name]
+                for day in [d for d in sketches if d <= cutoff]:
+                    del sketches[day]
+
+    def _states(self) -> List[Dict[str, Any]]:
+        """This worker's sketches followed by each peer's latest snapshot"""
+        own = {
+            'active_users': self.active_users, 'completed_habits': self.completed_habits,
+            'streaks': self.streaks, 'xp': self.xp
+        }
+        return [own, *self.peers.values()]
+
+    def record_completion(self, user_id: str, habit_id: str, when: Optional[datetime] = None):
+        """Count a completion towards the active-user and distinct-habit counters"""
+        day = (when or datetime.now(timezone.utc)).date().isoformat()
+        self._day_sketch(self.active_users, day).add(user_id)
+        self._day_sketch(self.completed_habits, day).add(habit_id)
+
+    def record_progress(self, current_streak: Optional[int] = None, total_xp: Optional[int] = None):
+        """Add streak and XP observations taken after a completion"""
+        if current_streak is not None:
+            self.streaks.add(current_streak)
+        if total_xp is not None:
+            self.xp.add(total_xp)
+
+    def _day_count(self, name: str, end: date, days: int = 1) -> int:
+        """Distinct values over `days` days ending at `end`, across this worker and its peers"""
+        union = HyperLogLog(self.precision)
+        for state in self._states():
+            sketches = state[name]
+            for offset in range(days):
+                sketch = sketches.get((end - timedelta(days=offset)).isoformat())
+                if sketch is not None:
+                    union.merge(sketch)
+        return union.count()
+
+    def _combined(self, name: str) -> KLLSketch:
+        """This worker's quantile sketch merged with its peers' latest ones"""
+        combined = KLLSketch(self.k)
+        for state in self._states():
+            combined.merge(state[name])
+        return combined
+
+    @staticmethod
+    def _percentiles(sketch: KLLSketch) -> Dict[str, Any]:
+        values = sketch.quantiles(PERCENTILES)
+        return {
+            'observations': sketch.count,
+            **{f"p{int(p * 100)}": value for p, value in zip(PERCENTILES, values)}
+        }
+
+    def summary(self, day: Optional[date] = None) -> Dict[str, Any]:
+        """Estimated engagement metrics for a day and its trailing windows"""
+        day = day or datetime.now(timezone.utc).date()
+        return {
+            'date': day.isoformat(),
+            'daily_active_users': self._day_count('active_users', day),
+            'weekly_active_users': self._day_count('active_users', day, 7),
+            'monthly_active_users': self._day_count('active_users', day, 28),
+            'distinct_habits_completed': self._day_count('completed_habits', day),
+            'streak_length': self._percentiles(self._combined('streaks')),
+            'total_xp': self._percentiles(self._combined('xp')),
+            'workers': 1 + len(self.peers)
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Serialize this worker's own sketches so another worker can merge them"""
+        return {
+            'worker': self.worker_id,
+            'active_users': {day: s.to_dict() for day, s in self.active_users.items()},
+            'completed_habits': {day: s.to_dict() for day, s in self.completed_habits.items()},
+            'streaks': self.streaks.to_dict(),
+            'xp': self.xp.to_dict()
+        }
+
+    def merge_snapshot(self, snapshot: Dict[str, Any]):
+        """Store a snapshot produced by another worker, replacing that worker's previous one"""
+        worker = snapshot['worker']
+        if not isinstance(worker, str) or not worker:
+            raise ValueError("Snapshot has no worker ID")
+        if worker == self.worker_id:
+            return
+        # Parse everything before storing, so a bad payload leaves the previous snapshot in place
+        state = {
+            name: {day: HyperLogLog.from_dict(data) for day, data in snapshot.get(name, {}).items()}
+            for name in ('active_users', 'completed_habits')
+        }
+        for name in ('streaks', 'xp'):
+            state[name] = KLLSketch.from_dict(snapshot[name]) if name in snapshot else KLLSketch(self.k)
+        self.peers[worker] = state
+        self._expire()
+
+
+engagement_metrics = EngagementMetrics(retention_days=Config.METRICS_RETENTION_DAYS)
@@ -0,0 +1,111 @@
+"""
+In-memory friend graph with symmetric adjacency sets
+"""
+
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+import logging
+
+from config import Config
+from utils.metrics import cache_counters
+from database.supabase_client import SupabaseClient
+
+logger = logging.getLogger(__name__)
+
+GRAPH_HITS, GRAPH_MISSES = cache_counters('friend_graph')
+
+
+class FriendGraph:
+    """Accepted friendships as per-user adjacency sets, loaded lazily in batches.
+
+    A user's set is authoritative once loaded (it holds every accepted edge
+    touching them). Entries are kept in an LRU, expire after ttl_seconds and
+    are updated in place or invalidated when friendships change.
+    """
+
+    def __init__(self, ttl_seconds: int = 600, max_users: int = 50000, batch_size: int = 100):
+        self.ttl_seconds = ttl_seconds
+        self.batch_size = batch_size
+        self.max_users = max_users
+        self._adjacency: "OrderedDict[str, Set[str]]" = OrderedDict()
+        self._loaded_at: Dict[str, float] = {}
+
+    def _fresh(self, user_id: str) -> bool:
+        loaded_at = self._loaded_at.get(user_id)
+        return loaded_at is not None and time.monotonic() - loaded_at < self.ttl_seconds
+
+    async def _ensure_loaded(self, supabase: SupabaseClient, user_ids: List[str]):
+        unique = dict.fromkeys(user_ids)
+        missing = [user_id for user_id in unique if not self._fresh(user_id)]
+        GRAPH_HITS.inc(len(unique) - len(missing))
+        GRAPH_MISSES.inc(len(missing))
+        if not missing:
+            for user_id in user_ids:
+                self._adjacency.move_to_end(user_id)
+            return
+
+        adjacency: Dict[str, Set[str]] = {user_id: set() for user_id in missing}
+        for start in range(0, len(missing), self.batch_size):
+            for edge in await supabase.get_friend_edges(missing[start:start + self.batch_size]):
+                a, b = edge['user_id'], edge['friend_id']
+                if a in adjacency:
+                    adjacency[a].add(b)
+                if b in adjacency:
+                    adjacency[b].add(a)
+
+        now = time.monotonic()
+        for user_id, friends in adjacency.items():
+            self._adjacency[user_id] = friends
+            self._loaded_at[user_id] = now
+        for user_id in user_ids:
+            self._adjacency.move_to_end(user_id)
+        while len(self._adjacency) > self.max_users:
+            evicted, _ = self._adjacency.popitem(last=False)
+            self._loaded_at.pop(evicted, None)
+
+    def cached_friends(self, user_id: str) -> Optional[Set[str]]:
+        """Get a user's friends only if a fresh copy is already loaded"""
+        return self._adjacency.get(user_id) if self._fresh(user_id) else None
+
+    async def friends(self, supabase: SupabaseClient, user_id: str) -> Set[str]:
+        """Get the IDs of a user's accepted friends (a live set - do not mutate)"""
+        await self._ensure_loaded(supabase, [user_id])
+        return self._adjacency[user_id]
+
+    async def mutual_friends(self, supabase: SupabaseClient, user_id: str, other_id: str) -> Set[str]:
+        """Get the friends two users have in common"""
+        await self._ensure_loaded(supabase, [user_id, other_id])
+        return self._adjacency[user_id] & self._adjacency[other_id]
+
+    async def suggestions(self, supabase: SupabaseClient, user_id: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """Suggest friends-of-friends, ranked by number of mutual friends"""
+        friends = await self.friends(supabase, user_id)
+        await self._ensure_loaded(supabase, list(friends))
+
+        candidates: Counter = Counter()
+        for friend_id in friends:
+            candidates.update(self._adjacency.get(friend_id, set()) - friends)
+        candidates.pop(user_id, None)
+        return candidates.most_common(limit)
+
+    def add_edge(self, user_id: str, friend_id: str):
+        """Record an accepted friendship in both loaded adjacency sets"""
+        for a, b in ((user_id, friend_id), (friend_id, user_id)):
+            if a in self._adjacency:
+                self._adjacency[a].add(b)
+
+    def remove_edge(self, user_id: str, friend_id: str):
+        """Remove a friendship from both loaded adjacency sets"""
+        for a, b in ((user_id, friend_id), (friend_id, user_id)):
+            if a in self._adjacency:
+                self._adjacency[a].discard(b)
+
+    def invalidate(self, *user_ids: str):
+        """Force the given users' adjacency to be reloaded on next use"""
+        for user_id in user_ids:
+            self._adjacency.pop(user_id, None)
+            self._loaded_at.pop(user_id, None)
+
+
+friend_graph = FriendGraph(ttl_seconds=Config.FRIEND_GRAPH_TTL_SECONDS)
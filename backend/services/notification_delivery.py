@@ -0,0 +1,159 @@
+"""
+Batched notification delivery through pluggable channel providers
+"""
+
+import abc
+import asyncio
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+from config import Config
+from database.supabase_client import SupabaseClient
+from services.activity_broker import activity_broker
+from services.unread_counts import unread_counts
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationProvider(abc.ABC):
+    """Sends notifications over one channel (e.g. 'push', 'email' or 'in_app').
+
+    send() delivers a single notification and raises on failure; the
+    pipeline takes care of concurrency, retries and logging.
+    """
+
+    channel = 'in_app'
+
+    @abc.abstractmethod
+    async def send(self, notification: Dict[str, Any]):
+        """Deliver one notification; raises on failure"""
+
+
+class InAppProvider(NotificationProvider):
+    """Pushes notifications to the user's open activity connections"""
+
+    channel = 'in_app'
+
+    async def send(self, notification: Dict[str, Any]):
+        await activity_broker.publish([notification['user_id']], 'notification', 'system', {
+            'id': notification['id'],
+            'title': notification['title'],
+            'body': notification['body'],
+            'type': notification['type']
+        })
+
+
+class FakeProvider(NotificationProvider):
+    """Records notifications instead of sending them, failing a given fraction"""
+
+    def __init__(self, channel: str = 'push', failure_rate: float = 0.0):
+        self.channel = channel
+        self.failure_rate = failure_rate
+        self.sent: List[Dict[str, Any]] = []
+
+    async def send(self, notification: Dict[str, Any]):
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise Exception("Simulated delivery failure")
+        self.sent.append(notification)
+
+
+class DeliveryPipeline:
+    """Delivers batches of due notifications handed over by the dispatcher.
+
+    A batch is grouped by channel and sent with bounded concurrency. Sent
+    notifications are marked with one update, failures are rescheduled with
+    exponential backoff by moving scheduled_for (so the notifications table
+    itself is the persistent retry queue), and every attempt is appended to
+    notification_delivery_logs with one bulk insert per batch. Notifications
+    out of attempts, or on a channel with no provider, get failed_at instead
+    of sent_at and never count as delivered.
+    """
+
+    def __init__(self, concurrency: int = 50, max_attempts: int = 5, retry_base_seconds: int = 30,
+                 default_channel: str = 'in_app'):
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.default_channel = default_channel
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._providers: Dict[str, NotificationProvider] = {}
+        self.register(InAppProvider())
+
+    def register(self, provider: NotificationProvider):
+        """Use a provider for its channel, replacing any previous one"""
+        self._providers[provider.channel] = provider
+
+    def _channel(self, notification: Dict[str, Any]) -> str:
+        return (notification.get('data') or {}).get('channel') or self.default_channel
+
+    async def _send(self, provider: Optional[NotificationProvider],
+                    notification: Dict[str, Any]) -> Optional[str]:
+        """Send one notification; returns an error message on failure"""
+        if provider is None:
+            return f"No provider for channel '{self._channel(notification)}'"
+        async with self._semaphore:
+            try:
+                await provider.send(notification)
+                return None
+            except Exception as e:
+                return str(e) or type(e).__name__
+
+    async def deliver(self, supabase: SupabaseClient, notifications: List[Dict[str, Any]]):
+        """Send a batch of notifications and record the outcome of each"""
+        by_channel: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        for notification in notifications:
+            by_channel[self._channel(notification)].append(notification)
+
+        outcomes: List[Tuple[str, Dict[str, Any], Optional[str]]] = []
+        for channel, group in by_channel.items():
+            provider = self._providers.get(channel)
+            errors = await asyncio.gather(*(self._send(provider, notification) for notification in group))
+            outcomes.extend((channel, notification, error) for notification, error in zip(group, errors))
+
+        now = datetime.now(timezone.utc)
+        sent: List[Dict[str, Any]] = []
+        retries: Dict[int, List[str]] = defaultdict(list)
+        given_up: Dict[int, List[str]] = defaultdict(list)
+        logs = []
+        for channel, notification, error in outcomes:
+            attempt = (notification.get('delivery_attempts') or 0) + 1
+            if error is None:
+                sent.append(notification)
+            elif attempt >= self.max_attempts or channel not in self._providers:
+                given_up[attempt].append(notification['id'])
+            else:
+                retries[attempt].append(notification['id'])
+            logs.append({
+                'notification_id': notification['id'],
+                'delivery_method': channel,
+                'delivery_status': 'sent' if error is None else 'failed',
+                'delivery_time': now.isoformat(),
+                'error_message': error,
+                'metadata': {'attempt': attempt}
+            })
+
+        await supabase.mark_notifications_sent([notification['id'] for notification in sent], now.isoformat())
+        unread_counts.record_delivered(sent)
+        for attempt, notification_ids in given_up.items():
+            await supabase.mark_notifications_failed(notification_ids, now.isoformat(), attempt)
+        for attempt, notification_ids in retries.items():
+            retry_at = now + timedelta(seconds=self.retry_base_seconds * 2 ** (attempt - 1))
+            await supabase.reschedule_notifications(notification_ids, retry_at.isoformat(), attempt)
+        try:
+            await supabase.bulk_insert_delivery_logs(logs)
+        except Exception as e:
+            # Deliveries already happened; losing their log rows must not resend them
+            logger.error(f"Error writing {len(logs)} delivery logs: {str(e)}")
+
+        failed = len(logs) - sum(1 for log in logs if log['delivery_status'] == 'sent')
+        if failed:
+            logger.warning(f"Delivered {len(logs) - failed} notifications, {failed} failed")
+
+
+delivery_pipeline = DeliveryPipeline(
+    concurrency=Config.NOTIFICATION_DELIVERY_CONCURRENCY,
+    max_attempts=Config.NOTIFICATION_MAX_ATTEMPTS,
+    retry_base_seconds=Config.NOTIFICATION_RETRY_BASE_SECONDS
+)
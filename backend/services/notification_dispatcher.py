@@ -0,0 +1,145 @@
+"""
+Leased, heap-ordered dispatcher for scheduled notifications
+"""
+
+import asyncio
+import heapq
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
+import logging
+
+from config import Config
+from database.supabase_client import SupabaseClient
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[SupabaseClient, List[Dict[str, Any]]], Awaitable[None]]
+
+
+def _due_at(notification: Dict[str, Any]) -> float:
+    scheduled_for = notification.get('scheduled_for')
+    if not scheduled_for:
+        return 0.0
+    return datetime.fromisoformat(scheduled_for).timestamp()
+
+
+class NotificationDispatcher:
+    """Fires scheduled notifications at their due time.
+
+    Notifications due within the next window are leased to this worker in
+    batches (claim_due_notifications uses FOR UPDATE SKIP LOCKED, so workers
+    never claim the same row) and held in a min-heap keyed by due time. The
+    loop sleeps until the earliest due time or the next claim, then hands
+    everything due to the handler in one batch. Leases outlive the window,
+    so a crashed worker's notifications are picked up by others once its
+    leases expire.
+    """
+
+    def __init__(self, window_seconds: int = 60, batch_size: int = 500,
+                 lease_seconds: int = 300, max_pending: int = 50000):
+        self.window_seconds = window_seconds
+        self.batch_size = batch_size
+        self.lease_seconds = max(lease_seconds, window_seconds * 2)
+        self.max_pending = max_pending
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._heap: List[Tuple[float, str]] = []
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._supabase: Optional[SupabaseClient] = None
+        self._handler: Optional[Handler] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._next_claim = 0.0
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def start(self, supabase: SupabaseClient, handler: Handler):
+        """Start dispatching due batches to handler through an initialized client"""
+        self._supabase = supabase
+        self._handler = handler
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop dispatching and hand unfired notifications back to other workers"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._supabase is not None and self._pending:
+            try:
+                await self._supabase.release_notification_leases(self.worker_id, list(self._pending))
+            except Exception as e:
+                logger.error(f"Error releasing notification leases: {str(e)}")
+        self._heap.clear()
+        self._pending.clear()
+
+    def nudge(self):
+        """Claim again right away, e.g. after scheduling something due soon"""
+        self._next_claim = 0.0
+        self._wakeup.set()
+
+    async def _claim(self):
+        horizon = datetime.fromtimestamp(time.time() + self.window_seconds, timezone.utc).isoformat()
+        while len(self._pending) < self.max_pending:
+            limit = min(self.batch_size, self.max_pending - len(self._pending))
+            rows = await self._supabase.claim_due_notifications(self.worker_id, horizon, limit, self.lease_seconds)
+            for row in rows:
+                if row['id'] not in self._pending:
+                    self._pending[row['id']] = row
+                    heapq.heappush(self._heap, (_due_at(row), row['id']))
+            if len(rows) < limit:
+                break
+
+    def _pop_due(self, now: float) -> List[Dict[str, Any]]:
+        batch = []
+        while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+            _, notification_id = heapq.heappop(self._heap)
+            notification = self._pending.pop(notification_id, None)
+            if notification is not None:
+                batch.append(notification)
+        return batch
+
+    async def _fire(self, batch: List[Dict[str, Any]]):
+        try:
+            await self._handler(self._supabase, batch)
+        except Exception as e:
+            # Leases are left in place; the batch is reclaimed once they expire
+            logger.error(f"Error dispatching {len(batch)} notifications: {str(e)}")
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            if now >= self._next_claim:
+                try:
+                    await self._claim()
+                except Exception as e:
+                    logger.error(f"Error claiming notifications: {str(e)}")
+                self._next_claim = time.time() + self.window_seconds / 2
+
+            batch = self._pop_due(time.time())
+            if batch:
+                await self._fire(batch)
+                continue
+
+            wake_at = min(self._next_claim, self._heap[0][0]) if self._heap else self._next_claim
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(wake_at - time.time(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+
+notification_dispatcher = NotificationDispatcher(
+    window_seconds=Config.NOTIFICATION_DISPATCH_WINDOW_SECONDS,
+    batch_size=Config.NOTIFICATION_DISPATCH_BATCH_SIZE,
+    lease_seconds=Config.NOTIFICATION_LEASE_SECONDS
+)
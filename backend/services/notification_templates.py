@@ -0,0 +1,138 @@
+"""
+Compiled, cached notification templates
+"""
+
+import time
+from string import Formatter
+from typing import Dict, Any, Callable, FrozenSet, List, Optional, Tuple
+import logging
+
+from config import Config
+from database.supabase_client import SupabaseClient
+
+logger = logging.getLogger(__name__)
+
+# Used until the database copies load, and whenever a template is missing there
+DEFAULT_TEMPLATES = [
+    {
+        'name': 'habit_reminder',
+        'title_template': "Time for {habit_name}!",
+        'body_template': "Don't forget to complete your {habit_name} habit. You're on a {current_streak} day streak!",
+        'notification_type': 'reminder'
+    }
+]
+
+
+class TemplateError(ValueError):
+    """A template is malformed or was rendered without one of its placeholders"""
+
+
+def _compile(text: str) -> Tuple[Callable[[Dict[str, Any]], str], FrozenSet[str]]:
+    """Validate a template once and return its formatter and placeholder names.
+
+    Only plain named placeholders are allowed - positional fields, attribute
+    and index lookups ({user.email}, {0}) and conversions are rejected.
+    """
+    fields = set()
+    try:
+        for _, field, spec, conversion in Formatter().parse(text):
+            if field is None:
+                continue
+            if not field.isidentifier() or conversion or (spec and '{' in spec):
+                raise TemplateError(f"Unsupported placeholder '{{{field}}}'")
+            fields.add(field)
+    except ValueError as e:
+        raise TemplateError(str(e))
+    return text.format_map, frozenset(fields)
+
+
+class CompiledTemplate:
+    """A notification template parsed and validated once, rendered many times"""
+
+    __slots__ = ('name', 'notification_type', 'fields', '_title', '_body')
+
+    def __init__(self, name: str, title_template: str, body_template: str, notification_type: str):
+        self.name = name
+        self.notification_type = notification_type
+        self._title, title_fields = _compile(title_template)
+        self._body, body_fields = _compile(body_template)
+        self.fields = title_fields | body_fields
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "CompiledTemplate":
+        return cls(row['name'], row['title_template'], row['body_template'], row['notification_type'])
+
+    def render(self, values: Dict[str, Any]) -> Tuple[str, str]:
+        """Render (title, body); raises TemplateError if a placeholder has no value"""
+        try:
+            return self._title(values), self._body(values)
+        except KeyError as e:
+            raise TemplateError(f"Template '{self.name}' is missing value {e}")
+
+
+class NotificationTemplates:
+    """Process-wide registry of compiled templates.
+
+    Templates are loaded and compiled in one query. After ttl_seconds a
+    cheap version check (row count and latest updated_at) decides whether
+    they need reloading, so rendering never touches the database.
+    """
+
+    def __init__(self, ttl_seconds: int = 300):
+        self.ttl_seconds = ttl_seconds
+        self._defaults = {row['name']: CompiledTemplate.from_row(row) for row in DEFAULT_TEMPLATES}
+        self._templates: Dict[str, CompiledTemplate] = dict(self._defaults)
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+
+    async def refresh(self, supabase: SupabaseClient, force: bool = False):
+        """Reload templates if they changed since the last load"""
+        if not force and time.monotonic() - self._checked_at < self.ttl_seconds:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            version = await supabase.get_notification_templates_version()
+            if version is None or (version == self._version and not force):
+                return
+            rows = await supabase.get_notification_templates()
+        except Exception as e:
+            logger.warning(f"Keeping cached notification templates: {str(e)}")
+            return
+
+        templates = dict(self._defaults)
+        for row in rows:
+            try:
+                templates[row['name']] = CompiledTemplate.from_row(row)
+            except TemplateError as e:
+                logger.warning(f"Skipping notification template '{row.get('name')}': {str(e)}")
+        self._templates = templates
+        self._version = version
+
+    def invalidate(self):
+        """Force a reload on the next refresh"""
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self, name: str, available: Optional[FrozenSet[str]] = None) -> CompiledTemplate:
+        """Get a template; when the caller's available values don't cover its
+        placeholders, fall back to the built-in default of the same name"""
+        template = self._templates.get(name)
+        if template is None:
+            raise TemplateError(f"Unknown notification template '{name}'")
+        if available is not None and not template.fields <= available:
+            default = self._defaults.get(name)
+            if default is None or not default.fields <= available:
+                raise TemplateError(f"Template '{name}' needs {sorted(template.fields - available)}")
+            logger.warning(f"Template '{name}' needs {sorted(template.fields - available)} - using built-in default")
+            return default
+        return template
+
+    def for_type(self, notification_type: str) -> Optional[CompiledTemplate]:
+        """The first template for a notification type, if any"""
+        return next((t for t in self._templates.values() if t.notification_type == notification_type), None)
+
+    def names(self) -> List[str]:
+        return sorted(self._templates)
+
+
+notification_templates = NotificationTemplates(ttl_seconds=Config.NOTIFICATION_TEMPLATE_TTL_SECONDS)
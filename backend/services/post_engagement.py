@@ -0,0 +1,207 @@
+"""
+Buffered, coalesced likes and comments for social posts
+"""
+
+import asyncio
+import uuid
+import json
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Set, Tuple
+import logging
+
+from config import Config
+from database.circuit_breaker import CircuitOpenError, is_outage
+from database.supabase_client import SupabaseClient
+from utils.metrics import DEAD_LETTERS
+
+logger = logging.getLogger(__name__)
+
+
+class PostEngagementBuffer:
+    """In-process write buffer for post likes and comments.
+
+    Likes are deduplicated per (post, user) and comments are given their ID
+    up front, then both are written with one bulk statement per flush. The
+    statement-level count triggers turn each flush into a single counter
+    update per post. Reads add the still-pending deltas, including those of
+    a batch being written, so counts stay fresh.
+
+    Callers have already been told their like or comment was saved, so
+    nothing is dropped while the database is unreachable: the batch is kept
+    for the next flush. When the database rejects a batch (e.g. a like on a
+    post deleted meanwhile), it is split in halves until the offending rows
+    are isolated; only those are dead-lettered (logged with their content).
+    """
+
+    def __init__(self, flush_interval: float = 2.0, max_pending: int = 5000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._likes: Dict[Tuple[str, str], str] = {}
+        self._comments: List[Dict[str, Any]] = []
+        self._like_deltas: Counter = Counter()
+        self._comment_deltas: Counter = Counter()
+        # The batch being written: still counted by reads until the write returns
+        self._inflight_likes: Dict[Tuple[str, str], str] = {}
+        self._inflight_comments: List[Dict[str, Any]] = []
+        self._inflight_like_deltas: Counter = Counter()
+        self._inflight_comment_deltas: Counter = Counter()
+        self._supabase: Optional[SupabaseClient] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self._flushes: Set[asyncio.Task] = set()
+
+    def start(self, supabase: SupabaseClient):
+        """Start periodic flushing through an initialized client"""
+        self._supabase = supabase
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop, let a flush in progress finish and write out whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._flushes:
+            await asyncio.wait(self._flushes)
+        await self.flush()
+
+    def _check_available(self):
+        if self._supabase is None or not self._supabase.client:
+            raise Exception("Database not available")
+
+    def _start_flush(self) -> asyncio.Task:
+        task = asyncio.create_task(self.flush())
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+        return task
+
+    def _maybe_flush_early(self):
+        if len(self._likes) + len(self._comments) >= self.max_pending and not self._flushes:
+            self._start_flush()
+
+    async def add_like(self, post_id: str, user_id: str) -> bool:
+        """Buffer a like; returns False if the same like is already pending or stored"""
+        self._check_available()
+        key = (post_id, user_id)
+        if key in self._likes or key in self._inflight_likes:
+            return False
+        if await self._supabase.get_post_like(post_id, user_id) is not None:
+            return False
+        if key in self._likes or key in self._inflight_likes:
+            # Added by a concurrent request while the lookup ran
+            return False
+        self._likes[key] = datetime.now(timezone.utc).isoformat()
+        self._like_deltas[post_id] += 1
+        self._maybe_flush_early()
+        return True
+
+    def add_comment(self, comment: Dict[str, Any]) -> Dict[str, Any]:
+        """Buffer a comment and return it as it will be stored"""
+        self._check_available()
+        now = datetime.now(timezone.utc).isoformat()
+        row = {'id': str(uuid.uuid4()), 'created_at': now, 'updated_at': now, **comment}
+        self._comments.append(row)
+        self._comment_deltas[row['post_id']] += 1
+        self._maybe_flush_early()
+        return dict(row)
+
+    def pending_comments(self, post_id: str) -> List[Dict[str, Any]]:
+        """Get comments on a post that have not been flushed yet"""
+        return [
+            dict(comment) for comment in [*self._inflight_comments, *self._comments]
+            if comment['post_id'] == post_id
+        ]
+
+    def merge_counts(self, posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add pending like and comment deltas to posts' stored counters in place"""
+        like_deltas = self._like_deltas + self._inflight_like_deltas
+        comment_deltas = self._comment_deltas + self._inflight_comment_deltas
+        if not like_deltas and not comment_deltas:
+            return posts
+        for post in posts:
+            post_id = post.get('id')
+            post['likes_count'] = (post.get('likes_count') or 0) + like_deltas.get(post_id, 0)
+            post['comments_count'] = (post.get('comments_count') or 0) + comment_deltas.get(post_id, 0)
+        return posts
+
+    async def flush(self):
+        """Write all pending likes and comments with one bulk statement each"""
+        if self._supabase is None or (not self._likes and not self._comments):
+            return
+
+        async with self._lock:
+            likes, self._likes = self._likes, {}
+            comments, self._comments = self._comments, []
+            self._inflight_likes, self._inflight_comments = likes, comments
+            self._inflight_like_deltas, self._like_deltas = self._like_deltas, Counter()
+            self._inflight_comment_deltas, self._comment_deltas = self._comment_deltas, Counter()
+            like_rows = [
+                {'post_id': post_id, 'user_id': user_id, 'created_at': created_at}
+                for (post_id, user_id), created_at in likes.items()
+            ]
+
+            # Until a write returns its rows count as unwritten; resending them is safe
+            unwritten_likes, unwritten_comments = like_rows, comments
+            try:
+                unwritten_likes = await self._write(self._supabase.bulk_upsert_post_likes, like_rows, 'post_like')
+                # Comments wait for the next flush too if the database went away during the likes
+                if not (unwritten_likes and comments):
+                    unwritten_comments = await self._write(
+                        self._supabase.bulk_insert_post_comments, comments, 'post_comment'
+                    )
+            finally:
+                self._inflight_likes, self._inflight_comments = {}, []
+                self._inflight_like_deltas, self._inflight_comment_deltas = Counter(), Counter()
+                for row in unwritten_likes:
+                    key = (row['post_id'], row['user_id'])
+                    if key not in self._likes:
+                        self._likes[key] = row['created_at']
+                        self._like_deltas[key[0]] += 1
+                self._comments[:0] = unwritten_comments
+                for row in unwritten_comments:
+                    self._comment_deltas[row['post_id']] += 1
+
+    async def _write(self, write: Callable[[List[Dict[str, Any]]], Awaitable[Any]],
+                     rows: List[Dict[str, Any]], kind: str) -> List[Dict[str, Any]]:
+        """Write rows, bisecting a rejected batch down to the rows at fault.
+
+        Returns the rows to keep for the next flush, because the database
+        became unreachable before they were written. Both writes skip rows
+        already stored, so a batch that committed before its response was
+        lost is safe to send again.
+        """
+        if not rows:
+            return []
+        try:
+            await write(rows)
+            return []
+        except Exception as e:
+            if isinstance(e, CircuitOpenError) or is_outage(e):
+                logger.warning(f"Post engagement flush failed, keeping {len(rows)} {kind} rows for the next one: {str(e)}")
+                return rows
+            if len(rows) == 1:
+                DEAD_LETTERS.labels(kind).inc()
+                logger.error(f"Dead-lettering {kind} rejected by the database: {str(e)}; row={json.dumps(rows[0], default=str)}")
+                return []
+        middle = len(rows) // 2
+        unwritten = await self._write(write, rows[:middle], kind)
+        if unwritten:
+            return unwritten + rows[middle:]
+        return await self._write(write, rows[middle:], kind)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # Shielded so that stop() can't cancel a batch halfway through its writes
+                await asyncio.shield(self._start_flush())
+            except Exception as e:
+                logger.error(f"Error flushing post engagement: {str(e)}")
+
+
+post_engagement = PostEngagementBuffer(flush_interval=Config.POST_ENGAGEMENT_FLUSH_SECONDS)
@@ -0,0 +1,127 @@
+"""
+Batched, cached profile hydration for social responses
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Iterable, Set
+import logging
+
+from config import Config
+from utils.metrics import cache_counters
+from database.supabase_client import SupabaseClient
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HITS, PROFILE_MISSES = cache_counters('profile')
+
+
+class ProfileCache:
+    """Process-wide TTL + LRU cache of compact profile summaries"""
+
+    def __init__(self, ttl_seconds: int = 300, max_entries: int = 50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            PROFILE_MISSES.inc()
+            return None
+        expires_at, summary = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            PROFILE_MISSES.inc()
+            return None
+        self._entries.move_to_end(user_id)
+        PROFILE_HITS.inc()
+        return summary
+
+    def set(self, user_id: str, summary: Dict[str, Any]):
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, summary)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        """Drop a user's summary after their profile changed (other workers keep theirs until ttl_seconds)"""
+        self._entries.pop(user_id, None)
+
+
+profile_cache = ProfileCache(ttl_seconds=Config.PROFILE_CACHE_TTL_SECONDS)
+
+# Batch fetches in flight; the loop only keeps weak references to tasks
+_dispatches: Set[asyncio.Task] = set()
+
+
+class ProfileLoader:
+    """Request-scoped loader that coalesces profile lookups into one `in_` query.
+
+    Every load() issued in the same event-loop tick is collected and fetched
+    together; cached summaries are returned without touching the database.
+    """
+
+    def __init__(self, supabase: SupabaseClient, cache: ProfileCache = profile_cache):
+        self.supabase = supabase
+        self.cache = cache
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._loaded: Dict[str, asyncio.Future] = {}
+
+    def load(self, user_id: str) -> "asyncio.Future":
+        """Get a future resolving to a user's profile summary (None if unknown)"""
+        future = self._loaded.get(user_id) or self._pending.get(user_id)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            future.set_result(cached)
+            self._loaded[user_id] = future
+            return future
+
+        if not self._pending:
+            loop.call_soon(self._start_dispatch)
+        self._pending[user_id] = future
+        return future
+
+    async def load_many(self, user_ids: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Get profile summaries for many users, keyed by user ID"""
+        ids = list(dict.fromkeys(user_ids))
+        summaries = await asyncio.gather(*(self.load(user_id) for user_id in ids))
+        return dict(zip(ids, summaries))
+
+    async def hydrate(self, rows: List[Dict[str, Any]], key: str = 'user_id', field: str = 'profile') -> List[Dict[str, Any]]:
+        """Attach profile summaries to rows in place, looked up by rows[key]"""
+        summaries = await self.load_many(row[key] for row in rows if row.get(key))
+        for row in rows:
+            row[field] = summaries.get(row.get(key))
+        return rows
+
+    def _start_dispatch(self):
+        task = asyncio.create_task(self._dispatch())
+        _dispatches.add(task)
+        task.add_done_callback(_dispatches.discard)
+
+    async def _dispatch(self):
+        batch, self._pending = self._pending, {}
+        self._loaded.update(batch)
+        try:
+            rows = await self.supabase.get_profile_summaries(list(batch))
+        except Exception as e:
+            logger.error(f"Error loading profiles: {str(e)}")
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        found = {row['id']: row for row in rows}
+        for user_id, future in batch.items():
+            summary = found.get(user_id)
+            if summary is not None:
+                self.cache.set(user_id, summary)
+            if not future.done():
+                future.set_result(summary)
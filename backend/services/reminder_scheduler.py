@@ -0,0 +1,186 @@
+"""
+Bulk materialization of habit reminders into scheduled notifications
+"""
+
+import asyncio
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Any, List, Optional
+from zoneinfo import ZoneInfo
+import logging
+
+from config import Config
+from database.supabase_client import SupabaseClient
+from services.notification_dispatcher import notification_dispatcher
+from services.notification_templates import notification_templates
+from services.reminder_times import resolve_timezone
+
+logger = logging.getLogger(__name__)
+
+ALL_DAYS = [0, 1, 2, 3, 4, 5, 6]
+REMINDER_TEMPLATE = 'habit_reminder'
+REMINDER_VALUES = frozenset({'habit_name', 'current_streak'})
+
+
+def _flutter_weekday(day: date) -> int:
+    """Weekday in Flutter format (0=Sunday)"""
+    return (day.weekday() + 1) % 7
+
+
+def expand_reminders(habit: Dict[str, Any], tz_name: Optional[str], now: datetime,
+                     horizon_days: int, title: str, body: str) -> List[Dict[str, Any]]:
+    """Notification rows for a habit's reminders over the next horizon_days, in the user's timezone"""
+    if not habit.get('reminder_time'):
+        return []
+    reminder_time = time.fromisoformat(habit['reminder_time'])
+    days = set(habit.get('reminder_days') or ALL_DAYS)
+    tz = ZoneInfo(resolve_timezone(tz_name))
+    today = now.astimezone(tz).date()
+
+    rows = []
+    for offset in range(horizon_days + 1):
+        local_date = today + timedelta(days=offset)
+        if _flutter_weekday(local_date) not in days:
+            continue
+        scheduled_for = datetime.combine(local_date, reminder_time, tzinfo=tz).astimezone(timezone.utc)
+        if scheduled_for <= now:
+            continue
+        rows.append({
+            'user_id': habit['user_id'],
+            'title': title,
+            'body': body,
+            'type': 'reminder',
+            'data': {'habit_id': habit['id'], 'template': REMINDER_TEMPLATE},
+            'scheduled_for': scheduled_for.isoformat(),
+            'dedupe_key': f"reminder:{habit['id']}:{local_date.isoformat()}"
+        })
+    return rows
+
+
+class ReminderMaterializer:
+    """Expands habits' reminder settings into concrete notifications.
+
+    A periodic pass pages through every habit with reminders enabled and
+    writes the next horizon_days of reminders with chunked bulk upserts.
+    Each reminder carries a per-habit, per-local-day dedupe key, so passes are
+    idempotent and never re-send a reminder that has already gone out.
+    Changing a habit's reminder settings re-expands just that habit.
+    """
+
+    def __init__(self, horizon_days: int = 7, interval_seconds: int = 6 * 3600,
+                 chunk_size: int = 500, page_size: int = 1000):
+        self.horizon_days = horizon_days
+        self.interval_seconds = interval_seconds
+        self.chunk_size = chunk_size
+        self.page_size = page_size
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, supabase: SupabaseClient):
+        """Start periodic materialization through an initialized client"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(supabase))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _schedule_row(self, habit: Dict[str, Any], tz_name: Optional[str], now: datetime) -> Dict[str, Any]:
+        return {
+            'user_id': habit['user_id'],
+            'habit_id': habit['id'],
+            'schedule_type': 'weekly',
+            'schedule_data': {
+                'reminder_time': habit['reminder_time'],
+                'days': habit.get('reminder_days') or ALL_DAYS,
+                'timezone': resolve_timezone(tz_name),
+                'materialized_until': (now + timedelta(days=self.horizon_days)).isoformat()
+            },
+            'is_active': True,
+            'updated_at': now.isoformat()
+        }
+
+    async def materialize_habits(self, supabase: SupabaseClient, habits: List[Dict[str, Any]]) -> int:
+        """Write upcoming reminders for the given habits; returns the number of new notifications"""
+        if not habits:
+            return 0
+        now = datetime.now(timezone.utc)
+        await notification_templates.refresh(supabase)
+        template = notification_templates.get(REMINDER_TEMPLATE, REMINDER_VALUES)
+        timezones = await supabase.get_user_timezones(list({habit['user_id'] for habit in habits}))
+        streaks = await supabase.get_current_streaks([habit['id'] for habit in habits])
+
+        notifications = []
+        for habit in habits:
+            # Rendered once per habit; the streak is as of materialization
+            title, body = template.render({'habit_name': habit['name'], 'current_streak': streaks.get(habit['id'], 0)})
+            notifications.extend(
+                expand_reminders(habit, timezones.get(habit['user_id']), now, self.horizon_days, title, body)
+            )
+
+        created = 0
+        for start in range(0, len(notifications), self.chunk_size):
+            created += await supabase.bulk_upsert_notifications(notifications[start:start + self.chunk_size])
+        await supabase.upsert_notification_schedules(
+            [self._schedule_row(habit, timezones.get(habit['user_id']), now) for habit in habits]
+        )
+        return created
+
+    async def materialize_all(self, supabase: SupabaseClient) -> Dict[str, int]:
+        """Materialize reminders for every habit that has them enabled"""
+        habit_count = 0
+        created = 0
+        after_id = None
+        while True:
+            habits = await supabase.get_reminder_habits(after_id, self.page_size)
+            if not habits:
+                break
+            created += await self.materialize_habits(supabase, habits)
+            habit_count += len(habits)
+            after_id = habits[-1]['id']
+            if len(habits) < self.page_size:
+                break
+        notification_dispatcher.nudge()
+        return {'habits': habit_count, 'notifications_created': created}
+
+    async def rematerialize_habit(self, supabase: SupabaseClient, habit: Dict[str, Any]):
+        """Replace a habit's pending reminders after its reminder settings changed.
+
+        Reminders a dispatcher has already leased are left to be sent: it
+        holds them in memory, and the replacements for the same days share
+        their dedupe keys, so nothing is sent twice.
+        """
+        try:
+            await supabase.delete_pending_reminders(habit['id'])
+            if (habit.get('has_reminder') and habit.get('reminder_time') and habit.get('is_active', True)
+                    and not habit.get('is_archived', False)):
+                await self.materialize_habits(supabase, [habit])
+                notification_dispatcher.nudge()
+            else:
+                await supabase.upsert_notification_schedules([{
+                    'user_id': habit['user_id'],
+                    'habit_id': habit['id'],
+                    'schedule_type': 'weekly',
+                    'is_active': False,
+                    'updated_at': datetime.now(timezone.utc).isoformat()
+                }])
+        except Exception as e:
+            logger.error(f"Error re-materializing reminders for habit {habit.get('id')}: {str(e)}")
+
+    async def _run(self, supabase: SupabaseClient):
+        while True:
+            try:
+                result = await self.materialize_all(supabase)
+                logger.info(f"Materialized {result['notifications_created']} reminders for {result['habits']} habits")
+            except Exception as e:
+                logger.error(f"Error materializing reminders: {str(e)}")
+            await asyncio.sleep(self.interval_seconds)
+
+
+reminder_materializer = ReminderMaterializer(
+    horizon_days=Config.REMINDER_HORIZON_DAYS,
+    interval_seconds=Config.REMINDER_MATERIALIZE_INTERVAL_HOURS * 3600
+)
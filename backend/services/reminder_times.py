@@ -0,0 +1,197 @@
+"""
+Completion-time histograms for data-driven reminder times
+"""
+
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Any, List, Optional, Set
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import logging
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+BIN_MINUTES = 15
+BINS_PER_DAY = 24 * 60 // BIN_MINUTES
+DAYS_PER_WEEK = 7
+
+
+def resolve_timezone(timezone: Optional[str]) -> str:
+    """Return a valid IANA timezone name, falling back to UTC"""
+    if not timezone:
+        return "UTC"
+    try:
+        ZoneInfo(timezone)
+        return timezone
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning(f"Unknown timezone '{timezone}' - using UTC")
+        return "UTC"
+
+
+def _flutter_weekday(dayofweek):
+    """Convert Monday=0 weekdays to the Flutter 0=Sunday format used by habits"""
+    return (dayofweek + 1) % DAYS_PER_WEEK
+
+
+class ReminderTimeHistograms:
+    """Per-habit time-of-day histograms (weekday x 15-minute bin) of completions.
+
+    Completions are unique per (habit, date) in the database, so the dates
+    already counted are kept per habit and a re-marked day is not counted
+    twice.
+    """
+
+    def __init__(self, lead_minutes: int = 30, min_samples: int = 5):
+        self.lead_minutes = lead_minutes
+        self.min_samples = min_samples
+        self._histograms: Dict[str, np.ndarray] = {}
+        self._habit_owner: Dict[str, str] = {}
+        self._user_habits: Dict[str, Set[str]] = {}
+        self._user_timezones: Dict[str, str] = {}
+        self._counted_dates: Dict[str, Set[str]] = {}
+
+    def is_loaded(self, user_id: str, timezone: Optional[str]) -> bool:
+        """Check whether a user's histograms are built for their current timezone.
+
+        Bins are local times, so histograms built under another timezone
+        (the user has moved since) must be rebuilt.
+        """
+        return self._user_timezones.get(user_id) == resolve_timezone(timezone)
+
+    def load_user(self, user_id: str, completions: List[Dict[str, Any]], timezone: Optional[str] = None):
+        """Build all histograms for a user from completion rows in one vectorized pass"""
+        tz = resolve_timezone(timezone)
+        self.forget_user(user_id)
+        self._user_timezones[user_id] = tz
+
+        if not completions:
+            return
+
+        for row in completions:
+            self._counted_dates.setdefault(row['habit_id'], set()).add(str(row.get('completion_date'))[:10])
+            self._habit_owner[row['habit_id']] = user_id
+            self._user_habits.setdefault(user_id, set()).add(row['habit_id'])
+
+        frame = pd.DataFrame(completions, columns=['habit_id', 'completion_time'])
+        # Postgres omits zero fractional seconds, so the format differs between rows
+        frame['completion_time'] = pd.to_datetime(frame['completion_time'], utc=True, errors='coerce', format='ISO8601')
+        frame = frame.dropna()
+        if frame.empty:
+            return
+
+        local = frame['completion_time'].dt.tz_convert(tz)
+        weekdays = _flutter_weekday(local.dt.dayofweek.to_numpy())
+        bins = ((local.dt.hour * 60 + local.dt.minute) // BIN_MINUTES).to_numpy()
+        codes, habit_ids = pd.factorize(frame['habit_id'])
+
+        counts = np.zeros((len(habit_ids), DAYS_PER_WEEK, BINS_PER_DAY), dtype=np.int32)
+        np.add.at(counts, (codes, weekdays, bins), 1)
+
+        for index, habit_id in enumerate(habit_ids):
+            self._store(user_id, habit_id, counts[index])
+
+    def record_completion(self, user_id: str, habit_id: str, completion_date: str, completion_time: Optional[str]):
+        """Add a single completion to an already loaded user's histogram.
+
+        A date already counted for the habit is skipped (marking it again
+        only updates the stored row), and completion_time is the row's
+        stored timestamp, so the histogram matches what a rebuild from the
+        database would give. The current time is used only if the row did
+        not return one.
+        """
+        tz = self._user_timezones.get(user_id)
+        if tz is None:
+            # Not loaded yet; the first lookup will include this completion
+            return
+        counted = self._counted_dates.setdefault(habit_id, set())
+        if completion_date[:10] in counted:
+            return
+        counted.add(completion_date[:10])
+
+        completed_at = pd.to_datetime(completion_time, utc=True, errors='coerce') if completion_time else pd.NaT
+        if pd.isna(completed_at):
+            completed_at = datetime.now(dt_timezone.utc)
+        local = completed_at.astimezone(ZoneInfo(tz))
+        histogram = self._histograms.get(habit_id)
+        if histogram is None:
+            histogram = np.zeros((DAYS_PER_WEEK, BINS_PER_DAY), dtype=np.int32)
+            self._store(user_id, habit_id, histogram)
+
+        weekday = _flutter_weekday(local.weekday())
+        histogram[weekday, (local.hour * 60 + local.minute) // BIN_MINUTES] += 1
+
+    def _store(self, user_id: str, habit_id: str, histogram: np.ndarray):
+        """Register a habit histogram under its owner"""
+        self._histograms[habit_id] = histogram
+        self._habit_owner[habit_id] = user_id
+        self._user_habits.setdefault(user_id, set()).add(habit_id)
+
+    def forget_habit(self, habit_id: str):
+        """Drop the histogram of a deleted habit"""
+        self._histograms.pop(habit_id, None)
+        self._counted_dates.pop(habit_id, None)
+        owner = self._habit_owner.pop(habit_id, None)
+        if owner is not None:
+            self._user_habits.get(owner, set()).discard(habit_id)
+
+    def forget_user(self, user_id: str):
+        """Drop every histogram owned by a user"""
+        self._user_timezones.pop(user_id, None)
+        for habit_id in self._user_habits.pop(user_id, set()):
+            self._histograms.pop(habit_id, None)
+            self._counted_dates.pop(habit_id, None)
+            self._habit_owner.pop(habit_id, None)
+
+    @staticmethod
+    def _format_minutes(minutes: int) -> str:
+        """Format minutes after midnight as HH:MM"""
+        minutes %= 24 * 60
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def _reminder_time(self, bin_index: int) -> str:
+        """Format the reminder time that leads the start of a bin"""
+        return self._format_minutes(bin_index * BIN_MINUTES - self.lead_minutes)
+
+    @staticmethod
+    def _dominant_bin(counts: np.ndarray) -> int:
+        """Find the mode of a circular day histogram, smoothed over neighbouring bins"""
+        smoothed = 2 * counts + np.roll(counts, 1) + np.roll(counts, -1)
+        return int(np.argmax(smoothed))
+
+    def optimal_time(self, habit_id: str) -> Optional[Dict[str, Any]]:
+        """Suggest reminder times for a habit, or None when history is too thin"""
+        histogram = self._histograms.get(habit_id)
+        if histogram is None:
+            return None
+
+        per_day = histogram.sum(axis=1)
+        total = int(per_day.sum())
+        if total < self.min_samples:
+            return None
+
+        overall = histogram.sum(axis=0)
+        mode = self._dominant_bin(overall)
+        window = overall[np.arange(mode - 1, mode + 2) % BINS_PER_DAY].sum()
+
+        by_weekday = {}
+        for weekday in np.flatnonzero(per_day):
+            day_mode = self._dominant_bin(histogram[weekday]) if per_day[weekday] >= self.min_samples else mode
+            by_weekday[int(weekday)] = self._reminder_time(day_mode)
+
+        return {
+            'optimal_time': self._reminder_time(mode),
+            'usual_completion_time': self._format_minutes(mode * BIN_MINUTES),
+            'by_weekday': by_weekday,
+            'days': sorted(by_weekday),
+            'confidence': round(float(window) / total, 2),
+            'sample_size': total
+        }
+
+
+reminder_histograms = ReminderTimeHistograms(
+    lead_minutes=Config.REMINDER_LEAD_MINUTES,
+    min_samples=Config.REMINDER_MIN_SAMPLES
+)
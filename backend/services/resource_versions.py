@@ -0,0 +1,55 @@
+"""
+Per-user version tokens for conditional reads (ETags)
+"""
+
+import itertools
+import secrets
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+from config import Config
+
+# Key for the shared habit template catalogue (user keys are UUIDs, so it cannot clash)
+TEMPLATES_KEY = '*templates'
+
+
+class ResourceVersions:
+    """TTL + LRU map from a user to the version token of their habit data.
+
+    A token is handed out on first read and dropped whenever this worker
+    writes the user's habits or completions, so the next read gets a new
+    one. Checking an ETag is therefore a dict lookup, never a query.
+    Writes this worker does not see (other workers, the app's direct
+    Supabase calls) only show up once the token expires, so ttl_seconds
+    bounds how long a 304 can be stale. Tokens start with a random
+    per-process epoch and never repeat, across users or restarts.
+    """
+
+    def __init__(self, ttl_seconds: int = 60, max_entries: int = 50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._epoch = secrets.token_hex(4)
+        self._serial = itertools.count(1)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def current(self, key: str) -> str:
+        """The key's version token, issuing a new one if it has none or it expired"""
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] >= now:
+            self._entries.move_to_end(key)
+            return entry[1]
+        token = f"{self._epoch}-{next(self._serial)}"
+        self._entries[key] = (now + self.ttl_seconds, token)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return token
+
+    def bump(self, key: str):
+        """Record a write: the next read of `key` gets a token no client has seen"""
+        self._entries.pop(key, None)
+
+
+resource_versions = ResourceVersions(ttl_seconds=Config.ETAG_TTL_SECONDS)
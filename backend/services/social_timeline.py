@@ -0,0 +1,212 @@
+"""
+Per-user social timelines built by fan-out-on-write with keyset pagination
+"""
+
+import asyncio
+import base64
+import bisect
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Set, Tuple
+import logging
+
+from config import Config
+from utils.metrics import cache_counters
+from database.supabase_client import SupabaseClient
+from services.friend_graph import friend_graph
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_HITS, TIMELINE_MISSES = cache_counters('timeline')
+
+TimelineKey = Tuple[datetime, str]
+
+# Fewest rows asked of each author batch when a read is split across batches
+MIN_BATCH_ROWS = 20
+
+
+def encode_cursor(key: TimelineKey) -> str:
+    """Encode a (created_at, id) key as an opaque cursor"""
+    raw = f"{key[0].isoformat()}|{key[1]}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> TimelineKey:
+    """Decode a cursor produced by encode_cursor; raises ValueError when malformed"""
+    try:
+        created_at, post_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|', 1)
+        key = datetime.fromisoformat(created_at), post_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if key[0].tzinfo is None:
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def _post_key(post: Dict[str, Any]) -> TimelineKey:
+    return datetime.fromisoformat(post['created_at']), post['id']
+
+
+def _as_filter(key: Optional[TimelineKey]) -> Optional[Tuple[str, str]]:
+    return (key[0].isoformat(), key[1]) if key else None
+
+
+class _Timeline:
+    """Sorted (oldest first) window of post keys visible to one user"""
+
+    def __init__(self, followees: Set[str], keys: List[TimelineKey], complete: bool):
+        self.followees = followees
+        self.keys = sorted(keys)
+        self.complete = complete
+        self.built_at = time.monotonic()
+
+    def insert(self, key: TimelineKey, max_entries: int):
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return
+        self.keys.insert(index, key)
+        if len(self.keys) > max_entries:
+            del self.keys[:len(self.keys) - max_entries]
+            self.complete = False
+
+    def page(self, before: Optional[TimelineKey], limit: int) -> List[TimelineKey]:
+        end = bisect.bisect_left(self.keys, before) if before else len(self.keys)
+        return self.keys[max(end - limit, 0):end][::-1]
+
+
+class SocialTimelines:
+    """Fan-out-on-write timelines kept in an LRU of recently active readers.
+
+    Authors whose audience exceeds fanout_limit are not pushed to followers;
+    their posts are merged in at read time instead (fan-out-on-read). Entries
+    expire after ttl_seconds so other workers' writes become visible.
+    Posts are queried batch_size authors at a time to keep `in_` filters
+    within URL limits. The batches run concurrently and share about twice
+    the requested rows between them, so a read costs one round trip and a
+    bounded number of rows however many accounts the reader follows.
+    """
+
+    def __init__(self, max_entries: int = 800, fanout_limit: int = 5000,
+                 ttl_seconds: int = 300, max_users: int = 10000, batch_size: int = 100):
+        self.max_entries = max_entries
+        self.fanout_limit = fanout_limit
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self.batch_size = batch_size
+        self._timelines: "OrderedDict[str, _Timeline]" = OrderedDict()
+        self._large_accounts: Set[str] = set()
+
+    def invalidate(self, *user_ids: str):
+        """Drop cached timelines, e.g. after a friendship or follow changes"""
+        for user_id in user_ids:
+            self._timelines.pop(user_id, None)
+
+    async def _newest(self, fetch: Callable[..., Awaitable[List[Dict[str, Any]]]], author_ids: Set[str],
+                      limit: int, before: Optional[TimelineKey] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Newest posts by the authors (at most `limit`), fetched one batch of authors per query.
+
+        Returns the posts and whether older ones may exist. A batch that
+        filled its share may hold unfetched posts, so the result stops at
+        the oldest post of any such batch: it is always a gap-free prefix
+        of the timeline, possibly shorter than `limit`.
+        """
+        author_ids = list(author_ids)
+        batches = [author_ids[start:start + self.batch_size] for start in range(0, len(author_ids), self.batch_size)]
+        if not batches:
+            return [], False
+        per_batch = limit if len(batches) == 1 else min(limit, max(MIN_BATCH_ROWS, math.ceil(2 * limit / len(batches))))
+        results = await asyncio.gather(*(fetch(batch, per_batch, _as_filter(before)) for batch in batches))
+
+        rows = sorted((row for batch_rows in results for row in batch_rows), key=_post_key, reverse=True)
+        more = len(rows) > limit
+        rows = rows[:limit]
+        full = [batch_rows for batch_rows in results if len(batch_rows) >= per_batch]
+        if full:
+            boundary = max(min(_post_key(row) for row in batch_rows) for batch_rows in full)
+            rows = [row for row in rows if _post_key(row) >= boundary]
+            more = True
+        return rows, more
+
+    async def _load(self, supabase: SupabaseClient, user_id: str) -> _Timeline:
+        timeline = self._timelines.get(user_id)
+        if timeline and time.monotonic() - timeline.built_at < self.ttl_seconds:
+            self._timelines.move_to_end(user_id)
+            TIMELINE_HITS.inc()
+            return timeline
+
+        TIMELINE_MISSES.inc()
+        followees = await friend_graph.friends(supabase, user_id) | set(await supabase.get_following_ids(user_id))
+        rows, more = await self._newest(supabase.get_post_keys, followees | {user_id}, self.max_entries)
+        timeline = _Timeline(followees, [_post_key(row) for row in rows], not more)
+
+        self._timelines[user_id] = timeline
+        self._timelines.move_to_end(user_id)
+        while len(self._timelines) > self.max_users:
+            self._timelines.popitem(last=False)
+        return timeline
+
+    async def publish(self, supabase: SupabaseClient, post: Dict[str, Any]):
+        """Push a new post into the cached timelines of its author's audience"""
+        if not post.get('id') or not post.get('created_at'):
+            return
+        author_id = post['user_id']
+        key = _post_key(post)
+
+        try:
+            audience = await friend_graph.friends(supabase, author_id) | set(await supabase.get_follower_ids(author_id))
+        except Exception as e:
+            # Readers will pick the post up when their cached timeline expires
+            logger.warning(f"Could not fan out post {post['id']}: {str(e)}")
+            return
+
+        if len(audience) > self.fanout_limit:
+            self._large_accounts.add(author_id)
+            audience = []
+        else:
+            self._large_accounts.discard(author_id)
+
+        for reader_id in [author_id, *audience]:
+            timeline = self._timelines.get(reader_id)
+            if timeline is not None:
+                timeline.insert(key, self.max_entries)
+
+    async def get_page(self, supabase: SupabaseClient, user_id: str, limit: int = 20,
+                       cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Get one page of a user's timeline, newest first, with the cursor for the next page"""
+        before = decode_cursor(cursor) if cursor else None
+        timeline = await self._load(supabase, user_id)
+
+        keys = timeline.page(before, limit)
+        if len(keys) < limit and not timeline.complete:
+            # Paged past the cached window - read straight from the database
+            posts, more = await self._newest(
+                lambda author_ids, *page: supabase.get_social_feed(user_id, *page, author_ids=author_ids),
+                timeline.followees | {user_id}, limit, before
+            )
+            next_cursor = encode_cursor(_post_key(posts[-1])) if more and posts else None
+            return {"posts": posts, "next_cursor": next_cursor}
+
+        more = len(keys) == limit
+        large = timeline.followees & self._large_accounts
+        if large:
+            rows, large_more = await self._newest(supabase.get_post_keys, large, limit, before)
+            keys = sorted(set(keys) | {_post_key(row) for row in rows}, reverse=True)
+            if large_more and rows:
+                # Their posts older than the last one fetched are unknown yet; the next page starts there
+                keys = [key for key in keys if key >= _post_key(rows[-1])]
+            more = more or large_more or len(keys) > limit
+            keys = keys[:limit]
+
+        found = {post['id']: post for post in await supabase.get_posts_by_ids([key[1] for key in keys])}
+        posts = [found[key[1]] for key in keys if key[1] in found]
+        next_cursor = encode_cursor(keys[-1]) if more and keys else None
+        return {"posts": posts, "next_cursor": next_cursor}
+
+
+social_timelines = SocialTimelines(
+    max_entries=Config.TIMELINE_MAX_ENTRIES,
+    fanout_limit=Config.TIMELINE_FANOUT_LIMIT,
+    ttl_seconds=Config.TIMELINE_TTL_SECONDS
+)
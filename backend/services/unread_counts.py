@@ -0,0 +1,91 @@
+"""
+Per-user unread notification counters
+"""
+
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, Tuple
+import logging
+
+from config import Config
+from utils.metrics import cache_counters
+from database.supabase_client import SupabaseClient
+
+logger = logging.getLogger(__name__)
+
+UNREAD_HITS, UNREAD_MISSES = cache_counters('unread_counts')
+
+
+def is_delivered(notification: Dict[str, Any]) -> bool:
+    """Whether a notification is visible to its user (sent, or never scheduled)"""
+    return bool(notification.get('sent_at')) or not notification.get('scheduled_for')
+
+
+class UnreadCounts:
+    """TTL + LRU cache of unread notification counts.
+
+    A count is loaded with one count query on first use and then kept
+    current by the writes this worker makes (delivery, read, delete). The
+    TTL bounds how long another worker's writes can go unnoticed.
+    """
+
+    def __init__(self, ttl_seconds: int = 60, max_entries: int = 50000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+
+    def _cached(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, count = entry
+        if expires_at < time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return count
+
+    def _set(self, user_id: str, count: int):
+        self._entries[user_id] = (time.monotonic() + self.ttl_seconds, max(count, 0))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, supabase: SupabaseClient, user_id: str) -> int:
+        """Get a user's unread count, loading it if not cached"""
+        count = self._cached(user_id)
+        if count is not None:
+            UNREAD_HITS.inc()
+        else:
+            UNREAD_MISSES.inc()
+            count = await supabase.count_unread_notifications(user_id)
+            self._set(user_id, count)
+        return count
+
+    def adjust(self, user_id: str, delta: int):
+        """Apply a change to a cached count (uncached users are loaded fresh later)"""
+        entry = self._entries.get(user_id)
+        if entry is not None and delta:
+            self._entries[user_id] = (entry[0], max(entry[1] + delta, 0))
+
+    def record_delivered(self, notifications: Iterable[Dict[str, Any]]):
+        for notification in notifications:
+            if not notification.get('is_read'):
+                self.adjust(notification['user_id'], 1)
+
+    def record_read(self, user_id: str, notifications: Iterable[Dict[str, Any]]):
+        """Account for notifications that were unread and have just been marked read"""
+        self.adjust(user_id, -sum(1 for notification in notifications if is_delivered(notification)))
+
+    def record_deleted(self, user_id: str, notifications: Iterable[Dict[str, Any]]):
+        """Account for notifications that have just been deleted"""
+        self.adjust(user_id, -sum(
+            1 for notification in notifications
+            if not notification.get('is_read') and is_delivered(notification)
+        ))
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+
+unread_counts = UnreadCounts(ttl_seconds=Config.UNREAD_COUNT_TTL_SECONDS)
@@ -0,0 +1,63 @@
+"""
+Conditional GET support: ETags from resource version tokens, 304 before any data is fetched
+
+The ETags are weak (W/"..."): CompressionMiddleware may send the same
+version gzip- or brotli-encoded, and a strong validator would have to
+differ per content-coding.
+"""
+
+from typing import Any
+
+from fastapi import HTTPException, Request, status
+
+from services.resource_versions import TEMPLATES_KEY, resource_versions
+from utils.metrics import cache_counters
+from utils.responses import TracedJSONResponse
+
+ETAG_HITS, ETAG_MISSES = cache_counters('etags')
+
+# Per-user data: shared caches must not keep it, and clients revalidate on every use
+CACHE_CONTROL = 'private, no-cache'
+
+
+def if_none_match(header: str, etag: str) -> bool:
+    """Whether an If-None-Match header value matches `etag` (weak comparison, as RFC 9110 requires)"""
+    if header.strip() == '*':
+        return True
+    opaque = etag.removeprefix('W/')
+    return any(candidate.strip().removeprefix('W/') == opaque for candidate in header.split(','))
+
+
+def _check(request: Request, key: str) -> str:
+    etag = f'W/"{resource_versions.current(key)}"'
+    header = request.headers.get('if-none-match')
+    if header and if_none_match(header, etag):
+        ETAG_HITS.inc()
+        raise HTTPException(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers={'ETag': etag, 'Cache-Control': CACHE_CONTROL}
+        )
+    ETAG_MISSES.inc()
+    return etag
+
+
+def user_etag(request: Request, user_id: str) -> str:
+    """Dependency for reads of one user's habit data: answers 304 if the client's copy is current.
+
+    Runs before the endpoint, so an unchanged read costs one version lookup
+    and no database call. Otherwise returns the ETag to send with the data.
+    """
+    if not user_id or not user_id.strip():
+        # Rejected by the endpoint; don't issue a version for it
+        return ''
+    return _check(request, user_id)
+
+
+def templates_etag(request: Request) -> str:
+    """Dependency for the habit template catalogue, like user_etag"""
+    return _check(request, TEMPLATES_KEY)
+
+
+def tagged(content: Any, etag: str) -> TracedJSONResponse:
+    """Response carrying `etag`, so the client can revalidate it with If-None-Match"""
+    return TracedJSONResponse(content, headers={'ETag': etag, 'Cache-Control': CACHE_CONTROL} if etag else None)
@@ -2,38 +2,193 @@
 Logger setup for the application
 """
 
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
 from config import Config
+from utils.metrics import registry
+
+# ID of the request being served, set by RequestIdMiddleware
+request_id_var: ContextVar[Optional[str]] = ContextVar('request_id', default=None)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+
+LOG_RECORDS_DROPPED = registry.counter(
+    'log_records_dropped_total', 'Log records dropped because the log queue was full'
+)
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request ID (runs in the caller, where the context is set)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RepeatFilter(logging.Filter):
+    """Let through at most `burst` records with the same message per window.
+
+    Records are keyed by logger, level and unformatted message, so %-style
+    calls are limited per call site. The first record after a window in
+    which copies were dropped carries the number dropped as `repeated`.
+    """
+
+    def __init__(self, window_seconds: float = 10.0, burst: int = 5, max_keys: int = 1000):
+        super().__init__()
+        self.window_seconds = window_seconds
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> [window start, count in window, suppressed in window]
+        self._seen: "OrderedDict[tuple, list]" = OrderedDict()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            return self._admit(key, record, now)
+
+    def _admit(self, key: tuple, record: logging.LogRecord, now: float) -> bool:
+        entry = self._seen.get(key)
+        if entry is None or now - entry[0] >= self.window_seconds:
+            suppressed = entry[2] if entry else 0
+            self._seen[key] = [now, 1, 0]
+            self._seen.move_to_end(key)
+            while len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+            if suppressed:
+                record.repeated = suppressed
+            return True
+        entry[1] += 1
+        if entry[1] > self.burst:
+            entry[2] += 1
+            return False
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        if getattr(record, 'repeated', None):
+            entry['repeated'] = record.repeated
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic text format, with the request ID and repeat count when present"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        if getattr(record, 'request_id', None):
+            line += f" [request_id={record.request_id}]"
+        if getattr(record, 'repeated', None):
+            line += f" (repeated {record.repeated} more times)"
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or erroring when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args and render tracebacks now, keeping the traceback separate for the formatter
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+
+def _log_level() -> int:
+    level = getattr(logging, str(Config.LOG_LEVEL).upper(), None)
+    return level if isinstance(level, int) else logging.INFO
+
+
+def configure_logging():
+    """Route all logging through a queue to a single writer thread (idempotent).
+
+    Callers only format the record and enqueue it; the blocking write to
+    stdout happens on the listener thread, off the event loop.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(RepeatFilter(Config.LOG_DEDUPE_WINDOW_SECONDS, Config.LOG_DEDUPE_BURST))
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JSONFormatter() if Config.LOG_FORMAT == 'json' else TextFormatter())
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(_log_level())
+
+    _queue_handler = handler
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
 
 def setup_logger(name: str) -> logging.Logger:
     """Setup logger with consistent configuration"""
     try:
+        configure_logging()
         logger = logging.getLogger(name)
-        
-        if not logger.handlers:
-            # Create console handler
-            handler = logging.StreamHandler(sys.stdout)
-            
-            # Get log level with fallback
-            try:
-                log_level = getattr(logging, Config.LOG_LEVEL)
-            except AttributeError:
-                log_level = logging.INFO  # Default fallback
-                # Invalid log level, using INFO as fallback
-            
-            handler.setLevel(log_level)
-            
-            # Create formatter
-            formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-            handler.setFormatter(formatter)
-            
-            # Add handler to logger
-            logger.addHandler(handler)
-            logger.setLevel(log_level)
-        
+        logger.setLevel(_log_level())
         return logger
     except Exception as e:
         # Fallback logger if setup fails
@@ -0,0 +1,252 @@
+"""
+In-process Prometheus metrics (counters, gauges and histograms) with text exposition
+"""
+
+import asyncio
+import math
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Request and database latencies, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """A named metric with one child per combination of label values.
+
+    Children are created on first use and kept for the life of the process,
+    so label values must come from a small fixed set (route templates, method
+    names) - never user IDs or raw paths. Updates are plain attribute writes
+    made from the event loop, cheap enough to leave on in production.
+    """
+
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """Get the child for a combination of label values"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the value from a callback at scrape time instead of storing it"""
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            return [f"{self.name} {_format_value(self._function())}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        # One bisect and one increment; buckets are made cumulative at scrape time
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The set of metrics exposed on /metrics"""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        return '\n'.join(metric.expose() for metric in self._metrics.values()) + '\n'
+
+
+def _default_executor_attr(attr: str) -> float:
+    """Inspect the event loop's default thread pool (used by asyncio.to_thread)"""
+    try:
+        executor = asyncio.get_running_loop()._default_executor
+    except (RuntimeError, AttributeError):
+        return 0
+    if executor is None:
+        return 0
+    if attr == 'queue':
+        return executor._work_queue.qsize()
+    return len(executor._threads)
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter(
+    'http_requests_total', 'HTTP requests by method, route template and status code', ('method', 'route', 'status')
+)
+HTTP_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by method and route template', ('method', 'route')
+)
+HTTP_IN_FLIGHT = registry.gauge('http_requests_in_flight', 'HTTP requests currently being served')
+
+DB_CALLS = registry.counter(
+    'db_calls_total', 'Database calls by SupabaseClient method, table and outcome', ('method', 'table', 'status')
+)
+DB_LATENCY = registry.histogram(
+    'db_call_duration_seconds', 'Database call latency by SupabaseClient method and table', ('method', 'table')
+)
+DB_RETRIES = registry.counter('db_call_retries_total', 'Database call attempts retried after a transient error', ('method',))
+DB_HEDGES = registry.counter(
+    'db_hedged_calls_total', 'Duplicate reads started after the hedge delay, by which attempt answered first', ('method', 'winner')
+)
+
+DEAD_LETTERS = registry.counter(
+    'dead_letters_total', 'Buffered rows the database rejected on their own, logged and not retried', ('kind',)
+)
+
+CACHE_REQUESTS = registry.counter('cache_requests_total', 'In-process cache lookups by cache and result', ('cache', 'result'))
+
+EXECUTOR_QUEUE_DEPTH = registry.gauge('executor_queue_depth', 'Calls waiting for a thread in the default executor')
+EXECUTOR_QUEUE_DEPTH.set_function(lambda: _default_executor_attr('queue'))
+EXECUTOR_THREADS = registry.gauge('executor_threads', 'Threads started by the default executor')
+EXECUTOR_THREADS.set_function(lambda: _default_executor_attr('threads'))
+
+
+def cache_counters(cache: str) -> Tuple[_Value, _Value]:
+    """(hit, miss) counters for a cache, bound once so recording is a single add"""
+    return CACHE_REQUESTS.labels(cache, 'hit'), CACHE_REQUESTS.labels(cache, 'miss')
@@ -0,0 +1,83 @@
+"""
+Default response class for the API
+"""
+
+import functools
+import inspect
+from typing import Any
+
+import orjson
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from fastapi.routing import APIRoute
+
+from utils.tracing import span
+
+
+def _encode_fallback(obj: Any) -> Any:
+    # Only called for values orjson cannot encode itself (models, Decimal, sets, ...)
+    return jsonable_encoder(obj)
+
+
+class TracedJSONResponse(JSONResponse):
+    """JSONResponse encoded with orjson; the encoding shows up as a span in sampled traces.
+
+    Dict keys that are not strings (e.g. mood ratings) are written as
+    strings, as json.dumps would.
+    """
+
+    def render(self, content) -> bytes:
+        with span("encode.json"):
+            return orjson.dumps(content, default=_encode_fallback, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _direct_endpoint(endpoint, response_class, status_code: int):
+    """Wrap an endpoint so its plain return value is encoded once, by the response class"""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def direct(*args, **kwargs):
+            content = await endpoint(*args, **kwargs)
+            return content if isinstance(content, Response) else response_class(content, status_code=status_code)
+    else:
+        @functools.wraps(endpoint)
+        def direct(*args, **kwargs):
+            content = endpoint(*args, **kwargs)
+            return content if isinstance(content, Response) else response_class(content, status_code=status_code)
+    return direct
+
+
+def serialize_directly(routes):
+    """Skip FastAPI's jsonable_encoder / response-model pass for routes that gain nothing from it.
+
+    That pass walks the whole payload in Python before it is encoded. For
+    routes without a response model, or with a free-form one such as
+    Dict[str, Any] (which validates nothing below the top level), the
+    endpoint's return value goes straight to the response class instead.
+    Routes whose endpoint takes a `Response` parameter are left alone, since
+    headers set on it are only merged on FastAPI's own path.
+    """
+    for route in routes:
+        if not isinstance(route, APIRoute):
+            continue
+        response_class = route.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        if not issubclass(response_class, TracedJSONResponse):
+            continue
+        if route.response_model is not None and not _free_form(route.response_model):
+            continue
+        if any(inspect.isclass(param.annotation) and issubclass(param.annotation, Response)
+               for param in inspect.signature(route.endpoint).parameters.values()):
+            continue
+        route.dependant.call = _direct_endpoint(route.dependant.call, response_class, route.status_code or 200)
+
+
+def _free_form(model) -> bool:
+    """Whether validating against `model` only checks the top-level container type"""
+    args = getattr(model, '__args__', ())
+    if getattr(model, '__origin__', None) is dict:
+        return args[1:] == (Any,)
+    if getattr(model, '__origin__', None) is list:
+        return len(args) == 1 and _free_form(args[0])
+    return model is Any
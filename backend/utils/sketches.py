@@ -0,0 +1,177 @@
+"""
+Mergeable probabilistic sketches (HyperLogLog and KLL) for constant-memory metrics
+"""
+
+import base64
+import hashlib
+import math
+import random
+from typing import Dict, Any, List, Tuple
+
+
+def _hash64(value: Any) -> int:
+    """Stable 64-bit hash, identical across processes and workers"""
+    digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter with 2**precision one-byte registers"""
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 16:
+            raise ValueError("Precision must be between 4 and 16")
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add(self, value: Any):
+        """Add a value to the set"""
+        x = _hash64(value)
+        index = x >> (64 - self.precision)
+        remaining = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        """Merge another sketch of the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        """Estimate the number of distinct values added"""
+        if self.m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / self.m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[self.m]
+
+        estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.m and zeros:
+            # Small-range correction (linear counting)
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for transfer between workers"""
+        return {
+            'precision': self.precision,
+            'registers': base64.b64encode(bytes(self.registers)).decode('ascii')
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        """Rebuild a sketch serialized with to_dict"""
+        sketch = cls(data['precision'])
+        registers = base64.b64decode(data['registers'])
+        if len(registers) != sketch.m:
+            raise ValueError("Register count does not match precision")
+        sketch.registers = bytearray(registers)
+        return sketch
+
+
+class KLLSketch:
+    """KLL quantile sketch; memory is bounded by roughly 3k items regardless of stream length"""
+
+    def __init__(self, k: int = 200, c: float = 2 / 3):
+        self.k = k
+        self.c = c
+        self.compactors: List[List[float]] = []
+        self.size = 0
+        self.max_size = 0
+        self.count = 0
+        self._grow()
+
+    def _capacity(self, height: int) -> int:
+        depth = len(self.compactors) - height - 1
+        return int(math.ceil(self.c ** depth * self.k)) + 1
+
+    def _grow(self):
+        self.compactors.append([])
+        self.max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    @staticmethod
+    def _compact(items: List[float]) -> List[float]:
+        """Sort a level and promote every other item, keeping an odd leftover in place"""
+        items.sort()
+        leftover = items.pop() if len(items) % 2 else None
+        promoted = items[random.getrandbits(1)::2]
+        items.clear()
+        if leftover is not None:
+            items.append(leftover)
+        return promoted
+
+    def _compress(self):
+        for height in range(len(self.compactors)):
+            if len(self.compactors[height]) >= self._capacity(height):
+                if height + 1 >= len(self.compactors):
+                    self._grow()
+                self.compactors[height + 1].extend(self._compact(self.compactors[height]))
+                self.size = sum(len(level) for level in self.compactors)
+                if self.size < self.max_size:
+                    break
+
+    def add(self, value: float):
+        """Add an observation"""
+        self.compactors[0].append(value)
+        self.size += 1
+        self.count += 1
+        if self.size >= self.max_size:
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        """Merge another sketch into this one"""
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for height, level in enumerate(other.compactors):
+            self.compactors[height].extend(level)
+        self.count += other.count
+        self.size = sum(len(level) for level in self.compactors)
+        while self.size >= self.max_size:
+            self._compress()
+
+    def _weighted_items(self) -> List[Tuple[float, int]]:
+        return sorted(
+            (item, 1 << height)
+            for height, level in enumerate(self.compactors)
+            for item in level
+        )
+
+    def quantiles(self, fractions: List[float]) -> List[float]:
+        """Estimate the values at the given quantile fractions (0..1)"""
+        items = self._weighted_items()
+        if not items:
+            return [0.0 for _ in fractions]
+
+        total = sum(weight for _, weight in items)
+        results = []
+        for fraction in fractions:
+            target = fraction * total
+            cumulative = 0
+            value = items[-1][0]
+            for item, weight in items:
+                cumulative += weight
+                if cumulative >= target:
+                    value = item
+                    break
+            results.append(value)
+        return results
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize for transfer between workers"""
+        return {'k': self.k, 'c': self.c, 'count': self.count, 'compactors': self.compactors}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KLLSketch":
+        """Rebuild a sketch serialized with to_dict"""
+        if not isinstance(data['compactors'], list) or not data['compactors']:
+            raise ValueError("Sketch has no compactors")
+        sketch = cls(data['k'], data['c'])
+        while len(sketch.compactors) < len(data['compactors']):
+            sketch._grow()
+        sketch.compactors = [list(level) for level in data['compactors']]
+        sketch.count = data['count']
+        sketch.size = sum(len(level) for level in sketch.compactors)
+        return sketch
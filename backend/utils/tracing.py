@@ -0,0 +1,233 @@
+"""
+Sampled request tracing (Chrome trace-event JSON) and on-demand statistical profiling
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Set
+import logging
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Spans beyond this many per trace are dropped
+MAX_SPANS = 10000
+
+
+class Trace:
+    """The spans recorded while serving one request.
+
+    Spans are kept as Chrome trace-event 'complete' events. Each asyncio task
+    gets its own track, so work run concurrently with asyncio.gather nests
+    correctly when the file is opened in Perfetto or chrome://tracing.
+    """
+
+    __slots__ = ('trace_id', 'name', 'start', 'events', 'profile', '_tracks')
+
+    def __init__(self, name: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.start = time.perf_counter()
+        self.events: List[Dict[str, Any]] = []
+        self.profile: Optional[Counter] = None
+        self._tracks: Dict[int, int] = {}
+
+    def _track(self) -> int:
+        try:
+            task = id(asyncio.current_task())
+        except RuntimeError:
+            task = 0
+        track = self._tracks.get(task)
+        if track is None:
+            track = self._tracks[task] = len(self._tracks) + 1
+        return track
+
+    def add(self, name: str, start: float, end: float, attrs: Optional[Dict[str, Any]] = None):
+        if len(self.events) >= MAX_SPANS:
+            return
+        self.events.append({
+            'name': name,
+            'ph': 'X',
+            'ts': round((start - self.start) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'pid': os.getpid(),
+            'tid': self._track(),
+            'args': attrs or {}
+        })
+
+    def to_chrome(self) -> Dict[str, Any]:
+        return {
+            'traceEvents': self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'trace_id': self.trace_id, 'name': self.name}
+        }
+
+
+# The trace of the request being served, if it was sampled
+trace_context: ContextVar[Optional[Trace]] = ContextVar('trace_context', default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return trace_context.get()
+
+
+@contextmanager
+def span(name: str, **attrs: Any):
+    """Record a span in the current request's trace; a no-op when the request is not sampled"""
+    trace = trace_context.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, start, time.perf_counter(), attrs)
+
+
+def record_span(name: str, start: float, end: float, **attrs: Any):
+    """Record an already-timed span (perf_counter timestamps) in the current trace, if any"""
+    trace = trace_context.get()
+    if trace is not None:
+        trace.add(name, start, end, attrs)
+
+
+class StackSampler:
+    """Statistical profiler: samples one thread's Python stack at a fixed interval.
+
+    Stacks are counted in the folded format read by flamegraph.pl and
+    speedscope. The event loop thread is shared by every in-flight request,
+    so a profile also contains whatever else the loop ran at the time.
+    """
+
+    def __init__(self, interval_seconds: float = 0.005):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._counts: Counter = Counter()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, thread_id: int):
+        self._counts = Counter()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(thread_id,), name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self._counts
+
+    def _run(self, thread_id: int):
+        while not self._stop.wait(self.interval_seconds):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self._counts[';'.join(reversed(stack))] += 1
+
+
+class Tracer:
+    """Decides which requests to trace or profile and writes the results.
+
+    A sample_rate fraction of requests is traced. Profiling is requested
+    per request (header) or for the next N requests (admin flag); only one
+    request is profiled at a time. Each trace is written to trace_dir as
+    <time>-<trace id>.json, with a .folded stack file next to it when
+    profiled; the oldest traces are removed beyond max_files.
+    """
+
+    def __init__(self, sample_rate: float = 0.01, trace_dir: str = 'traces', max_files: int = 500,
+                 profile_interval_seconds: float = 0.005):
+        self.sample_rate = sample_rate
+        self.trace_dir = trace_dir
+        self.max_files = max_files
+        self.sampler = StackSampler(profile_interval_seconds)
+        self.pending_profiles = 0
+        self.traces_written = 0
+        self._writes: Set[asyncio.Task] = set()
+
+    def request_profiles(self, count: int) -> int:
+        """Profile the next count requests"""
+        self.pending_profiles += count
+        return self.pending_profiles
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def take_profile(self, requested: bool) -> bool:
+        """Whether to profile this request; consumes an admin-flag request if one is pending"""
+        if self.sampler.running:
+            return False
+        if requested:
+            return True
+        if self.pending_profiles > 0:
+            self.pending_profiles -= 1
+            return True
+        return False
+
+    def start(self, name: str, profile: bool) -> Trace:
+        trace = Trace(name)
+        if profile:
+            trace.profile = Counter()
+            self.sampler.start(threading.get_ident())
+        return trace
+
+    def finish(self, trace: Trace):
+        """Stop profiling and write the trace in the background"""
+        if trace.profile is not None:
+            trace.profile = self.sampler.stop()
+        task = asyncio.create_task(asyncio.to_thread(self._write, trace))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    def _write(self, trace: Trace):
+        try:
+            os.makedirs(self.trace_dir, exist_ok=True)
+            base = os.path.join(self.trace_dir, f"{time.strftime('%Y%m%dT%H%M%S')}-{trace.trace_id}")
+            with open(f"{base}.json", 'w') as f:
+                json.dump(trace.to_chrome(), f, default=str)
+            if trace.profile is not None:
+                with open(f"{base}.folded", 'w') as f:
+                    f.writelines(f"{stack} {count}\n" for stack, count in trace.profile.most_common())
+            self.traces_written += 1
+            self._prune()
+        except Exception as e:
+            logger.warning(f"Could not write trace {trace.trace_id}: {str(e)}")
+
+    def _prune(self):
+        files = sorted(
+            (entry for entry in os.scandir(self.trace_dir) if entry.name.endswith('.json')),
+            key=lambda entry: entry.name
+        )
+        for entry in files[:max(len(files) - self.max_files, 0)]:
+            os.remove(entry.path)
+            folded = entry.path[:-len('.json')] + '.folded'
+            if os.path.exists(folded):
+                os.remove(folded)
+
+
+tracer = Tracer(
+    sample_rate=Config.TRACE_SAMPLE_RATE,
+    trace_dir=Config.TRACE_DIR,
+    max_files=Config.TRACE_MAX_FILES,
+    profile_interval_seconds=Config.PROFILE_INTERVAL_MS / 1000
+)
@@ -16,6 +16,7 @@ DROP TABLE IF EXISTS public.xp_transactions CASCADE;
 DROP TABLE IF EXISTS public.friends CASCADE;
 DROP TABLE IF EXISTS public.challenges CASCADE;
 DROP TABLE IF EXISTS public.challenge_participants CASCADE;
+DROP TABLE IF EXISTS public.challenge_progress_events CASCADE;
 DROP TABLE IF EXISTS public.social_posts CASCADE;
 DROP TABLE IF EXISTS public.post_likes CASCADE;
 DROP TABLE IF EXISTS public.post_comments CASCADE;
@@ -58,6 +59,9 @@ DROP FUNCTION IF EXISTS public.cleanup_expired_analytics_cache() CASCADE;
 DROP FUNCTION IF EXISTS public.update_user_level(UUID) CASCADE;
 DROP FUNCTION IF EXISTS public.trigger_update_user_level() CASCADE;
 DROP FUNCTION IF EXISTS public.create_activity_feed_entry() CASCADE;
+DROP FUNCTION IF EXISTS public.claim_due_notifications(TEXT, TIMESTAMP WITH TIME ZONE, INTEGER, INTEGER) CASCADE;
+DROP FUNCTION IF EXISTS public.advance_challenge_progress(UUID, UUID, DATE) CASCADE;
+DROP FUNCTION IF EXISTS public.advance_challenge_progress(UUID, UUID, UUID, DATE) CASCADE;
 
 -- Enable necessary extensions
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
@@ -227,6 +231,7 @@ CREATE TABLE public.challenges (
     description TEXT,
     challenge_type TEXT NOT NULL CHECK (challenge_type IN ('streak', 'completion', 'consistency', 'custom')),
     target_value INTEGER NOT NULL,
+    habit_ids UUID[] DEFAULT '{}', -- empty = any habit counts
     start_date DATE NOT NULL,
     end_date DATE NOT NULL,
     is_public BOOLEAN DEFAULT false,
@@ -243,11 +248,22 @@ CREATE TABLE public.challenge_participants (
     user_id UUID REFERENCES public.profiles(id) ON DELETE CASCADE NOT NULL,
     joined_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     current_progress INTEGER DEFAULT 0,
+    last_progress_date DATE, -- latest completion date applied, for the per-day rules
     is_completed BOOLEAN DEFAULT false,
     completed_at TIMESTAMP WITH TIME ZONE,
     UNIQUE(challenge_id, user_id)
 );
 
+-- Completions already applied to a participant's progress; the key makes
+-- re-marking a habit for the same day (or a retried request) a no-op
+CREATE TABLE public.challenge_progress_events (
+    participant_id UUID REFERENCES public.challenge_participants(id) ON DELETE CASCADE NOT NULL,
+    habit_id UUID REFERENCES public.habits(id) ON DELETE CASCADE NOT NULL,
+    completion_date DATE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (participant_id, habit_id, completion_date)
+);
+
 -- Social posts table (for social feed)
 CREATE TABLE public.social_posts (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
@@ -342,6 +358,11 @@ CREATE TABLE public.notifications (
     is_read BOOLEAN DEFAULT false,
     scheduled_for TIMESTAMP WITH TIME ZONE,
     sent_at TIMESTAMP WITH TIME ZONE,
+    lease_owner TEXT, -- dispatcher worker currently holding the notification
+    lease_expires_at TIMESTAMP WITH TIME ZONE,
+    dedupe_key TEXT UNIQUE, -- e.g. reminder:<habit_id>:<local date>; NULL for ad-hoc notifications
+    delivery_attempts INTEGER DEFAULT 0, -- failed sends so far; retries are rescheduled via scheduled_for
+    failed_at TIMESTAMP WITH TIME ZONE, -- set when delivery gave up; never claimed again
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -394,6 +415,7 @@ CREATE INDEX IF NOT EXISTS idx_challenges_is_public ON public.challenges(is_publ
 -- Challenge participants indexes
 CREATE INDEX IF NOT EXISTS idx_challenge_participants_challenge_id ON public.challenge_participants(challenge_id);
 CREATE INDEX IF NOT EXISTS idx_challenge_participants_user_id ON public.challenge_participants(user_id);
+CREATE INDEX IF NOT EXISTS idx_challenge_participants_progress ON public.challenge_participants(challenge_id, current_progress DESC);
 
 -- Social posts indexes
 CREATE INDEX IF NOT EXISTS idx_social_posts_user_id ON public.social_posts(user_id);
@@ -414,6 +436,7 @@ CREATE INDEX IF NOT EXISTS idx_ai_suggestions_created_at ON public.ai_suggestion
 CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON public.notifications(user_id);
 CREATE INDEX IF NOT EXISTS idx_notifications_is_read ON public.notifications(is_read);
 CREATE INDEX IF NOT EXISTS idx_notifications_scheduled_for ON public.notifications(scheduled_for);
+CREATE INDEX IF NOT EXISTS idx_notifications_pending ON public.notifications(scheduled_for) WHERE sent_at IS NULL AND failed_at IS NULL;
 
 -- =====================================================
 -- FUNCTIONS AND TRIGGERS
@@ -536,52 +559,66 @@ CREATE TRIGGER on_auth_user_created
     FOR EACH ROW EXECUTE FUNCTION public.handle_new_user();
 
 -- Function to update post likes count
+-- Statement-level so a bulk insert of buffered likes updates each post once
 CREATE OR REPLACE FUNCTION update_post_likes_count()
 RETURNS TRIGGER AS $$
 BEGIN
     IF TG_OP = 'INSERT' THEN
-        UPDATE public.social_posts 
-        SET likes_count = likes_count + 1 
-        WHERE id = NEW.post_id;
-        RETURN NEW;
+        UPDATE public.social_posts p
+        SET likes_count = p.likes_count + d.delta
+        FROM (SELECT post_id, COUNT(*) AS delta FROM new_rows GROUP BY post_id) d
+        WHERE p.id = d.post_id;
     ELSIF TG_OP = 'DELETE' THEN
-        UPDATE public.social_posts 
-        SET likes_count = likes_count - 1 
-        WHERE id = OLD.post_id;
-        RETURN OLD;
+        UPDATE public.social_posts p
+        SET likes_count = p.likes_count - d.delta
+        FROM (SELECT post_id, COUNT(*) AS delta FROM old_rows GROUP BY post_id) d
+        WHERE p.id = d.post_id;
     END IF;
     RETURN NULL;
 END;
 $$ language 'plpgsql';
 
--- Trigger for post likes count
-CREATE TRIGGER trigger_update_post_likes_count
-    AFTER INSERT OR DELETE ON public.post_likes
-    FOR EACH ROW EXECUTE FUNCTION update_post_likes_count();
+-- Triggers for post likes count
+CREATE TRIGGER trigger_update_post_likes_count_insert
+    AFTER INSERT ON public.post_likes
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_post_likes_count();
+
+CREATE TRIGGER trigger_update_post_likes_count_delete
+    AFTER DELETE ON public.post_likes
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_post_likes_count();
 
 -- Function to update post comments count
+-- Statement-level so a bulk insert of buffered comments updates each post once
 CREATE OR REPLACE FUNCTION update_post_comments_count()
 RETURNS TRIGGER AS $$
 BEGIN
     IF TG_OP = 'INSERT' THEN
-        UPDATE public.social_posts 
-        SET comments_count = comments_count + 1 
-        WHERE id = NEW.post_id;
-        RETURN NEW;
+        UPDATE public.social_posts p
+        SET comments_count = p.comments_count + d.delta
+        FROM (SELECT post_id, COUNT(*) AS delta FROM new_rows GROUP BY post_id) d
+        WHERE p.id = d.post_id;
     ELSIF TG_OP = 'DELETE' THEN
-        UPDATE public.social_posts 
-        SET comments_count = comments_count - 1 
-        WHERE id = OLD.post_id;
-        RETURN OLD;
+        UPDATE public.social_posts p
+        SET comments_count = p.comments_count - d.delta
+        FROM (SELECT post_id, COUNT(*) AS delta FROM old_rows GROUP BY post_id) d
+        WHERE p.id = d.post_id;
     END IF;
     RETURN NULL;
 END;
 $$ language 'plpgsql';
 
--- Trigger for post comments count
-CREATE TRIGGER trigger_update_post_comments_count
-    AFTER INSERT OR DELETE ON public.post_comments
-    FOR EACH ROW EXECUTE FUNCTION update_post_comments_count();
+-- Triggers for post comments count
+CREATE TRIGGER trigger_update_post_comments_count_insert
+    AFTER INSERT ON public.post_comments
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_post_comments_count();
+
+CREATE TRIGGER trigger_update_post_comments_count_delete
+    AFTER DELETE ON public.post_comments
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_post_comments_count();
 
 -- =====================================================
 -- ROW LEVEL SECURITY (RLS) POLICIES
@@ -600,6 +637,7 @@ ALTER TABLE public.xp_transactions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.friends ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.challenges ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.challenge_participants ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.challenge_progress_events ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.social_posts ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.post_likes ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.post_comments ENABLE ROW LEVEL SECURITY;
@@ -889,7 +927,8 @@ CREATE TABLE public.notification_templates (
     body_template TEXT NOT NULL,
     notification_type TEXT NOT NULL CHECK (notification_type IN ('reminder', 'achievement', 'streak', 'social', 'challenge', 'motivation')),
     is_active BOOLEAN DEFAULT true,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW() -- bumped on every change; the API reloads templates when it moves
 );
 
 -- Notification schedules table
@@ -901,14 +940,15 @@ CREATE TABLE public.notification_schedules (
     schedule_data JSONB DEFAULT '{}',
     is_active BOOLEAN DEFAULT true,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE(habit_id, schedule_type)
 );
 
 -- Notification delivery logs table
 CREATE TABLE public.notification_delivery_logs (
     id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
     notification_id UUID REFERENCES public.notifications(id) ON DELETE CASCADE NOT NULL,
-    delivery_method TEXT NOT NULL CHECK (delivery_method IN ('push', 'email', 'in_app')),
+    delivery_method TEXT NOT NULL, -- provider channel, e.g. 'push', 'email', 'in_app'; also logged for channels with no provider
     delivery_status TEXT NOT NULL CHECK (delivery_status IN ('sent', 'delivered', 'failed', 'opened')),
     delivery_time TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     error_message TEXT,
@@ -1268,6 +1308,102 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function to lease due notifications to one dispatcher worker.
+-- SKIP LOCKED lets concurrent workers claim disjoint batches; an expired
+-- lease (crashed worker) makes the notification claimable again.
+CREATE OR REPLACE FUNCTION claim_due_notifications(
+    p_worker TEXT,
+    p_horizon TIMESTAMP WITH TIME ZONE,
+    p_limit INTEGER DEFAULT 500,
+    p_lease_seconds INTEGER DEFAULT 300
+)
+RETURNS SETOF public.notifications AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE public.notifications n
+    SET lease_owner = p_worker,
+        lease_expires_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE n.id IN (
+        SELECT id FROM public.notifications
+        WHERE sent_at IS NULL
+        AND failed_at IS NULL
+        AND scheduled_for <= p_horizon
+        AND (lease_expires_at IS NULL OR lease_expires_at < NOW())
+        ORDER BY scheduled_for
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING n.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function to apply one habit completion to a challenge participant.
+-- The row lock serializes completions from every worker, each (habit, date)
+-- counts once per participant via challenge_progress_events, and
+-- last_progress_date keeps the per-day rules ('consistency' counts distinct
+-- days, 'streak' restarts after a gap) across restarts. Returns the updated
+-- participant row, or no row when the completion changes nothing.
+CREATE OR REPLACE FUNCTION advance_challenge_progress(
+    p_challenge_id UUID,
+    p_user_id UUID,
+    p_habit_id UUID,
+    p_completion_date DATE
+)
+RETURNS SETOF public.challenge_participants AS $$
+DECLARE
+    challenge_record RECORD;
+    participant RECORD;
+    new_progress INTEGER;
+BEGIN
+    SELECT challenge_type, GREATEST(target_value, 1) AS target INTO challenge_record
+    FROM public.challenges WHERE id = p_challenge_id;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    
+    SELECT * INTO participant
+    FROM public.challenge_participants
+    WHERE challenge_id = p_challenge_id AND user_id = p_user_id
+    FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    
+    INSERT INTO public.challenge_progress_events (participant_id, habit_id, completion_date)
+    VALUES (participant.id, p_habit_id, p_completion_date)
+    ON CONFLICT DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN;
+    END IF;
+    
+    IF challenge_record.challenge_type IN ('consistency', 'streak')
+       AND participant.last_progress_date IS NOT NULL
+       AND p_completion_date <= participant.last_progress_date THEN
+        RETURN;
+    END IF;
+    
+    IF challenge_record.challenge_type = 'streak'
+       AND participant.last_progress_date IS NOT NULL
+       AND p_completion_date - participant.last_progress_date > 1 THEN
+        new_progress := 1;
+    ELSE
+        new_progress := COALESCE(participant.current_progress, 0) + 1;
+    END IF;
+    
+    RETURN QUERY
+    UPDATE public.challenge_participants cp
+    SET current_progress = new_progress,
+        last_progress_date = GREATEST(cp.last_progress_date, p_completion_date),
+        is_completed = new_progress >= challenge_record.target,
+        completed_at = CASE
+            WHEN new_progress >= challenge_record.target THEN COALESCE(cp.completed_at, NOW())
+            ELSE NULL
+        END
+    WHERE cp.id = participant.id
+    RETURNING cp.*;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Function to update user level based on XP
 CREATE OR REPLACE FUNCTION update_user_level(p_user_id UUID)
 RETURNS INTEGER AS $$
@@ -1356,6 +1492,9 @@ CREATE TRIGGER trigger_habit_completion_activity
 CREATE TRIGGER update_notification_schedules_updated_at BEFORE UPDATE ON public.notification_schedules FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_user_preferences_updated_at BEFORE UPDATE ON public.user_preferences FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Trigger to version notification templates
+CREATE TRIGGER update_notification_templates_updated_at BEFORE UPDATE ON public.notification_templates FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
 -- =====================================================
 -- ENHANCED RLS POLICIES
 -- =====================================================